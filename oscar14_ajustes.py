@@ -0,0 +1,181 @@
+# oscar14_ajustes.py
+"""
+Ajustes de rendimiento de cada equipo: cámara, decodificación, resolución de
+renderizado, procesos de OCR, lotes de escritura y tamaño de las cachés.
+
+Se guardan en data/ajustes.json y se cargan al arrancar. Los cambios hechos
+con `cambiar` se avisan a quien se haya suscrito, así cada ventana los aplica
+en el momento sin reiniciar la aplicación.
+
+Uso:
+    from oscar14_ajustes import AJUSTES
+
+    AJUSTES.cargar()
+    fps = AJUSTES["camara.fps"]
+    AJUSTES.suscribir(lambda clave, valor: ...)
+"""
+import json
+import os
+
+
+class Ajuste:
+    """
+    Definición de un ajuste: su tipo, valor por defecto, rango y cómo se muestra.
+    """
+
+    def __init__(self, clave, tipo, defecto, minimo, maximo, etiqueta, seccion, unidad="", ayuda=""):
+        self.clave = clave
+        self.tipo = tipo
+        self.defecto = defecto
+        self.minimo = minimo
+        self.maximo = maximo
+        self.etiqueta = etiqueta
+        self.seccion = seccion
+        self.unidad = unidad
+        self.ayuda = ayuda
+
+    def normalizar(self, valor):
+        """
+        Convierte `valor` al tipo del ajuste y lo lleva a su rango.
+
+        Raises:
+            ValueError: Si el valor no se puede convertir.
+        """
+        if isinstance(valor, bool) or valor is None:
+            raise ValueError(f"{self.clave}: se esperaba un número y se recibió {valor!r}")
+        try:
+            valor = self.tipo(valor)
+        except (TypeError, ValueError):
+            raise ValueError(f"{self.clave}: se esperaba un número y se recibió {valor!r}")
+        return min(max(valor, self.minimo), self.maximo)
+
+
+DEFINICIONES = [
+    Ajuste("camara.indice", int, 0, 0, 9, "Cámara", "Cámara", ayuda="Índice de la cámara en el sistema"),
+    Ajuste("camara.ancho", int, 0, 0, 3840, "Ancho", "Cámara", "px", "0 = el que use la cámara"),
+    Ajuste("camara.alto", int, 0, 0, 2160, "Alto", "Cámara", "px", "0 = el que use la cámara"),
+    Ajuste("camara.fps", int, 30, 1, 120, "Frames por segundo", "Cámara", "fps"),
+    Ajuste("escaneo.decodificaciones_por_segundo", int, 10, 1, 60, "Decodificaciones por segundo", "Escaneo", "/s",
+           "Veces por segundo que se buscan QR en el frame más reciente"),
+    Ajuste("pdf.dpi_vista_previa", int, 150, 50, 600, "Resolución de vista previa", "PDF", "dpi"),
+    Ajuste("pdf.dpi_qr", int, 200, 50, 600, "Resolución para leer QR", "PDF", "dpi"),
+    Ajuste("pdf.dpi_ocr", int, 300, 50, 600, "Resolución para OCR", "PDF", "dpi"),
+    Ajuste("pdf.cache_mb", int, 256, 16, 8192, "Memoria de páginas renderizadas", "PDF", "MB"),
+    Ajuste("ocr.procesos", int, 0, 0, 64, "Procesos de OCR", "Procesos", ayuda="0 = uno por núcleo"),
+    Ajuste("ingesta.procesos", int, 0, 0, 64, "Procesos de carga masiva", "Procesos",
+           ayuda="Para oscar14_ingesta.py; 0 = uno por núcleo"),
+    Ajuste("bd.tamano_lote", int, 500, 10, 100000, "Filas por transacción", "Base de datos"),
+    Ajuste("escritor.tamano_grupo", int, 500, 1, 100000, "Facturas por commit en segundo plano", "Base de datos"),
+    Ajuste("escritor.intervalo_ms", int, 100, 10, 5000, "Espera máxima antes de un commit", "Base de datos", "ms"),
+    Ajuste("cache.extracciones_mb", int, 256, 16, 16384, "Caché de extracciones en disco", "Cachés", "MB",
+           "Resultados de QR y OCR guardados por archivo"),
+]
+
+
+class Ajustes:
+    """
+    Valores de los ajustes de DEFINICIONES, con persistencia en JSON.
+
+    Los valores se leen con `ajustes[clave]`. `cambiar` valida el valor y
+    llama a los suscriptores con (clave, valor) si cambió; los suscriptores
+    se llaman en el hilo que hizo el cambio (el de la interfaz).
+    """
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta or os.path.join("data", "ajustes.json")
+        self.definiciones = {definicion.clave: definicion for definicion in DEFINICIONES}
+        self._valores = {clave: definicion.defecto for clave, definicion in self.definiciones.items()}
+        self._suscriptores = []
+        self.modificado = False  # hay cambios sin guardar
+
+    def __getitem__(self, clave):
+        return self._valores[clave]
+
+    def valores(self):
+        return dict(self._valores)
+
+    def suscribir(self, funcion):
+        self._suscriptores.append(funcion)
+
+    def desuscribir(self, funcion):
+        if funcion in self._suscriptores:
+            self._suscriptores.remove(funcion)
+
+    def cambiar(self, clave, valor):
+        """
+        Cambia un ajuste y avisa a los suscriptores.
+
+        Returns:
+            El valor que quedó, ya convertido y dentro del rango.
+
+        Raises:
+            KeyError: Si el ajuste no existe.
+            ValueError: Si el valor no es válido.
+        """
+        valor = self.definiciones[clave].normalizar(valor)
+        if self._valores[clave] == valor:
+            return valor
+        self._valores[clave] = valor
+        self.modificado = True
+        for funcion in list(self._suscriptores):
+            try:
+                funcion(clave, valor)
+            except Exception as e:
+                print(f"Error al aplicar el ajuste {clave}: {e}")
+        return valor
+
+    def restablecer(self):
+        """
+        Vuelve todos los ajustes a su valor por defecto.
+        """
+        for clave, definicion in self.definiciones.items():
+            self.cambiar(clave, definicion.defecto)
+
+    def cargar(self):
+        """
+        Lee los ajustes guardados. Los que falten o no sean válidos quedan con
+        su valor actual; los desconocidos se ignoran.
+        """
+        if not os.path.exists(self.ruta):
+            return
+        try:
+            with open(self.ruta, encoding="utf-8") as f:
+                guardados = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error al leer los ajustes de {self.ruta}: {e}")
+            return
+        if not isinstance(guardados, dict):
+            print(f"Error al leer los ajustes de {self.ruta}: no es un objeto JSON")
+            return
+        for clave, valor in guardados.items():
+            if clave not in self.definiciones:
+                continue
+            try:
+                self.cambiar(clave, valor)
+            except ValueError as e:
+                print(f"Ajuste ignorado: {e}")
+        self.modificado = False
+
+    def guardar(self):
+        """
+        Escribe los ajustes en `ruta`. Se escribe primero a un archivo
+        temporal, así un error no deja el archivo a medias.
+
+        Raises:
+            OSError: Si no se pudo escribir.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(self.ruta)), exist_ok=True)
+        temporal = self.ruta + ".parcial"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(self._valores, f, ensure_ascii=False, indent=2)
+        os.replace(temporal, self.ruta)
+        self.modificado = False
+
+    def dpi_por_proposito(self):
+        """
+        Resoluciones de renderizado en el formato de ServicioRenderPDF.
+        """
+        return {proposito: self[f"pdf.dpi_{proposito}"] for proposito in ("vista_previa", "qr", "ocr")}
+
+
+AJUSTES = Ajustes()
@@ -0,0 +1,204 @@
+# oscar14_analitica.py
+import sqlite3
+
+import numpy as np
+
+from oscar14_migraciones import COLUMNAS_MONTO
+from oscar14_validacion import (igv_inconsistente, total_inconsistente,
+                                TASA_IGV, TOLERANCIA_CENTIMOS, TOLERANCIA_RELATIVA)
+
+COLUMNAS_CATEGORICAS = ["ruc_emisor", "ruc_adquiriente", "tipo_comprobante"]
+
+
+class InstantaneaFacturas:
+    """
+    Copia en memoria de la tabla facturas por columnas, como arreglos de NumPy.
+
+    - Los montos se guardan en céntimos como float64, con NaN donde falta el dato.
+    - La fecha de emisión es datetime64[D], con NaT donde falta.
+    - Los RUC y el tipo de comprobante se guardan como códigos enteros; el
+      valor de cada código está en `categorias[columna]`.
+
+    `refrescar` lee solo las facturas con id mayor que el último leído. Si
+    la cantidad de facturas no coincide con la de la base (se borró alguna)
+    se vuelve a leer todo. Los cambios de montos de facturas ya leídas no se
+    detectan; para eso está `recargar`.
+    """
+
+    def __init__(self, db, tamano_bloque=10000):
+        self.db = db
+        self.tamano_bloque = tamano_bloque
+        self.recargar()
+
+    def recargar(self):
+        """
+        Descarta la copia y la vuelve a leer completa.
+        """
+        self.n = 0
+        self.ultimo_id = 0
+        self.categorias = {columna: [] for columna in COLUMNAS_CATEGORICAS}
+        self._indices = {columna: {} for columna in COLUMNAS_CATEGORICAS}
+        self._columnas = {"id": np.empty(0, dtype=np.int64),
+                          "fecha_emision": np.empty(0, dtype="datetime64[D]")}
+        for columna in COLUMNAS_MONTO:
+            self._columnas[columna] = np.empty(0, dtype=np.float64)
+        for columna in COLUMNAS_CATEGORICAS:
+            self._columnas[columna] = np.empty(0, dtype=np.int32)
+        return self._leer_nuevas()
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, columna):
+        """
+        Arreglo de la columna con solo las filas válidas (vista, sin copia).
+        """
+        return self._columnas[columna][:self.n]
+
+    def _reservar(self, cantidad):
+        # Crecimiento geométrico, como una lista: añadir filas cuesta O(1) amortizado
+        necesario = self.n + cantidad
+        capacidad = len(self._columnas["id"])
+        if necesario <= capacidad:
+            return
+        nueva = max(necesario, capacidad * 2, 1024)
+        for columna, arreglo in self._columnas.items():
+            ampliado = np.empty(nueva, dtype=arreglo.dtype)
+            ampliado[:self.n] = arreglo[:self.n]
+            self._columnas[columna] = ampliado
+
+    def _codificar(self, columna, valores):
+        indices = self._indices[columna]
+        categorias = self.categorias[columna]
+        codigos = np.empty(len(valores), dtype=np.int32)
+        for i, valor in enumerate(valores):
+            codigo = indices.get(valor)
+            if codigo is None:
+                codigo = indices[valor] = len(categorias)
+                categorias.append(valor)
+            codigos[i] = codigo
+        return codigos
+
+    def _agregar(self, filas):
+        columnas = list(zip(*filas))
+        nombres = ["id", "fecha_emision"] + COLUMNAS_MONTO + COLUMNAS_CATEGORICAS
+        datos = dict(zip(nombres, columnas))
+        inicio, fin = self.n, self.n + len(filas)
+        self._reservar(len(filas))
+        self._columnas["id"][inicio:fin] = datos["id"]
+        # Las fechas ya están en ISO; None pasa a NaT
+        self._columnas["fecha_emision"][inicio:fin] = np.array(
+            [fecha or "NaT" for fecha in datos["fecha_emision"]], dtype="datetime64[D]")
+        for columna in COLUMNAS_MONTO:
+            self._columnas[columna][inicio:fin] = np.array(datos[columna], dtype=np.float64)  # None -> NaN
+        for columna in COLUMNAS_CATEGORICAS:
+            self._columnas[columna][inicio:fin] = self._codificar(columna, datos[columna])
+        self.n = fin
+        self.ultimo_id = int(datos["id"][-1])
+
+    def _leer_nuevas(self):
+        query = (f"SELECT id, fecha_emision, {', '.join(COLUMNAS_MONTO)}, {', '.join(COLUMNAS_CATEGORICAS)} "
+                 "FROM facturas WHERE id > ? ORDER BY id")
+        nuevas = 0
+        try:
+            cursor = self.db.lectura.execute(query, (self.ultimo_id,))
+            while True:
+                filas = cursor.fetchmany(self.tamano_bloque)
+                if not filas:
+                    break
+                self._agregar(filas)
+                nuevas += len(filas)
+        except sqlite3.Error as e:
+            print(f"Error al leer las facturas para el análisis: {e}")
+        return nuevas
+
+    def refrescar(self):
+        """
+        Añade las facturas nuevas desde el último refresco.
+
+        Returns:
+            int: Número de facturas leídas.
+        """
+        nuevas = self._leer_nuevas()
+        try:
+            # La cantidad sale de resumen_mensual, que tiene una fila por mes, sin contar la tabla facturas
+            total = self.db.lectura.execute("SELECT IFNULL(SUM(cantidad), 0) FROM resumen_mensual").fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Error al contar las facturas: {e}")
+            return nuevas
+        if total != self.n:
+            return self.recargar()
+        return nuevas
+
+    def histograma(self, columna="monto_total", bins=30):
+        """
+        Histograma de un monto, en soles, sin los valores que faltan.
+
+        Returns:
+            tuple: (conteos, bordes) como np.histogram.
+        """
+        valores = self[columna]
+        valores = valores[~np.isnan(valores)] / 100
+        if not len(valores):
+            return np.zeros(bins, dtype=np.int64), np.linspace(0, 1, bins + 1)
+        return np.histogram(valores, bins=bins)
+
+    def percentiles(self, columna="monto_total", cuantiles=(50, 90, 95, 99)):
+        """
+        Percentiles de un monto, en soles, como diccionario {cuantil: valor}.
+        """
+        valores = self[columna]
+        valores = valores[~np.isnan(valores)]
+        if not len(valores):
+            return {}
+        return dict(zip(cuantiles, np.percentile(valores, cuantiles) / 100))
+
+    def volumen_diario(self, ventana=7):
+        """
+        Facturas y monto por día de emisión, con la media móvil de la cantidad.
+
+        Los días sin facturas entre la primera y la última fecha cuentan como cero.
+
+        Returns:
+            tuple: (dias, cantidades, montos en soles, media móvil de `ventana` días).
+        """
+        fechas = self["fecha_emision"]
+        validas = ~np.isnat(fechas)
+        fechas = fechas[validas]
+        if not len(fechas):
+            vacio = np.empty(0)
+            return np.empty(0, dtype="datetime64[D]"), vacio, vacio, vacio
+        primera = fechas.min()
+        desplazamiento = (fechas - primera).astype(np.int64)
+        dias = np.arange(primera, fechas.max() + np.timedelta64(1, "D"))
+        cantidades = np.bincount(desplazamiento, minlength=len(dias)).astype(np.float64)
+        montos = np.bincount(desplazamiento, weights=np.nan_to_num(self["monto_total"][validas]),
+                             minlength=len(dias)) / 100
+        # Media móvil con sumas acumuladas; los primeros días promedian los disponibles
+        acumulado = np.cumsum(np.insert(cantidades, 0, 0))
+        inicio = np.maximum(np.arange(1, len(dias) + 1) - ventana, 0)
+        fin = np.arange(1, len(dias) + 1)
+        media = (acumulado[fin] - acumulado[inicio]) / (fin - inicio)
+        return dias, cantidades, montos, media
+
+    def verificar_consistencia(self, tasa_igv=TASA_IGV, tolerancia=TOLERANCIA_CENTIMOS,
+                               tolerancia_relativa=TOLERANCIA_RELATIVA):
+        """
+        Comprueba todas las facturas a la vez y devuelve los id de las sospechosas.
+
+        - "igv": el IGV se aparta de `tasa_igv` por el valor de venta gravada.
+        - "total": el total no es la suma de gravada, inafecta, exonerada e IGV.
+
+        Son las mismas reglas que usa la validación de oscar14_validacion,
+        aplicadas a toda la instantánea.
+
+        Returns:
+            dict: {"igv": arreglo de id, "total": arreglo de id}.
+        """
+        ids = self["id"]
+        igv_incorrecto = igv_inconsistente(self["valor_venta_gravada"], self["monto_igv"], tasa_igv,
+                                           tolerancia, tolerancia_relativa)
+        total_incorrecto = total_inconsistente(self["monto_total"], self["valor_venta_gravada"],
+                                               self["valor_venta_inafecta"], self["valor_venta_exonerada"],
+                                               self["monto_igv"], tolerancia, tolerancia_relativa)
+        return {"igv": ids[igv_incorrecto], "total": ids[total_incorrecto]}
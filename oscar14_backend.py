@@ -1,7 +1,119 @@
 # oscar14_backend.py #
 import sqlite3
 import os
-from openpyxl import Workbook
+import itertools
+import re
+from datetime import datetime
+from oscar14_conexiones import GestorConexiones
+from oscar14_exportacion import exportar
+from oscar14_metricas import METRICAS
+from oscar14_validacion import validar_columnas, estado_para, ESTADOS_LOCALES, VERSION_REGLAS
+from oscar14_migraciones import (aplicar_migraciones, a_centimos, de_centimos, normalizar_fecha, normalizar_numeracion,
+                                 COLUMNAS_MONTO)
+
+# Columnas de la tabla facturas, en el orden en que se insertan
+COLUMNAS_FACTURA = [
+    "ruc_emisor", "tipo_comprobante", "serie", "numeracion", "monto_total",
+    "fecha_emision", "monto_igv", "ruc_adquiriente", "razon_social_emisor",
+    "razon_social_adquiriente", "valor_venta_gravada", "valor_venta_inafecta",
+    "valor_venta_exonerada", "codigo_hash", "domicilio_emisor",
+    "domicilio_adquiriente", "fecha_registro", "estado_validacion",
+    "observaciones_validacion"
+]
+
+# Clave natural de una factura: un mismo comprobante no se registra dos veces
+COLUMNAS_CLAVE_NATURAL = ["ruc_emisor", "tipo_comprobante", "serie", "numeracion"]
+
+# Columnas que devuelven las consultas y columnas por las que se puede ordenar
+COLUMNAS_CONSULTA = ["id"] + COLUMNAS_FACTURA
+COLUMNAS_ORDENABLES = COLUMNAS_CONSULTA
+
+# Correspondencia entre las etiquetas de los formularios y las columnas de la tabla
+CAMPOS_FORMULARIO = {
+    "RUC Emisor": "ruc_emisor",
+    "Tipo Comprobante": "tipo_comprobante",
+    "Serie": "serie",
+    "Numeración": "numeracion",
+    "Monto Total": "monto_total",
+    "Fecha Emisión": "fecha_emision",
+    "Monto IGV": "monto_igv",
+    "RUC Adquiriente": "ruc_adquiriente",
+    "Razón Social Emisor": "razon_social_emisor",
+    "Razón Social Adquiriente": "razon_social_adquiriente",
+    "Valor Venta Gravada": "valor_venta_gravada",
+    "Valor Venta Inafecta": "valor_venta_inafecta",
+    "Valor Venta Exonerada": "valor_venta_exonerada",
+    "Código Hash": "codigo_hash",
+    "Domicilio Emisor": "domicilio_emisor",
+    "Domicilio Adquiriente": "domicilio_adquiriente",
+    "Fecha Registro": "fecha_registro",
+    "Estado Validación": "estado_validacion",
+    "Observaciones Validación": "observaciones_validacion"
+}
+
+# Pesos de bm25 para ordenar la búsqueda de texto, en el orden de
+# oscar14_migraciones.COLUMNAS_TEXTO:
+# una coincidencia en la razón social pesa más que en el domicilio
+PESOS_BUSQUEDA = (10.0, 10.0, 1.0, 1.0)
+
+# Nombre de cada tipo de comprobante (códigos SUNAT)
+NOMBRES_TIPO_COMPROBANTE = {
+    "01": "Factura",
+    "03": "Boleta",
+    "07": "Nota de crédito",
+    "08": "Nota de débito",
+}
+
+# Orden de los campos dentro del texto de un código QR, separados por '|'
+CAMPOS_QR = COLUMNAS_FACTURA[:14]
+
+
+def parsear_datos_qr(data):
+    """
+    Descompone el texto de un código QR en un diccionario por columna.
+
+    Los campos que faltan al final del texto quedan vacíos.
+    """
+    valores = [valor.strip() for valor in data.split("|")]
+    return {columna: valores[i] if i < len(valores) else "" for i, columna in enumerate(CAMPOS_QR)}
+
+
+def consulta_fts(texto):
+    """
+    Convierte lo que escribe el usuario en una consulta FTS5 de prefijos.
+
+    Cada palabra se busca como prefijo y todas deben aparecer: "ferr lim"
+    encuentra "FERRETERÍA LIMA S.A.C.". Las palabras van entre comillas para
+    que los caracteres especiales de FTS5 no rompan la consulta.
+
+    Devuelve None si el texto no tiene palabras.
+    """
+    palabras = re.findall(r"\w+", texto or "")
+    if not palabras:
+        return None
+    return " ".join(f'"{palabra}"*' for palabra in palabras)
+
+
+def _convertir_filtro(conversion, valor, nombre):
+    """
+    Convierte el valor de un filtro; uno que no se reconoce es un error y no
+    un NULL, que dejaría la consulta sin resultados sin avisar.
+    """
+    convertido = conversion(valor)
+    if convertido is None:
+        raise ValueError(f"Valor no válido en {nombre}: {valor}")
+    return convertido
+
+
+def clave_natural(factura):
+    """
+    Devuelve la clave natural (RUC emisor, tipo, serie, numeración) de una factura,
+    normalizada igual que en `FacturaDatabase.preparar_fila`.
+    """
+    clave = [str(factura.get(columna) or "").strip() for columna in COLUMNAS_CLAVE_NATURAL]
+    clave[3] = normalizar_numeracion(clave[3])
+    return tuple(clave)
+
 
 class DataHandler:
     def __init__(self):
@@ -20,100 +132,506 @@ class DataHandler:
             print(f"Error al guardar en archivo: {e}")
 
     def exportar_a_archivos(self, facturas):
+        # Se recorre dos veces: `facturas` debe ser una lista, no un generador
         self.exportar_a_txt(facturas)
         self.exportar_a_excel(facturas)
 
+    def _filas_y_encabezados(self, facturas):
+        facturas = iter(facturas)
+        primera = next(facturas, None)
+        if primera is None:
+            return [], []
+        encabezados = list(primera.keys())
+        filas = itertools.chain([primera], facturas)
+        return (list(factura.values()) for factura in filas), encabezados
+
     def exportar_a_txt(self, facturas):
         try:
-            with open(self.txt_file, 'w') as f:
-                for factura in facturas:
-                    f.write(", ".join(f"{key}: {value}" for key, value in factura.items()) + "\n")
+            filas, encabezados = self._filas_y_encabezados(facturas)
+            exportar(filas, encabezados, self.txt_file, "txt")
         except Exception as e:
             print(f"Error al exportar a TXT: {e}")
 
     def exportar_a_excel(self, facturas):
         try:
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Facturas"
-
-            encabezados = facturas[0].keys()
-            ws.append(list(encabezados))
-
-            for factura in facturas:
-                ws.append(list(factura.values()))
-
-            wb.save(self.xlsx_file)
+            filas, encabezados = self._filas_y_encabezados(facturas)
+            exportar(filas, encabezados, self.xlsx_file, "xlsx")
         except Exception as e:
             print(f"Error al exportar a Excel: {e}")
 
 class FacturaDatabase:
-    def __init__(self):
+    def __init__(self, tamano_lote=500, solo_lectura=False):
+        """
+        Args:
+            tamano_lote: Filas por transacción y por lectura de cursor.
+            solo_lectura: No crear ni migrar la base; `conn` es entonces la
+                conexión de lectura del hilo que la use.
+
+        Las conexiones las administra un GestorConexiones: las consultas usan
+        la conexión de lectura del hilo que llama, así que pueden hacerse
+        desde hilos de trabajo mientras otro escribe, y los guardados usan
+        la única conexión de escritura.
+        """
         self.data_dir = 'data'
         self.db_path = os.path.join(self.data_dir, 'facturas.db')
+        self.tamano_lote = tamano_lote
+        self.solo_lectura = solo_lectura
 
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
 
-        self.conn = sqlite3.connect(self.db_path)
-        self.crear_tabla_facturas()
+        self.gestor = GestorConexiones(self.db_path)
+        if not solo_lectura:
+            self.crear_tabla_facturas()
+
+    @property
+    def conn(self):
+        """
+        Conexión de escritura (o la de lectura del hilo, si la base es de solo lectura).
+        """
+        if self.solo_lectura:
+            return self.gestor.lectura()
+        return self.gestor.escritura()
+
+    @property
+    def lectura(self):
+        """
+        Conexión de solo lectura del hilo actual.
+        """
+        return self.gestor.lectura()
+
+    def cerrar_lectura(self):
+        """
+        Cierra la conexión de lectura del hilo actual; los hilos de trabajo la
+        llaman al terminar.
+        """
+        self.gestor.cerrar_lectura()
 
     def crear_tabla_facturas(self):
+        """
+        Crea la tabla de facturas o actualiza su esquema a la última versión.
+        """
         try:
-            query = """
-            CREATE TABLE IF NOT EXISTS facturas (
-                ruc_emisor TEXT,
-                tipo_comprobante TEXT,
-                serie TEXT,
-                numeracion TEXT,
-                monto_total TEXT,
-                fecha_emision TEXT,
-                monto_igv TEXT,
-                ruc_adquiriente TEXT,
-                razon_social_emisor TEXT,
-                razon_social_adquiriente TEXT,
-                valor_venta_gravada TEXT,
-                valor_venta_inafecta TEXT,
-                valor_venta_exonerada TEXT,
-                codigo_hash TEXT,
-                domicilio_emisor TEXT,
-                domicilio_adquiriente TEXT,
-                fecha_registro TEXT,
-                estado_validacion TEXT
-            )
-            """
-            self.conn.execute(query)
-            self.conn.commit()
+            with self.gestor.candado_escritura:
+                aplicar_migraciones(self.conn)
         except sqlite3.Error as e:
             print(f"Error al crear la tabla de facturas: {e}")
 
+    def preparar_fila(self, datos):
+        """
+        Convierte un diccionario de factura en la tupla de valores a insertar.
+
+        Acepta como claves tanto las etiquetas del formulario ("RUC Emisor")
+        como los nombres de columna ("ruc_emisor"). Las columnas ausentes
+        quedan vacías y la fecha de registro se completa con la hora actual.
+        Los montos se guardan en céntimos, las fechas en formato ISO y la
+        numeración sin ceros a la izquierda.
+        """
+        fila = {CAMPOS_FORMULARIO.get(clave, clave): valor for clave, valor in datos.items()}
+        desconocidas = set(fila) - set(COLUMNAS_FACTURA)
+        if desconocidas:
+            raise ValueError(f"Campos desconocidos: {', '.join(sorted(desconocidas))}")
+        if not fila.get("fecha_registro"):
+            fila["fecha_registro"] = datetime.now().isoformat(sep=" ", timespec="seconds")
+        for columna in COLUMNAS_CLAVE_NATURAL:
+            fila[columna] = str(fila.get(columna) or "").strip()
+        fila["numeracion"] = normalizar_numeracion(fila["numeracion"])
+        for columna in COLUMNAS_MONTO:
+            fila[columna] = a_centimos(fila.get(columna))
+        fila["fecha_emision"] = normalizar_fecha(fila.get("fecha_emision"))
+        return tuple(fila.get(columna) for columna in COLUMNAS_FACTURA)
+
+    def validar_lote(self, lote):
+        """
+        Valida las filas preparadas antes de insertarlas (ver oscar14_validacion).
+
+        Completa las observaciones, el estado (si no trae uno de SUNAT) y añade
+        al final la versión de las reglas, como espera `consulta_insercion`.
+        """
+        observaciones = validar_columnas(dict(zip(COLUMNAS_FACTURA, zip(*lote))))
+        indice_estado = COLUMNAS_FACTURA.index("estado_validacion")
+        indice_observaciones = COLUMNAS_FACTURA.index("observaciones_validacion")
+        validadas = []
+        for fila, observacion in zip(lote, observaciones):
+            fila = list(fila)
+            if (fila[indice_estado] or "") in ESTADOS_LOCALES:
+                fila[indice_estado] = estado_para(observacion)
+            fila[indice_observaciones] = observacion
+            validadas.append(tuple(fila) + (VERSION_REGLAS,))
+        return validadas
+
+    def consulta_insercion(self):
+        columnas = ", ".join(COLUMNAS_FACTURA + ["version_validacion"])
+        marcadores = ", ".join("?" for _ in range(len(COLUMNAS_FACTURA) + 1))
+        # Una factura ya registrada (misma clave natural) se ignora sin error
+        return f"INSERT OR IGNORE INTO facturas ({columnas}) VALUES ({marcadores})"
+
     def guardar_factura(self, datos):
         try:
-            query = """
-            INSERT INTO facturas (ruc_emisor, tipo_comprobante, serie, numeracion, monto_total, fecha_emision, monto_igv,
-                                  ruc_adquiriente, razon_social_emisor, razon_social_adquiriente, valor_venta_gravada,
-                                  valor_venta_inafecta, valor_venta_exonerada, codigo_hash, domicilio_emisor,
-                                  domicilio_adquiriente, fecha_registro, estado_validacion)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """
-            self.conn.execute(query, tuple(datos.values()))
-            self.conn.commit()
-        except sqlite3.Error as e:
+            with METRICAS.medir("bd.insercion"), self.gestor.candado_escritura, self.conn:
+                self.conn.execute(self.consulta_insercion(), self.validar_lote([self.preparar_fila(datos)])[0])
+        except (sqlite3.Error, ValueError) as e:
             print(f"Error al guardar la factura en la base de datos: {e}")
 
+    def guardar_facturas_lote(self, facturas, tamano_lote=None):
+        """
+        Guarda muchas facturas agrupando los commits.
+
+        Cada lote se valida con las reglas locales antes de insertarlo, así las
+        facturas nuevas no quedan pendientes de validación.
+
+        Las filas se insertan con executemany en lotes de `tamano_lote`, y cada
+        lote se confirma en una sola transacción. Si un lote falla, se repite
+        fila a fila para aislar las filas inválidas sin perder las demás. Las
+        facturas ya registradas se cuentan como rechazadas.
+
+        Args:
+            facturas: Iterable de diccionarios (ver `preparar_fila`).
+            tamano_lote: Filas por transacción; por defecto `self.tamano_lote`.
+
+        Returns:
+            dict: {"insertadas": int, "rechazadas": int}
+
+        Raises:
+            sqlite3.OperationalError: Si la base está ocupada, bloqueada o no
+                se pudo escribir. Los lotes ya confirmados quedan guardados.
+        """
+        tamano_lote = tamano_lote or self.tamano_lote
+        resultado = {"insertadas": 0, "rechazadas": 0}
+        lote = []
+        for datos in facturas:
+            try:
+                lote.append(self.preparar_fila(datos))
+            except (ValueError, AttributeError) as e:
+                print(f"Factura rechazada: {e}")
+                resultado["rechazadas"] += 1
+                continue
+            if len(lote) >= tamano_lote:
+                self._insertar_lote(lote, resultado)
+                lote = []
+        if lote:
+            self._insertar_lote(lote, resultado)
+        return resultado
+
+    def _insertar_lote(self, lote, resultado):
+        consulta = self.consulta_insercion()
+        lote = self.validar_lote(lote)
+        METRICAS.contar("bd.filas", len(lote))
+        with METRICAS.medir("bd.insercion"), self.gestor.candado_escritura:
+            try:
+                with self.conn:
+                    cursor = self.conn.executemany(consulta, lote)
+                resultado["insertadas"] += cursor.rowcount
+                resultado["rechazadas"] += len(lote) - cursor.rowcount
+                return
+            except sqlite3.OperationalError:
+                # Base ocupada, bloqueada o error de disco: no es culpa de las filas
+                raise
+            except sqlite3.Error as e:
+                print(f"Error al guardar el lote, reintentando fila a fila: {e}")
+
+            insertadas = rechazadas = 0
+            with self.conn:
+                for fila in lote:
+                    try:
+                        cursor = self.conn.execute(consulta, fila)
+                        insertadas += cursor.rowcount
+                        rechazadas += 1 - cursor.rowcount
+                    except sqlite3.OperationalError:
+                        raise
+                    except sqlite3.Error as e:
+                        print(f"Factura rechazada: {e}")
+                        rechazadas += 1
+            resultado["insertadas"] += insertadas
+            resultado["rechazadas"] += rechazadas
+
     def obtener_facturas(self):
+        """
+        Devuelve todas las facturas en una lista, sin la columna id.
+
+        Se mantiene por compatibilidad; para tablas grandes usar
+        `iterar_facturas` u `obtener_pagina`, que no cargan todo en memoria.
+        """
+        facturas = []
+        try:
+            for factura in self.iterar_facturas():
+                del factura["id"]
+                facturas.append(factura)
+        except sqlite3.Error as e:
+            print(f"Error al obtener facturas: {e}")
+        return facturas
+
+    def construir_filtros(self, ruc=None, ruc_emisor=None, ruc_adquiriente=None,
+                          fecha_desde=None, fecha_hasta=None, monto_min=None,
+                          monto_max=None, estado_validacion=None, texto=None):
+        """
+        Traduce los filtros a una cláusula WHERE con parámetros.
+
+        Args:
+            ruc: RUC del emisor o del adquiriente.
+            ruc_emisor, ruc_adquiriente: RUC exacto de cada parte.
+            fecha_desde, fecha_hasta: Rango de fecha de emisión (inclusive).
+            monto_min, monto_max: Rango del monto total (inclusive).
+            estado_validacion: Estado exacto; "" selecciona las no validadas.
+            texto: Palabras (o comienzos de palabra) a buscar en razones sociales
+                y domicilios con el índice de texto completo.
+
+        Returns:
+            tuple: (lista de condiciones SQL, lista de parámetros)
+
+        Raises:
+            ValueError: Si una fecha o un monto no se reconoce.
+        """
+        condiciones, parametros = [], []
+        if ruc:
+            condiciones.append("(ruc_emisor = ? OR ruc_adquiriente = ?)")
+            parametros += [ruc, ruc]
+        if ruc_emisor:
+            condiciones.append("ruc_emisor = ?")
+            parametros.append(ruc_emisor)
+        if ruc_adquiriente:
+            condiciones.append("ruc_adquiriente = ?")
+            parametros.append(ruc_adquiriente)
+        if fecha_desde:
+            condiciones.append("fecha_emision >= ?")
+            parametros.append(_convertir_filtro(normalizar_fecha, fecha_desde, "Fecha desde"))
+        if fecha_hasta:
+            condiciones.append("fecha_emision <= ?")
+            parametros.append(_convertir_filtro(normalizar_fecha, fecha_hasta, "Fecha hasta"))
+        if monto_min not in (None, ""):
+            condiciones.append("monto_total >= ?")
+            parametros.append(_convertir_filtro(a_centimos, monto_min, "Monto mínimo"))
+        if monto_max not in (None, ""):
+            condiciones.append("monto_total <= ?")
+            parametros.append(_convertir_filtro(a_centimos, monto_max, "Monto máximo"))
+        if estado_validacion == "":
+            condiciones.append("(estado_validacion IS NULL OR estado_validacion = '')")
+        elif estado_validacion is not None:
+            condiciones.append("estado_validacion = ?")
+            parametros.append(estado_validacion)
+        consulta = consulta_fts(texto)
+        if consulta:
+            condiciones.append("id IN (SELECT rowid FROM facturas_fts WHERE facturas_fts MATCH ?)")
+            parametros.append(consulta)
+        return condiciones, parametros
+
+    def _condicion_keyset(self, orden, descendente, despues_de):
+        """
+        Condición para continuar después de la fila `despues_de` = (valor, id).
+
+        SQLite ordena los NULL primero en orden ascendente y al final en
+        descendente, por eso se tratan aparte.
+        """
+        valor, ultimo_id = despues_de
+        if orden == "id":
+            return ("id < ?" if descendente else "id > ?"), [ultimo_id]
+        if descendente:
+            if valor is None:
+                return f"({orden} IS NULL AND id < ?)", [ultimo_id]
+            return (f"({orden} < ? OR ({orden} = ? AND id < ?) OR {orden} IS NULL)",
+                    [valor, valor, ultimo_id])
+        if valor is None:
+            return f"(({orden} IS NULL AND id > ?) OR {orden} IS NOT NULL)", [ultimo_id]
+        return f"({orden} > ? OR ({orden} = ? AND id > ?))", [valor, valor, ultimo_id]
+
+    def _consultar(self, orden="id", descendente=False, despues_de=None, limite=None,
+                   tamano_bloque=None, **filtros):
+        """
+        Generador de filas crudas (id + COLUMNAS_FACTURA) leídas por bloques.
+        """
+        if orden not in COLUMNAS_ORDENABLES:
+            raise ValueError(f"No se puede ordenar por '{orden}'")
+        condiciones, parametros = self.construir_filtros(**filtros)
+        if despues_de is not None:
+            condicion, valores = self._condicion_keyset(orden, descendente, despues_de)
+            condiciones.append(condicion)
+            parametros += valores
+
+        direccion = "DESC" if descendente else "ASC"
+        query = f"SELECT {', '.join(COLUMNAS_CONSULTA)} FROM facturas"
+        if condiciones:
+            query += " WHERE " + " AND ".join(condiciones)
+        if orden == "id":
+            query += f" ORDER BY id {direccion}"
+        else:
+            query += f" ORDER BY {orden} {direccion}, id {direccion}"
+        if limite is not None:
+            query += " LIMIT ?"
+            parametros.append(int(limite))
+
+        cursor = self.lectura.execute(query, parametros)
+        tamano_bloque = tamano_bloque or self.tamano_lote
         try:
-            query = "SELECT * FROM facturas"
-            cursor = self.conn.execute(query)
-            columnas = [column[0] for column in cursor.description]
-            return [dict(zip(columnas, row)) for row in cursor.fetchall()]
+            while True:
+                filas = cursor.fetchmany(tamano_bloque)
+                if not filas:
+                    break
+                yield from filas
+        finally:
+            cursor.close()
+
+    def iterar_facturas(self, orden="id", descendente=False, despues_de=None, limite=None,
+                        tamano_bloque=None, **filtros):
+        """
+        Recorre las facturas de forma perezosa, con memoria constante.
+
+        El filtrado y el orden se hacen en SQLite (ver `construir_filtros` para
+        los filtros disponibles). Cada factura es un diccionario con "id" y las
+        columnas de COLUMNAS_FACTURA, con los montos en texto decimal.
+
+        Args:
+            orden: Columna de orden; conviene usar una indexada
+                (id, fecha_emision, ruc_emisor, ruc_adquiriente, monto_total).
+            descendente: Ordenar de mayor a menor.
+            despues_de: Cursor (valor, id) devuelto por `obtener_pagina`.
+            limite: Número máximo de facturas.
+            tamano_bloque: Filas leídas del cursor en cada fetchmany.
+
+        Raises:
+            sqlite3.Error: Si la lectura falla a mitad del recorrido; así quien
+                exporta no confunde un recorrido cortado con uno completo.
+        """
+        for fila in self._consultar(orden, descendente, despues_de, limite, tamano_bloque, **filtros):
+            yield self.fila_a_dict(fila)
+
+    def obtener_pagina(self, limite=100, despues_de=None, orden="id", descendente=False, **filtros):
+        """
+        Devuelve una página de facturas con paginación por clave (keyset).
+
+        A diferencia de OFFSET, el coste de cada página no depende de su posición.
+
+        Returns:
+            tuple: (lista de facturas, cursor para la página siguiente o None si no hay más)
+        """
+        try:
+            filas = list(self._consultar(orden, descendente, despues_de, limite, **filtros))
         except sqlite3.Error as e:
             print(f"Error al obtener facturas: {e}")
+            return [], None
+        siguiente = None
+        if len(filas) == limite:
+            ultima = filas[-1]
+            siguiente = (ultima[COLUMNAS_CONSULTA.index(orden)], ultima[0])
+        return [self.fila_a_dict(fila) for fila in filas], siguiente
+
+    def contar_facturas(self, **filtros):
+        """
+        Cuenta las facturas que cumplen los filtros sin leer sus columnas.
+        """
+        condiciones, parametros = self.construir_filtros(**filtros)
+        query = "SELECT COUNT(*) FROM facturas"
+        if condiciones:
+            query += " WHERE " + " AND ".join(condiciones)
+        try:
+            return self.lectura.execute(query, parametros).fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Error al contar facturas: {e}")
+            return 0
+
+    def buscar_texto(self, texto, limite=100, desplazamiento=0, **filtros):
+        """
+        Busca en razones sociales y domicilios y devuelve las facturas por relevancia.
+
+        Usa el índice FTS5 (sin distinguir tildes ni mayúsculas, con cada palabra
+        como prefijo) y ordena con bm25, dando más peso a las razones sociales.
+
+        Args:
+            texto: Lo que escribió el usuario.
+            limite: Máximo de facturas a devolver.
+            desplazamiento: Facturas a saltar, para pedir páginas siguientes.
+            **filtros: Filtros adicionales de `construir_filtros`.
+
+        Returns:
+            list: Diccionarios de facturas, de la más a la menos relevante.
+        """
+        consulta = consulta_fts(texto)
+        if not consulta:
+            return []
+        filtros.pop("texto", None)
+        condiciones, parametros = self.construir_filtros(**filtros)
+        pesos = ", ".join(str(peso) for peso in PESOS_BUSQUEDA)
+        query = (f"SELECT {', '.join('f.' + columna for columna in COLUMNAS_CONSULTA)} "
+                 "FROM facturas_fts JOIN facturas AS f ON f.id = facturas_fts.rowid "
+                 "WHERE facturas_fts MATCH ?")
+        for condicion in condiciones:
+            query += " AND " + condicion
+        query += f" ORDER BY bm25(facturas_fts, {pesos}) LIMIT ? OFFSET ?"
+        try:
+            filas = self.lectura.execute(query, [consulta] + parametros + [limite, desplazamiento]).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error en la búsqueda de texto: {e}")
+            return []
+        return [self.fila_a_dict(fila) for fila in filas]
+
+    def resumen_mensual(self):
+        """
+        Cantidad, total e IGV por mes de emisión ("AAAA-MM"), del más antiguo al
+        más reciente. Las facturas sin fecha se agrupan en el mes "".
+
+        Se lee de la tabla resumen_mensual, que mantienen los triggers, así que
+        no depende del tamaño de la tabla facturas.
+
+        Returns:
+            list: Diccionarios con mes, cantidad, monto_total y monto_igv (en soles).
+        """
+        try:
+            filas = self.lectura.execute(
+                "SELECT mes, cantidad, monto_total, monto_igv FROM resumen_mensual WHERE cantidad > 0 ORDER BY mes"
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error al obtener el resumen mensual: {e}")
             return []
+        return [{"mes": mes, "cantidad": cantidad, "monto_total": total / 100, "monto_igv": igv / 100}
+                for mes, cantidad, total, igv in filas]
+
+    def top_emisores(self, limite=10):
+        """
+        Emisores con mayor monto total facturado, de la tabla resumen_emisores.
+
+        Returns:
+            list: Diccionarios con ruc_emisor, razon_social, cantidad y monto_total (en soles).
+        """
+        try:
+            filas = self.lectura.execute(
+                "SELECT ruc_emisor, razon_social, cantidad, monto_total FROM resumen_emisores "
+                "ORDER BY monto_total DESC LIMIT ?", (limite,)
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error al obtener los principales emisores: {e}")
+            return []
+        return [{"ruc_emisor": ruc, "razon_social": razon, "cantidad": cantidad, "monto_total": total / 100}
+                for ruc, razon, cantidad, total in filas]
+
+    def conteo_por_tipo(self):
+        """
+        Cantidad y monto total por tipo de comprobante, de la tabla resumen_tipos.
+
+        Returns:
+            list: Diccionarios con tipo_comprobante, nombre, cantidad y monto_total (en soles).
+        """
+        try:
+            filas = self.lectura.execute(
+                "SELECT tipo_comprobante, cantidad, monto_total FROM resumen_tipos "
+                "WHERE cantidad > 0 ORDER BY cantidad DESC"
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error al obtener el conteo por tipo: {e}")
+            return []
+        return [{"tipo_comprobante": tipo, "nombre": NOMBRES_TIPO_COMPROBANTE.get(tipo, tipo or "Sin tipo"),
+                 "cantidad": cantidad, "monto_total": total / 100}
+                for tipo, cantidad, total in filas]
+
+    def fila_a_dict(self, fila):
+        """
+        Convierte una fila (id + COLUMNAS_FACTURA) en diccionario, con los montos en texto decimal.
+        """
+        factura = dict(zip(COLUMNAS_CONSULTA, fila))
+        for columna in COLUMNAS_MONTO:
+            factura[columna] = de_centimos(factura[columna])
+        return factura
 
     def cerrar_conexion(self):
-        if self.conn:
-            self.conn.close()
+        self.gestor.cerrar()
 
 
 
@@ -0,0 +1,427 @@
+# oscar14_benchmark.py
+"""
+Mediciones de rendimiento reproducibles, con datos sintéticos y sin cámara.
+
+Genera QR con el formato de los comprobantes, frames de cámara y hojas con
+varios QR, PDFs de varias páginas y bases de facturas de varios tamaños, y
+mide la decodificación de QR, el renderizado de PDF, el OCR, la inserción
+fila a fila y por lotes, la lectura de facturas y la exportación a Excel.
+
+Todo se crea en una carpeta temporal; la base de datos real no se toca.
+
+Uso:
+    python oscar14_benchmark.py [--tamanos 1000,10000] [--repeticiones 5] [--semilla 14]
+                                [--solo qr,pdf,ocr,bd] [--salida resultados.json] [--comparar anterior.json]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from oscar14_backend import FacturaDatabase, CAMPOS_QR
+
+GRUPOS = ("qr", "pdf", "ocr", "bd")
+
+# Razones sociales para las facturas sintéticas
+RAZONES_SOCIALES = [
+    "FERRETERIA LIMA S.A.C.", "DISTRIBUIDORA DEL SUR E.I.R.L.", "COMERCIAL ANDINA S.A.",
+    "SERVICIOS GENERALES PERU S.R.L.", "INVERSIONES AREQUIPA S.A.C.", "TRANSPORTES NORTE S.A.",
+]
+
+
+# --- Datos sintéticos ---
+
+def generar_ruc(rng, prefijo="20"):
+    """
+    RUC de 11 dígitos con dígito verificador correcto.
+    """
+    digitos = [int(d) for d in prefijo] + list(rng.integers(0, 10, 10 - len(prefijo)))
+    suma = sum(d * p for d, p in zip(digitos, (5, 4, 3, 2, 7, 6, 5, 4, 3, 2)))
+    verificador = (11 - suma % 11) % 10
+    return "".join(str(d) for d in digitos) + str(verificador)
+
+
+def generar_factura(i, rng, emisores=None):
+    """
+    Diccionario de factura con montos coherentes (IGV del 18 %) y una
+    numeración única por `i`.
+    """
+    emisores = emisores or [generar_ruc(rng) for _ in range(50)]
+    gravada = round(float(rng.uniform(10, 5000)), 2)
+    igv = round(gravada * 0.18, 2)
+    return {
+        "ruc_emisor": emisores[i % len(emisores)],
+        "tipo_comprobante": "01",
+        "serie": f"F{(i // 100000) % 1000:03d}",
+        "numeracion": str(i % 100000 + 1),
+        "monto_total": f"{gravada + igv:.2f}",
+        "fecha_emision": f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+        "monto_igv": f"{igv:.2f}",
+        "ruc_adquiriente": generar_ruc(rng),
+        "razon_social_emisor": RAZONES_SOCIALES[i % len(RAZONES_SOCIALES)],
+        "razon_social_adquiriente": RAZONES_SOCIALES[(i + 3) % len(RAZONES_SOCIALES)],
+        "valor_venta_gravada": f"{gravada:.2f}",
+        "valor_venta_inafecta": "0.00",
+        "valor_venta_exonerada": "0.00",
+        "codigo_hash": "".join(rng.choice(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789+/="), 28)),
+    }
+
+
+def payload_qr(factura):
+    """
+    Texto del QR de una factura, con los campos de CAMPOS_QR separados por '|'.
+    """
+    return "|".join(str(factura.get(columna, "")) for columna in CAMPOS_QR)
+
+
+def imagen_qr(texto, modulo=4, borde=4):
+    """
+    QR en escala de grises (uint8) con `modulo` píxeles por módulo y zona de silencio.
+    """
+    matriz = cv2.QRCodeEncoder.create().encode(texto)
+    matriz = cv2.resize(matriz, None, fx=modulo, fy=modulo, interpolation=cv2.INTER_NEAREST)
+    return cv2.copyMakeBorder(matriz, borde * modulo, borde * modulo, borde * modulo, borde * modulo,
+                              cv2.BORDER_CONSTANT, value=255)
+
+
+def componer_imagen(textos, ancho, alto, rng, modulo=4, ruido=8):
+    """
+    Imagen BGR de `ancho` x `alto` con un QR por texto, repartidos en una
+    cuadrícula, sobre fondo claro con ruido (como una foto de cámara).
+    """
+    fondo = rng.normal(200, ruido, (alto, ancho)).clip(0, 255).astype(np.uint8)
+    columnas = int(np.ceil(np.sqrt(len(textos))))
+    filas = int(np.ceil(len(textos) / columnas))
+    for k, texto in enumerate(textos):
+        qr = imagen_qr(texto, modulo)
+        celda_x, celda_y = ancho // columnas, alto // filas
+        x = (k % columnas) * celda_x + max(0, (celda_x - qr.shape[1]) // 2)
+        y = (k // columnas) * celda_y + max(0, (celda_y - qr.shape[0]) // 2)
+        alto_qr, ancho_qr = min(qr.shape[0], alto - y), min(qr.shape[1], ancho - x)
+        fondo[y:y + alto_qr, x:x + ancho_qr] = qr[:alto_qr, :ancho_qr]
+    return cv2.cvtColor(fondo, cv2.COLOR_GRAY2BGR)
+
+
+def lineas_factura(factura):
+    return [
+        factura["razon_social_emisor"],
+        f"RUC: {factura['ruc_emisor']}",
+        "FACTURA ELECTRONICA",
+        f"{factura['serie']}-{int(factura['numeracion']):08d}",
+        f"FECHA DE EMISION: {factura['fecha_emision'][8:10]}/{factura['fecha_emision'][5:7]}/{factura['fecha_emision'][:4]}",
+        f"SENOR(ES): {factura['razon_social_adquiriente']}",
+        f"RUC: {factura['ruc_adquiriente']}",
+        f"OP. GRAVADA S/ {factura['valor_venta_gravada']}",
+        f"IGV 18% S/ {factura['monto_igv']}",
+        f"IMPORTE TOTAL S/ {factura['monto_total']}",
+    ]
+
+
+def imagen_factura(factura, ancho=1654, alto=2339):
+    """
+    Página blanca (A4 a 200 dpi) con el texto de la factura, para el OCR.
+    """
+    pagina = np.full((alto, ancho), 255, dtype=np.uint8)
+    for k, linea in enumerate(lineas_factura(factura)):
+        cv2.putText(pagina, linea, (120, 200 + k * 90), cv2.FONT_HERSHEY_SIMPLEX, 1.6, 0, 3, cv2.LINE_AA)
+    return pagina
+
+
+def generar_pdf(ruta, facturas):
+    """
+    PDF con una factura por página: su texto y su QR.
+    """
+    import fitz
+
+    documento = fitz.open()
+    for factura in facturas:
+        pagina = documento.new_page(width=595, height=842)  # A4 en puntos
+        for k, linea in enumerate(lineas_factura(factura)):
+            pagina.insert_text((60, 80 + k * 20), linea, fontsize=11)
+        _, png = cv2.imencode(".png", imagen_qr(payload_qr(factura)))
+        pagina.insert_image(fitz.Rect(400, 600, 540, 740), stream=png.tobytes())
+    documento.save(ruta)
+    documento.close()
+
+
+# --- Medición ---
+
+def cronometrar(funcion, repeticiones=5, calentamiento=1):
+    """
+    Ejecuta `funcion` varias veces y devuelve el mínimo, la mediana y la media en segundos.
+    """
+    for _ in range(calentamiento):
+        funcion()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return {"min": min(tiempos), "mediana": statistics.median(tiempos), "media": statistics.fmean(tiempos)}
+
+
+def resultado(prueba, caso, segundos, unidades=1, **extra):
+    """
+    Entrada de resultados; `por_segundo` son unidades (frames, páginas, filas...) por segundo según la mediana.
+    """
+    return {
+        "prueba": prueba,
+        "caso": caso,
+        "segundos": {clave: round(valor, 6) for clave, valor in segundos.items()},
+        "unidades": unidades,
+        "por_segundo": round(unidades / segundos["mediana"], 2) if segundos["mediana"] else None,
+        **extra,
+    }
+
+
+# --- Pruebas ---
+
+def medir_qr(rng, repeticiones):
+    from oscar14_escaneo import DecodificadorAdaptativo
+    from oscar14_qr import decodificar_qr_multiple
+
+    emisores = [generar_ruc(rng) for _ in range(10)]
+    resultados = []
+    casos = [("frame 640x480, 1 QR", 640, 480, 1, 4), ("frame 1920x1080, 3 QR", 1920, 1080, 3, 5),
+             ("hoja 1654x2339, 6 QR", 1654, 2339, 6, 5)]
+    for caso, ancho, alto, cantidad, modulo in casos:
+        textos = [payload_qr(generar_factura(k, rng, emisores)) for k in range(cantidad)]
+        imagen = componer_imagen(textos, ancho, alto, rng, modulo)
+        leidos = {texto for texto, _ in decodificar_qr_multiple(imagen)}
+        segundos = cronometrar(lambda: decodificar_qr_multiple(imagen), repeticiones)
+        resultados.append(resultado("qr.decodificar", caso, segundos, 1,
+                                    leidos=len(leidos & set(textos)), esperados=cantidad))
+
+    # Secuencia de cámara: la misma escena con ruido de sensor distinto en cada frame
+    textos = [payload_qr(generar_factura(k, rng, emisores)) for k in range(2)]
+    base = componer_imagen(textos, 1280, 720, rng, 5, ruido=0).astype(np.int16)
+    frames = [(base + rng.normal(0, 2, base.shape)).clip(0, 255).astype(np.uint8) for _ in range(30)]
+
+    def secuencia():
+        decodificador = DecodificadorAdaptativo()
+        for frame in frames:
+            decodificador.decodificar(frame)
+        return decodificador
+
+    segundos = cronometrar(secuencia, repeticiones)
+    contadores = dict(secuencia().contadores)
+    resultados.append(resultado("qr.adaptativo", "30 frames 1280x720, 2 QR", segundos, len(frames),
+                                contadores=contadores))
+    return resultados
+
+
+def medir_pdf(rng, repeticiones, carpeta, paginas=10):
+    from oscar14_pdf import ServicioRenderPDF, renderizar_pagina, renderizar_paginas
+
+    ruta = os.path.join(carpeta, "facturas.pdf")
+    emisores = [generar_ruc(rng) for _ in range(10)]
+    generar_pdf(ruta, [generar_factura(k, rng, emisores) for k in range(paginas)])
+    resultados = []
+    for dpi in (100, 200, 300):
+        segundos = cronometrar(lambda: [renderizar_pagina(ruta, p, dpi) for p in range(paginas)], repeticiones)
+        resultados.append(resultado("pdf.renderizar_pagina", f"{paginas} páginas a {dpi} dpi", segundos, paginas))
+    segundos = cronometrar(lambda: list(renderizar_paginas(ruta, 200)), repeticiones)
+    resultados.append(resultado("pdf.renderizar_paginas", f"{paginas} páginas a 200 dpi", segundos, paginas))
+
+    servicio = ServicioRenderPDF()
+    try:
+        def con_cache():
+            for p in range(paginas):
+                servicio.renderizar(ruta, p, "vista_previa")
+        segundos = cronometrar(con_cache, repeticiones)
+        resultados.append(resultado("pdf.servicio_cache", f"{paginas} páginas ya renderizadas", segundos, paginas))
+    finally:
+        servicio.cerrar()
+    return resultados
+
+
+def medir_ocr(rng, repeticiones):
+    from oscar14_ocr import reconocer_imagen, parsear_campos
+
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+    except Exception as e:
+        return [{"prueba": "ocr.reconocer_imagen", "caso": "página A4 200 dpi", "omitido": f"tesseract no disponible: {e}"}]
+    factura = generar_factura(0, rng)
+    pagina = imagen_factura(factura)
+    campos = parsear_campos(reconocer_imagen(pagina))
+    correctos = sum(1 for columna in ("ruc_emisor", "serie", "numeracion", "monto_total", "monto_igv")
+                    if str(campos.get(columna, ("",))[0]).lstrip("0") == str(factura[columna]).lstrip("0"))
+    segundos = cronometrar(lambda: reconocer_imagen(pagina), max(1, repeticiones // 2))
+    return [resultado("ocr.reconocer_imagen", "página A4 200 dpi", segundos, 1, campos_correctos=correctos,
+                      campos_esperados=5)]
+
+
+def medir_bd(rng, tamano, carpeta, fila_a_fila=2000):
+    """
+    Inserción, lectura y exportación sobre una base nueva de `tamano` facturas.
+
+    FacturaDatabase usa data/facturas.db relativo a la carpeta actual, por eso
+    se trabaja dentro de `carpeta`.
+    """
+    from oscar14_exportacion import exportar
+    from oscar14_backend import COLUMNAS_FACTURA
+
+    anterior = os.getcwd()
+    os.chdir(carpeta)
+    db = FacturaDatabase()
+    try:
+        emisores = [generar_ruc(rng) for _ in range(200)]
+        facturas = [generar_factura(i, rng, emisores) for i in range(tamano)]
+        resultados = []
+
+        inicio = time.perf_counter()
+        guardadas = db.guardar_facturas_lote(facturas)
+        segundos = time.perf_counter() - inicio
+        resultados.append(resultado("bd.guardar_facturas_lote", f"{tamano} facturas",
+                                    {"min": segundos, "mediana": segundos, "media": segundos}, tamano,
+                                    insertadas=guardadas["insertadas"]))
+
+        sueltas = [generar_factura(tamano + i, rng, emisores) for i in range(min(fila_a_fila, tamano))]
+        inicio = time.perf_counter()
+        for factura in sueltas:
+            db.guardar_factura(factura)
+        segundos = time.perf_counter() - inicio
+        resultados.append(resultado("bd.guardar_factura", f"{len(sueltas)} facturas sobre {tamano}",
+                                    {"min": segundos, "mediana": segundos, "media": segundos}, len(sueltas)))
+
+        total = tamano + len(sueltas)
+        segundos = cronometrar(db.obtener_facturas, repeticiones=3)
+        resultados.append(resultado("bd.obtener_facturas", f"{total} facturas", segundos, total))
+        segundos = cronometrar(lambda: db.obtener_pagina(100, (None, total // 2)), repeticiones=20)
+        resultados.append(resultado("bd.obtener_pagina", f"100 de {total} facturas", segundos, 100))
+
+        ruta = os.path.join(carpeta, "facturas.xlsx")
+
+        def exportar_excel():
+            filas = ([factura[columna] for columna in COLUMNAS_FACTURA] for factura in db.iterar_facturas())
+            exportar(filas, COLUMNAS_FACTURA, ruta, "xlsx")
+
+        segundos = cronometrar(exportar_excel, repeticiones=1, calentamiento=0)
+        resultados.append(resultado("exportacion.xlsx", f"{total} facturas", segundos, total,
+                                    bytes=os.path.getsize(ruta)))
+        return resultados
+    finally:
+        db.cerrar_conexion()
+        os.chdir(anterior)
+
+
+# --- Resultados ---
+
+def entorno(semilla):
+    """
+    Datos de la máquina y del código con que se midió, para comparar corridas.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    versiones = {"python": platform.python_version(), "numpy": np.__version__, "opencv": cv2.__version__}
+    try:
+        import fitz
+        versiones["pymupdf"] = fitz.VersionBind
+    except ImportError:
+        pass
+    return {
+        "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "commit": commit,
+        "plataforma": platform.platform(),
+        "procesador": platform.processor() or platform.machine(),
+        "nucleos": os.cpu_count(),
+        "versiones": versiones,
+        "semilla": semilla,
+    }
+
+
+def comparar(anteriores, actuales):
+    """
+    Líneas de texto con la mediana anterior, la actual y la relación entre ambas por prueba y caso.
+    """
+    previas = {(r["prueba"], r["caso"]): r for r in anteriores["resultados"] if "segundos" in r}
+    lineas = []
+    for r in actuales["resultados"]:
+        previa = previas.get((r["prueba"], r["caso"]))
+        if previa is None or "segundos" not in r:
+            continue
+        antes, ahora = previa["segundos"]["mediana"], r["segundos"]["mediana"]
+        relacion = ahora / antes if antes else float("inf")
+        marca = "más lento" if relacion > 1.1 else "más rápido" if relacion < 0.9 else ""
+        lineas.append(f"{r['prueba']:<28} {r['caso']:<32} {antes * 1000:10.2f} ms {ahora * 1000:10.2f} ms "
+                      f"x{relacion:5.2f} {marca}")
+    return lineas
+
+
+def imprimir_resultados(resultados):
+    for r in resultados:
+        if "omitido" in r:
+            print(f"{r['prueba']:<28} {r['caso']:<32} omitido: {r['omitido']}")
+            continue
+        extra = {k: v for k, v in r.items() if k not in ("prueba", "caso", "segundos", "unidades", "por_segundo")}
+        print(f"{r['prueba']:<28} {r['caso']:<32} {r['segundos']['mediana'] * 1000:10.2f} ms "
+              f"{r['por_segundo'] or 0:12.1f}/s  {json.dumps(extra, ensure_ascii=False) if extra else ''}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mide el rendimiento con datos sintéticos.")
+    parser.add_argument("--tamanos", default="1000,10000", help="Tamaños de base de datos, separados por comas")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Repeticiones de cada medición")
+    parser.add_argument("--semilla", type=int, default=14, help="Semilla de los datos sintéticos")
+    parser.add_argument("--solo", default=",".join(GRUPOS), help=f"Grupos a medir: {', '.join(GRUPOS)}")
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados "
+                                                        "(por defecto benchmark_AAAAMMDD_HHMMSS.json)")
+    parser.add_argument("--comparar", default=None, help="JSON de una corrida anterior para comparar")
+    args = parser.parse_args(argv)
+
+    grupos = {grupo.strip() for grupo in args.solo.split(",") if grupo.strip()}
+    desconocidos = grupos - set(GRUPOS)
+    if desconocidos:
+        parser.error(f"Grupos desconocidos: {', '.join(sorted(desconocidos))}")
+    tamanos = [int(tamano) for tamano in args.tamanos.split(",") if tamano.strip()]
+    salida = os.path.abspath(args.salida or time.strftime("benchmark_%Y%m%d_%H%M%S.json"))
+
+    informe = {"entorno": entorno(args.semilla), "resultados": []}
+    with tempfile.TemporaryDirectory(prefix="oscar14_benchmark_") as carpeta:
+        pasos = []
+        if "qr" in grupos:
+            pasos.append(("qr", lambda rng: medir_qr(rng, args.repeticiones)))
+        if "pdf" in grupos:
+            pasos.append(("pdf", lambda rng: medir_pdf(rng, args.repeticiones, carpeta)))
+        if "ocr" in grupos:
+            pasos.append(("ocr", lambda rng: medir_ocr(rng, args.repeticiones)))
+        if "bd" in grupos:
+            for tamano in tamanos:
+                subcarpeta = os.path.join(carpeta, f"bd_{tamano}")
+                os.makedirs(subcarpeta)
+                pasos.append((f"bd {tamano}", lambda rng, t=tamano, c=subcarpeta: medir_bd(rng, t, c)))
+        for nombre, paso in pasos:
+            print(f"Midiendo {nombre}...", file=sys.stderr, flush=True)
+            # Cada paso con su propio generador, así sus datos no dependen de qué otros pasos se corrieron
+            resultados = paso(np.random.default_rng([args.semilla, len(nombre), sum(map(ord, nombre))]))
+            imprimir_resultados(resultados)
+            informe["resultados"].extend(resultados)
+
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(informe, f, ensure_ascii=False, indent=2)
+    print(f"Resultados guardados en {salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            anteriores = json.load(f)
+        print(f"\nComparación con {args.comparar} (commit {anteriores['entorno'].get('commit') or '?'}):")
+        for linea in comparar(anteriores, informe):
+            print(linea)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
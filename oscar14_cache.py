@@ -0,0 +1,180 @@
+# oscar14_cache.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.request import pathname2url
+
+from oscar14_metricas import METRICAS
+from oscar14_ocr import VERSION_EXTRACTOR as VERSION_OCR
+from oscar14_qr import VERSION_EXTRACTOR as VERSION_QR
+
+# Versión de cada extractor; al cambiar un extractor se sube su versión y
+# los resultados guardados con la anterior dejan de usarse
+VERSIONES_EXTRACTOR = {
+    "qr": VERSION_QR,
+    "ocr": VERSION_OCR,
+    "ingesta": f"qr{VERSION_QR}-ocr{VERSION_OCR}",
+}
+
+
+class CacheExtracciones:
+    """
+    Caché persistente de resultados de extracción (QR, OCR, carga masiva).
+
+    Las entradas se identifican por la huella SHA-256 del contenido del
+    archivo, el extractor y su versión, y una clave con los parámetros
+    (página, rotación, dpi...). Así un archivo renombrado o copiado se
+    reconoce, y uno modificado no devuelve resultados viejos.
+
+    Se guarda en una base SQLite aparte de la de facturas. Cuando el
+    contenido supera `max_bytes` se borran las entradas usadas hace más
+    tiempo; el tamaño total se suma al abrir y luego se lleva en memoria. Además se registran los archivos ya cargados en la base de
+    facturas, que no se borran al liberar espacio.
+    """
+
+    def __init__(self, ruta=None, max_bytes=256 * 1024 * 1024, solo_lectura=False):
+        self.ruta = ruta or os.path.join("data", "cache_extracciones.db")
+        self.max_bytes = max_bytes
+        self.solo_lectura = solo_lectura
+        self.aciertos = 0
+        self.fallos = 0
+        self._candado = threading.Lock()
+        self._total = 0  # bytes de las entradas guardadas
+
+        if solo_lectura:
+            uri = f"file:{pathname2url(os.path.abspath(self.ruta))}?mode=ro"
+            self.conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(self.ruta)), exist_ok=True)
+            self.conn = sqlite3.connect(self.ruta, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.crear_tablas()
+            self._total = self._sumar_tamanos()
+        self.conn.execute("PRAGMA busy_timeout=5000")
+
+    def crear_tablas(self):
+        with self.conn:
+            self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS entradas (
+                huella TEXT NOT NULL,
+                extractor TEXT NOT NULL,
+                version TEXT NOT NULL,
+                clave TEXT NOT NULL,
+                valor TEXT NOT NULL,
+                tamano INTEGER NOT NULL,
+                ultimo_acceso REAL NOT NULL,
+                PRIMARY KEY (huella, extractor, version, clave)
+            )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_entradas_acceso ON entradas (ultimo_acceso)")
+            self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS archivos_ingestados (
+                huella TEXT PRIMARY KEY,
+                ruta TEXT,
+                fecha TEXT NOT NULL
+            )
+            """)
+
+    def obtener(self, huella, extractor, clave=""):
+        """
+        Devuelve el resultado guardado (ya decodificado de JSON) o None si no hay.
+        """
+        version = VERSIONES_EXTRACTOR[extractor]
+        with self._candado:
+            fila = self.conn.execute(
+                "SELECT valor FROM entradas WHERE huella = ? AND extractor = ? AND version = ? AND clave = ?",
+                (huella, extractor, version, clave)).fetchone()
+            if fila is None:
+                self.fallos += 1
+                METRICAS.contar(f"cache.{extractor}.fallos")
+                return None
+            self.aciertos += 1
+            METRICAS.contar(f"cache.{extractor}.aciertos")
+            if not self.solo_lectura:
+                with self.conn:
+                    self.conn.execute(
+                        "UPDATE entradas SET ultimo_acceso = ? WHERE huella = ? AND extractor = ? AND version = ? AND clave = ?",
+                        (time.time(), huella, extractor, version, clave))
+        return json.loads(fila[0])
+
+    def guardar(self, huella, extractor, valor, clave=""):
+        """
+        Guarda un resultado serializable a JSON y libera espacio si hace falta.
+        """
+        texto = json.dumps(valor, ensure_ascii=False)
+        tamano = len(texto.encode("utf-8"))
+        entrada = (huella, extractor, VERSIONES_EXTRACTOR[extractor], clave)
+        with self._candado:
+            with self.conn:
+                anterior = self.conn.execute(
+                    "SELECT tamano FROM entradas WHERE huella = ? AND extractor = ? AND version = ? AND clave = ?",
+                    entrada).fetchone()
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO entradas (huella, extractor, version, clave, valor, tamano, ultimo_acceso) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", entrada + (texto, tamano, time.time()))
+                total = self._total + tamano - (anterior[0] if anterior else 0)
+                if total > self.max_bytes:
+                    total = self._liberar_espacio()
+            # Solo se cuenta lo que quedó confirmado
+            self._total = total
+
+    def _sumar_tamanos(self):
+        return self.conn.execute("SELECT IFNULL(SUM(tamano), 0) FROM entradas").fetchone()[0]
+
+    def _liberar_espacio(self):
+        """
+        Borra las entradas usadas hace más tiempo y devuelve el tamaño que queda.
+
+        El total se vuelve a sumar en la base antes de borrar, por si otro
+        proceso (p. ej. la carga masiva) escribió en la misma caché.
+        """
+        total = self._sumar_tamanos()
+        if total <= self.max_bytes:
+            return total
+        # Se baja al 90 % del límite para no tener que liberar en cada escritura
+        exceso = total - int(self.max_bytes * 0.9)
+        borrar = []
+        for rowid, tamano in self.conn.execute("SELECT rowid, tamano FROM entradas ORDER BY ultimo_acceso"):
+            borrar.append((rowid,))
+            exceso -= tamano
+            total -= tamano
+            if exceso <= 0:
+                break
+        self.conn.executemany("DELETE FROM entradas WHERE rowid = ?", borrar)
+        return total
+
+    def ingestado(self, huella):
+        """
+        True si el archivo con esa huella ya se cargó en la base de facturas.
+        """
+        with self._candado:
+            return self.conn.execute("SELECT 1 FROM archivos_ingestados WHERE huella = ?", (huella,)).fetchone() is not None
+
+    def marcar_ingestados(self, archivos):
+        """
+        Registra archivos ya cargados en la base de facturas.
+
+        Args:
+            archivos: Iterable de pares (huella, ruta).
+        """
+        fecha = time.strftime("%Y-%m-%d %H:%M:%S")
+        with self._candado, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO archivos_ingestados (huella, ruta, fecha) VALUES (?, ?, ?)",
+                                  [(huella, ruta, fecha) for huella, ruta in archivos])
+
+    def limpiar(self):
+        """
+        Borra todos los resultados guardados y el registro de archivos cargados.
+        """
+        with self._candado:
+            with self.conn:
+                self.conn.execute("DELETE FROM entradas")
+                self.conn.execute("DELETE FROM archivos_ingestados")
+            self._total = 0
+
+    def cerrar(self):
+        with self._candado:
+            self.conn.close()
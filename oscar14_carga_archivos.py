@@ -1,16 +1,144 @@
 # oscar14_carga_archivos.py
 
-from PyQt5.QtWidgets import QWidget, QLabel, QVBoxLayout, QHBoxLayout, QPushButton, QLineEdit, QScrollArea, QFileDialog, QFrame, QSlider, QProgressBar
-from PyQt5.QtGui import QImage, QPixmap
-from PyQt5.QtCore import Qt
-from pdf2image import convert_from_path
-import fitz  # PyMuPDF
-import PyPDF2
-from PIL import ImageQt, Image
-import pytesseract
-import cv2
+from PyQt5.QtWidgets import QWidget, QLabel, QVBoxLayout, QHBoxLayout, QPushButton, QLineEdit, QScrollArea, QFileDialog, QFrame, QSlider, QProgressBar, QGraphicsView, QGraphicsScene, QGraphicsPixmapItem
+from PyQt5.QtGui import QImage, QPixmap, QPainter, QTransform
+from PyQt5.QtCore import Qt, QTimer, QThread, pyqtSignal
 import numpy as np
 import os
+from oscar14_backend import CAMPOS_FORMULARIO, parsear_datos_qr
+from oscar14_qr import decodificar_qr_multiple
+from oscar14_pdf import ServicioRenderPDF, cargar_imagen
+from oscar14_ocr import MotorOCR, UMBRAL_CONFIANZA, parsear_campos
+from oscar14_cache import CacheExtracciones
+from oscar14_metricas import METRICAS
+from oscar14_ajustes import AJUSTES
+
+# Etiqueta del formulario para cada columna
+ETIQUETAS_COLUMNAS = {columna: etiqueta for etiqueta, columna in CAMPOS_FORMULARIO.items()}
+
+def imagen_a_qimage(imagen):
+    """
+    Crea un QImage RGB a partir de una imagen PIL o un arreglo RGB de NumPy.
+
+    Con un arreglo contiguo el QImage usa su memoria sin copiarla; el arreglo
+    se guarda en el propio QImage para que no se libere antes de tiempo.
+    """
+    arreglo = np.ascontiguousarray(imagen if isinstance(imagen, np.ndarray) else imagen.convert("RGB"))
+    alto, ancho = arreglo.shape[:2]
+    qt_image = QImage(arreglo.data, ancho, alto, arreglo.strides[0], QImage.Format_RGB888)
+    qt_image._arreglo = arreglo
+    return qt_image
+
+
+class VistaPrevia(QGraphicsView):
+    """
+    Vista previa con zoom y rotación aplicados como transformación de la vista.
+
+    La imagen se convierte a QPixmap una sola vez, junto con una pirámide de
+    versiones a 1/2, 1/4... de su tamaño; para cada zoom se muestra el nivel
+    más pequeño que no pierde detalle y la vista lo escala. Mientras el zoom
+    cambia se escala con la transformación rápida y, pasados `retardo_ms`
+    sin cambios, se repinta con suavizado. La rotación nunca recodifica la imagen.
+    """
+
+    def __init__(self, parent=None, niveles=4, retardo_ms=150):
+        super().__init__(parent)
+        self.niveles = niveles
+        self.setScene(QGraphicsScene(self))
+        self.item = QGraphicsPixmapItem()
+        self.scene().addItem(self.item)
+        self.setDragMode(QGraphicsView.ScrollHandDrag)
+        self.setTransformationAnchor(QGraphicsView.AnchorViewCenter)
+        self._piramide = []  # [(escala, QPixmap)] de mayor a menor
+        self.zoom = 1.0
+        self.rotacion = 0  # grados en sentido horario
+        self._temporizador = QTimer(self)
+        self._temporizador.setSingleShot(True)
+        self._temporizador.setInterval(retardo_ms)
+        self._temporizador.timeout.connect(lambda: self._aplicar(rapido=False))
+
+    def establecer_imagen(self, imagen):
+        """
+        Muestra una imagen PIL o un arreglo RGB, conservando el zoom y la rotación actuales.
+        """
+        pixmap = QPixmap.fromImage(imagen_a_qimage(imagen))
+        self._piramide = [(1.0, pixmap)]
+        for nivel in range(1, self.niveles):
+            escala = 0.5 ** nivel
+            if min(pixmap.width(), pixmap.height()) * escala < 64:
+                break
+            anterior = self._piramide[-1][1]
+            self._piramide.append((escala, anterior.scaled(anterior.width() // 2, anterior.height() // 2,
+                                                           Qt.IgnoreAspectRatio, Qt.SmoothTransformation)))
+        self._aplicar(rapido=False)
+
+    def establecer_zoom(self, zoom):
+        """
+        Cambia el zoom al instante con escalado rápido y programa el pase final suavizado.
+        """
+        self.zoom = zoom
+        self._aplicar(rapido=True)
+        self._temporizador.start()
+
+    def terminar_zoom(self):
+        """
+        Hace el pase suavizado sin esperar al temporizador (al soltar el slider).
+        """
+        self._temporizador.stop()
+        self._aplicar(rapido=False)
+
+    def rotar(self, grados):
+        self.rotacion = (self.rotacion + grados) % 360
+        self._aplicar(rapido=False)
+
+    def _aplicar(self, rapido):
+        if not self._piramide:
+            return
+        escala, pixmap = self._piramide[0]
+        for escala_nivel, pixmap_nivel in self._piramide:
+            if escala_nivel < self.zoom:
+                break
+            escala, pixmap = escala_nivel, pixmap_nivel
+        if self.item.pixmap().cacheKey() != pixmap.cacheKey():
+            self.item.setPixmap(pixmap)
+            self.setSceneRect(self.item.boundingRect())
+        modo = Qt.FastTransformation if rapido else Qt.SmoothTransformation
+        self.item.setTransformationMode(modo)
+        self.setRenderHint(QPainter.SmoothPixmapTransform, not rapido)
+        factor = self.zoom / escala
+        self.setTransform(QTransform().rotate(self.rotacion).scale(factor, factor))
+
+
+class HiloOCR(QThread):
+    """
+    Hilo que reconoce las páginas con el motor OCR sin bloquear la interfaz.
+
+    Las páginas se obtienen con `obtener_pagina(indice)` dentro del hilo, así
+    el renderizado a la resolución del OCR tampoco ocupa la interfaz. Al
+    terminar emite un diccionario con las líneas reconocidas ("lineas") y los
+    campos de la factura ("campos").
+    """
+    progreso = pyqtSignal(int)
+    terminado = pyqtSignal(dict)
+    error = pyqtSignal(str)
+
+    def __init__(self, motor, obtener_pagina, paginas):
+        super().__init__()
+        self.motor = motor
+        self.obtener_pagina = obtener_pagina
+        self.paginas = paginas
+
+    def run(self):
+        try:
+            imagenes = (self.obtener_pagina(pagina) for pagina in self.paginas)
+            with METRICAS.medir("ocr.documento"):
+                lineas = self.motor.reconocer(imagenes, lambda hechas, total: self.progreso.emit(100 * hechas // total),
+                                              total=len(self.paginas))
+            METRICAS.contar("ocr.paginas", len(self.paginas))
+            self.terminado.emit({"lineas": lineas, "campos": parsear_campos(lineas)})
+        except Exception as e:
+            self.error.emit(str(e))
+
 
 class VentanaCargaArchivos(QWidget):
     """
@@ -18,14 +146,27 @@ class VentanaCargaArchivos(QWidget):
     Permite cargar y visualizar archivos PDF o imágenes, extraer datos de ellos y rellenar el formulario.
     """
 
-    def __init__(self, db):
+    def __init__(self, db, escritor):
         """
         Inicializa la ventana de carga de archivos.
 
-        :param db: Instancia de la base de datos para almacenar datos de facturas.
+        :param db: Instancia de la base de datos de facturas.
+        :param escritor: EscritorFacturas que guarda las facturas en segundo plano.
         """
         super().__init__()
         self.db = db  # Guardar la referencia de la base de datos
+        self.escritor = escritor
+        self.escritor.guardado.connect(self.guardado_terminado)
+        self.servicio_pdf = ServicioRenderPDF(AJUSTES.dpi_por_proposito(),
+                                              memoria_max=AJUSTES["pdf.cache_mb"] * 1024 * 1024)
+        self.motor_ocr = MotorOCR(AJUSTES["ocr.procesos"] or None)
+        self.cache = CacheExtracciones(max_bytes=AJUSTES["cache.extracciones_mb"] * 1024 * 1024)
+        AJUSTES.suscribir(self.aplicar_ajuste)
+        self.archivo_actual = None  # PDF o imagen abierto
+        self.hilo_ocr = None
+        self.archivo_pdf = None  # PDF abierto, None si se cargó una imagen
+        self.pagina_actual = 0
+        self.total_paginas = 0
         self.init_ui()
         self.imagen_actual = None
         self.zoom_factor = 1.0
@@ -49,18 +190,28 @@ class VentanaCargaArchivos(QWidget):
 
         # Layout para la previsualización de archivos
         self.layout_previsualizacion = QVBoxLayout(self.frame_previsualizacion)
-        self.label_previsualizacion = QLabel('Vista Previa del Archivo', self)
-        self.label_previsualizacion.setAlignment(Qt.AlignCenter)
-        self.scroll_area_previsualizacion = QScrollArea(self)
-        self.scroll_area_previsualizacion.setWidgetResizable(True)
-        self.scroll_area_previsualizacion.setWidget(self.label_previsualizacion)
-        self.layout_previsualizacion.addWidget(self.scroll_area_previsualizacion)
+        self.vista_previa = VistaPrevia(self)
+        self.layout_previsualizacion.addWidget(self.vista_previa)
 
         # Botón para cargar archivos
         self.btn_cargar_archivo = QPushButton('Cargar Archivo', self)
         self.btn_cargar_archivo.clicked.connect(self.cargar_archivo)
         self.layout_previsualizacion.addWidget(self.btn_cargar_archivo)
 
+        # Navegación entre páginas del PDF
+        self.layout_paginas = QHBoxLayout()
+        self.btn_pagina_anterior = QPushButton('< Anterior', self)
+        self.btn_pagina_anterior.clicked.connect(self.pagina_anterior)
+        self.layout_paginas.addWidget(self.btn_pagina_anterior)
+        self.label_pagina = QLabel('', self)
+        self.label_pagina.setAlignment(Qt.AlignCenter)
+        self.layout_paginas.addWidget(self.label_pagina)
+        self.btn_pagina_siguiente = QPushButton('Siguiente >', self)
+        self.btn_pagina_siguiente.clicked.connect(self.pagina_siguiente)
+        self.layout_paginas.addWidget(self.btn_pagina_siguiente)
+        self.layout_previsualizacion.addLayout(self.layout_paginas)
+        self.actualizar_navegacion()
+
         # Botones para rotar, hacer zoom y ajustar imagen
         self.btn_rotar = QPushButton('Rotar', self)
         self.btn_rotar.clicked.connect(self.rotar_imagen)
@@ -72,6 +223,7 @@ class VentanaCargaArchivos(QWidget):
         self.slider_zoom.setMaximum(200)
         self.slider_zoom.setValue(100)  # Zoom inicial al 100%
         self.slider_zoom.valueChanged.connect(self.cambiar_zoom)
+        self.slider_zoom.sliderReleased.connect(self.vista_previa.terminar_zoom)
         self.layout_previsualizacion.addWidget(self.slider_zoom)
 
         # Barra de progreso
@@ -111,11 +263,22 @@ class VentanaCargaArchivos(QWidget):
         self.btn_guardar_datos.clicked.connect(self.guardar_datos)
         self.layout_formulario.addWidget(self.btn_guardar_datos)
 
+        # Aviso de las facturas que no se pudieron guardar; queda hasta el próximo intento
+        self.label_guardado = QLabel("", self)
+        self.label_guardado.setAlignment(Qt.AlignCenter)
+        self.label_guardado.setWordWrap(True)
+        self.layout_formulario.addWidget(self.label_guardado)
+
         # Botón para copiar datos manualmente al formulario
         self.btn_copiar_datos = QPushButton('Copiar Datos al Formulario', self)
         self.btn_copiar_datos.clicked.connect(self.copiar_datos_al_formulario)
         self.layout_previsualizacion.addWidget(self.btn_copiar_datos)
 
+        # Botón para leer todos los QR de la página y guardarlos
+        self.btn_leer_qr = QPushButton('Leer QR y Guardar', self)
+        self.btn_leer_qr.clicked.connect(self.leer_qr_y_guardar)
+        self.layout_previsualizacion.addWidget(self.btn_leer_qr)
+
     def cargar_archivo(self):
         """
         Función para cargar un archivo PDF o imagen.
@@ -136,28 +299,19 @@ class VentanaCargaArchivos(QWidget):
 
         :param archivo_pdf: Ruta al archivo PDF.
         """
-        # Implementar sistema redundante para manejar PDFs
         try:
-            # Usar pdf2image
-            paginas = convert_from_path(archivo_pdf, dpi=200)  # Llamar a convert_from_path correctamente
-            if paginas:
-                self.mostrar_imagen(paginas[0])
-                return
-        except Exception as e:
-            print(f"Error al procesar el PDF con pdf2image: {e}")
-
-        try:
-            # Usar PyMuPDF (fitz)
-            documento = fitz.open(archivo_pdf)
-            pagina = documento.load_page(0)  # Primera página
-            pix = pagina.get_pixmap()
-            self.mostrar_imagen(Image.frombytes("RGB", [pix.width, pix.height], pix.samples))
+            self.total_paginas = self.servicio_pdf.contar_paginas(archivo_pdf)
+            self.archivo_pdf = archivo_pdf
+            self.archivo_actual = archivo_pdf
+            self.mostrar_pagina(0)
             return
         except Exception as e:
-            print(f"Error al procesar el PDF con PyMuPDF: {e}")
+            print(f"Error al renderizar el PDF: {e}")
 
         try:
             # Usar PyPDF2
+            import PyPDF2
+
             with open(archivo_pdf, "rb") as f:
                 reader = PyPDF2.PdfReader(f)
                 if len(reader.pages) > 0:
@@ -167,6 +321,60 @@ class VentanaCargaArchivos(QWidget):
         except Exception as e:
             print(f"Error al procesar el PDF con PyPDF2: {e}")
 
+    def mostrar_pagina(self, pagina):
+        """
+        Muestra una página del PDF abierto y precarga sus vecinas.
+
+        :param pagina: Índice de la página, empezando en 0.
+        """
+        self.pagina_actual = pagina
+        with METRICAS.medir("carga.mostrar_pagina"):
+            self.mostrar_imagen(self.servicio_pdf.renderizar(self.archivo_pdf, pagina, "vista_previa"))
+        self.actualizar_navegacion()
+        self.servicio_pdf.precargar(self.archivo_pdf, [pagina + 1, pagina - 1], "vista_previa")
+
+    def pagina_anterior(self):
+        if self.archivo_pdf and self.pagina_actual > 0:
+            self.mostrar_pagina(self.pagina_actual - 1)
+
+    def pagina_siguiente(self):
+        if self.archivo_pdf and self.pagina_actual < self.total_paginas - 1:
+            self.mostrar_pagina(self.pagina_actual + 1)
+
+    def actualizar_navegacion(self):
+        hay_pdf = self.archivo_pdf is not None
+        self.label_pagina.setText(f"Página {self.pagina_actual + 1} de {self.total_paginas}" if hay_pdf else "")
+        self.btn_pagina_anterior.setEnabled(hay_pdf and self.pagina_actual > 0)
+        self.btn_pagina_siguiente.setEnabled(hay_pdf and self.pagina_actual < self.total_paginas - 1)
+
+    def imagen_para(self, proposito):
+        """
+        Devuelve la imagen actual a la resolución adecuada para `proposito` ("qr", "ocr").
+
+        Las páginas de PDF se renderizan de nuevo a ese DPI; las imágenes se usan
+        tal cual. En ambos casos se aplica la rotación de la vista previa.
+        """
+        rotacion = self.vista_previa.rotacion
+        if self.archivo_pdf:
+            return self.servicio_pdf.renderizar(self.archivo_pdf, self.pagina_actual, proposito, rotacion)
+        if rotacion:
+            return self.imagen_actual.rotate(-rotacion, expand=True)
+        return self.imagen_actual
+
+    def clave_cache(self, proposito, pagina):
+        """
+        Devuelve (huella del archivo, clave) con que se guardan en la caché los
+        resultados del archivo actual, o (None, None) si no hay archivo.
+
+        La clave incluye la rotación y, en los PDF, el DPI del propósito,
+        porque cambian la imagen que se analiza.
+        """
+        if not self.archivo_actual:
+            return None, None
+        dpi = self.servicio_pdf.dpi_por_proposito[proposito] if self.archivo_pdf else "original"
+        clave = f"pagina={pagina}|rotacion={self.vista_previa.rotacion}|dpi={dpi}"
+        return self.servicio_pdf.huella(self.archivo_actual), clave
+
     def procesar_imagen(self, archivo_imagen):
         """
         Procesa un archivo de imagen y muestra la imagen en la interfaz.
@@ -174,23 +382,21 @@ class VentanaCargaArchivos(QWidget):
         :param archivo_imagen: Ruta al archivo de imagen.
         """
         try:
-            imagen = Image.open(archivo_imagen)
-            self.mostrar_imagen(imagen)
+            self.archivo_pdf = None
+            self.archivo_actual = archivo_imagen
+            self.actualizar_navegacion()
+            self.mostrar_imagen(cargar_imagen(archivo_imagen))
         except Exception as e:
             print(f"Error al procesar la imagen: {e}")
 
     def mostrar_imagen(self, imagen):
         """
-        Muestra una imagen en el label de previsualización.
+        Muestra una imagen en la vista previa.
 
         :param imagen: Imagen a mostrar.
         """
         self.imagen_actual = imagen
-        imagen_cv = cv2.cvtColor(np.array(imagen), cv2.COLOR_RGB2BGR)  # Convertir usando OpenCV
-        height, width, channel = imagen_cv.shape
-        bytesPerLine = 3 * width
-        qt_image = QImage(imagen_cv.data, width, height, bytesPerLine, QImage.Format_RGB888)
-        self.label_previsualizacion.setPixmap(QPixmap.fromImage(qt_image))
+        self.vista_previa.establecer_imagen(imagen)
 
     def cambiar_zoom(self):
         """
@@ -203,32 +409,177 @@ class VentanaCargaArchivos(QWidget):
         """
         Aplica el zoom a la imagen previsualizada.
         """
-        if self.imagen_actual:
-            ancho = int(self.imagen_actual.width * self.zoom_factor)
-            alto = int(self.imagen_actual.height * self.zoom_factor)
-            imagen_zoom = self.imagen_actual.resize((ancho, alto), Image.LANCZOS)
-            self.mostrar_imagen(imagen_zoom)
+        self.vista_previa.establecer_zoom(self.zoom_factor)
 
     def rotar_imagen(self):
         """
-        Rota la imagen previsualizada 90 grados.
+        Rota la imagen previsualizada 90 grados en sentido antihorario.
         """
-        if self.imagen_actual:
-            self.imagen_actual = self.imagen_actual.rotate(90, expand=True)
-            self.mostrar_imagen(self.imagen_actual)
+        self.vista_previa.rotar(-90)
 
     def copiar_datos_al_formulario(self):
         """
-        Copia los datos extraídos de la imagen al formulario manualmente.
+        Reconoce el documento con OCR en segundo plano y rellena el formulario.
+
+        En un PDF se reconocen todas las páginas; en una imagen, la imagen tal
+        como se ve en la vista previa.
+        """
+        if not self.imagen_actual or self.hilo_ocr is not None:
+            return
+        huella, clave = self.clave_cache("ocr", "todas")
+        guardado = self.cache.obtener(huella, "ocr", clave) if huella else None
+        if guardado is not None:
+            self.rellenar_formulario_ocr(guardado["campos"])
+            return
+        rotacion = self.vista_previa.rotacion
+        if self.archivo_pdf:
+            archivo_pdf = self.archivo_pdf
+            paginas = range(self.total_paginas)
+            obtener_pagina = lambda pagina: self.servicio_pdf.renderizar(archivo_pdf, pagina, "ocr", rotacion)
+        else:
+            imagen = self.imagen_para("ocr")
+            paginas = [0]
+            obtener_pagina = lambda pagina: imagen
+        self.btn_copiar_datos.setEnabled(False)
+        self.progress_bar.setValue(0)
+        self.hilo_ocr = HiloOCR(self.motor_ocr, obtener_pagina, paginas)
+        self.hilo_ocr.progreso.connect(self.progress_bar.setValue)
+        self.hilo_ocr.terminado.connect(lambda resultado: self.recibir_ocr(resultado, huella, clave))
+        self.hilo_ocr.error.connect(lambda mensaje: print(f"Error en el OCR: {mensaje}"))
+        self.hilo_ocr.finished.connect(self.terminar_ocr)
+        self.hilo_ocr.start()
+
+    def recibir_ocr(self, resultado, huella, clave):
+        """
+        Guarda en la caché el texto y los campos reconocidos y rellena el formulario.
+        """
+        if huella:
+            self.cache.guardar(huella, "ocr", resultado, clave)
+        self.rellenar_formulario_ocr(resultado["campos"])
+
+    def rellenar_formulario_ocr(self, campos):
+        """
+        Copia al formulario los campos reconocidos por el OCR.
+
+        La confianza de cada campo se muestra en su ayuda emergente y los de
+        confianza baja se resaltan para revisarlos antes de guardar.
+
+        :param campos: Diccionario columna -> (valor, confianza); de la caché
+            llegan como listas [valor, confianza].
+        """
+        for columna, (valor, confianza) in campos.items():
+            campo = self.campos.get(ETIQUETAS_COLUMNAS[columna])
+            if campo is None:
+                continue
+            campo.setText(valor)
+            campo.setToolTip(f"Confianza OCR: {confianza:.0f}%")
+            campo.setStyleSheet("background-color: #fff3cd;" if confianza < UMBRAL_CONFIANZA else "")
+        print(f"Campos reconocidos por OCR: {len(campos)}")
+
+    def terminar_ocr(self):
+        self.hilo_ocr = None
+        self.btn_copiar_datos.setEnabled(True)
+
+    def leer_qr_y_guardar(self):
+        """
+        Lee todos los códigos QR de la imagen actual y guarda cada uno como una factura.
+
+        Útil para hojas escaneadas con varios comprobantes: todas las facturas
+        se insertan en un solo lote y el formulario muestra la primera. Los
+        textos leídos se guardan en la caché, así al volver a cargar el mismo
+        archivo no se decodifica de nuevo.
+        """
+        if not self.imagen_actual:
+            return
+        huella, clave = self.clave_cache("qr", self.pagina_actual)
+        textos = self.cache.obtener(huella, "qr", clave) if huella else None
+        if textos is None:
+            textos = [data for data, _ in decodificar_qr_multiple(self.imagen_para("qr"))]
+            if huella:
+                self.cache.guardar(huella, "qr", textos, clave)
+        if not textos:
+            print("No se encontraron códigos QR en la imagen")
+            return
+        facturas = [parsear_datos_qr(data) for data in textos]
+        for columna, valor in facturas[0].items():
+            self.campos[ETIQUETAS_COLUMNAS[columna]].setText(valor)
+        print(f"QR leídos: {len(textos)}")
+        self.encolar_guardado(facturas)
+
+    def aplicar_ajuste(self, clave, valor):
+        """
+        Aplica en el momento un ajuste cambiado en la pestaña Configuración.
         """
-        # Lógica para extraer texto con pytesseract si es una imagen
-        if self.imagen_actual:
-            texto_extraido = pytesseract.image_to_string(self.imagen_actual)
-            print(f"Texto extraído: {texto_extraido}")
+        if clave.startswith("pdf.dpi_"):
+            self.servicio_pdf.dpi_por_proposito[clave[len("pdf.dpi_"):]] = valor
+            if clave == "pdf.dpi_vista_previa" and self.archivo_pdf:
+                self.mostrar_pagina(self.pagina_actual)
+        elif clave == "pdf.cache_mb":
+            self.servicio_pdf.limitar_memoria(valor * 1024 * 1024)
+        elif clave == "ocr.procesos":
+            # Se usa desde el próximo reconocimiento (ver MotorOCR._obtener_pool)
+            self.motor_ocr.procesos = valor or os.cpu_count() or 1
+        elif clave == "cache.extracciones_mb":
+            self.cache.max_bytes = valor * 1024 * 1024
+
+    def cerrar(self):
+        """
+        Detiene el OCR en curso y cierra el pool de procesos, el servicio de
+        renderizado y la caché.
+        """
+        AJUSTES.desuscribir(self.aplicar_ajuste)
+        if self.hilo_ocr is not None:
+            self.hilo_ocr.requestInterruption()
+            # Cerrar el pool cancela las páginas pendientes, así el hilo termina enseguida
+            self.motor_ocr.cerrar()
+            self.hilo_ocr.wait()
+        self.motor_ocr.cerrar()
+        self.servicio_pdf.cerrar()
+        self.cache.cerrar()
+
+    def closeEvent(self, event):
+        self.cerrar()
+        super().closeEvent(event)
 
     def guardar_datos(self):
         """
         Guarda los datos del formulario en la base de datos.
+
+        Returns:
+            bool: False si la cola de guardado estaba llena.
         """
         datos_a_guardar = {nombre: self.campos[nombre].text() for nombre in self.campos_formulario}
-        self.db.guardar_factura(datos_a_guardar)
+        return self.encolar_guardado([datos_a_guardar])
+
+    def encolar_guardado(self, facturas):
+        """
+        Pide al escritor guardar las facturas; el resultado llega a `guardado_terminado`.
+
+        Si la cola está llena se avisa y el formulario queda como está, para
+        volver a intentarlo con el mismo botón.
+        """
+        aceptado = self.escritor.encolar("carga", facturas)
+        if aceptado:
+            self.ocultar_estado_guardado()
+        else:
+            self.mostrar_estado_guardado("Guardado en espera: la cola está llena, vuelva a intentarlo")
+        return aceptado
+
+    def mostrar_estado_guardado(self, texto):
+        self.label_guardado.setText(texto)
+        self.label_guardado.setStyleSheet("background-color: #C62828; color: white; padding: 6px;")
+
+    def ocultar_estado_guardado(self):
+        self.label_guardado.setText("")
+        self.label_guardado.setStyleSheet("")
+
+    def guardado_terminado(self, origen, contexto, resultado):
+        """
+        Recibe del escritor el resultado de un guardado; ignora los de otras ventanas.
+        """
+        if origen == "carga":
+            print(f"Facturas guardadas: {resultado['insertadas']}, rechazadas: {resultado['rechazadas']}, "
+                  f"no guardadas: {resultado.get('no_guardadas', 0)}")
+            if resultado.get("no_guardadas"):
+                self.mostrar_estado_guardado(f"No se guardaron {resultado['no_guardadas']} facturas "
+                                             f"(base de datos ocupada), vuelva a intentarlo")
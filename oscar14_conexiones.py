@@ -0,0 +1,109 @@
+# oscar14_conexiones.py
+import os
+import sqlite3
+import threading
+from urllib.request import pathname2url
+
+
+class GestorConexiones:
+    """
+    Conexiones a la base de facturas: una de escritura compartida y una de
+    solo lectura por hilo.
+
+    Con el journal en modo WAL las lecturas no bloquean a la escritura ni al
+    revés, así que una exportación o las estadísticas pueden leer en otro
+    hilo mientras el escaneo sigue guardando. SQLite admite un solo escritor
+    a la vez; por eso hay una única conexión de escritura y quien la use
+    debe tomar `candado_escritura` durante la transacción.
+
+    Cada hilo que lee recibe su propia conexión (las de sqlite3 no deben
+    compartirse entre hilos mientras se usan). Los hilos de trabajo deben
+    llamar a `cerrar_lectura` al terminar.
+
+    Args:
+        ruta: Archivo de la base de datos.
+        mmap_bytes: Bytes de la base que se leen por mmap en vez de read().
+        cache_sentencias: Sentencias preparadas que guarda cada conexión.
+        cache_kb: Caché de páginas por conexión, en KiB.
+        timeout: Segundos que se espera a que se libere un bloqueo.
+    """
+
+    def __init__(self, ruta, mmap_bytes=256 * 1024 * 1024, cache_sentencias=256, cache_kb=20000, timeout=30.0):
+        self.ruta = ruta
+        self.mmap_bytes = mmap_bytes
+        self.cache_sentencias = cache_sentencias
+        self.cache_kb = cache_kb
+        self.timeout = timeout
+        self.candado_escritura = threading.RLock()
+        self._escritura = None
+        self._local = threading.local()
+        self._lecturas = {}  # id del hilo -> conexión, para cerrarlas todas al final
+        self._candado = threading.Lock()
+
+    def _ajustar(self, conn):
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_bytes)}")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_kb)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+
+    def escritura(self):
+        """
+        Conexión de escritura, creada la primera vez que se pide.
+
+        Puede usarse desde cualquier hilo, siempre con `candado_escritura`.
+        """
+        with self._candado:
+            if self._escritura is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.ruta)), exist_ok=True)
+                conn = sqlite3.connect(self.ruta, timeout=self.timeout, check_same_thread=False,
+                                       cached_statements=self.cache_sentencias)
+                # synchronous NORMAL en WAL: un fsync por checkpoint y no por commit
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                self._ajustar(conn)
+                self._escritura = conn
+            return self._escritura
+
+    def lectura(self):
+        """
+        Conexión de solo lectura del hilo actual, creada la primera vez que se pide.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            uri = f"file:{pathname2url(os.path.abspath(self.ruta))}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, timeout=self.timeout, check_same_thread=False,
+                                   cached_statements=self.cache_sentencias)
+            self._ajustar(conn)
+            self._local.conn = conn
+            with self._candado:
+                self._lecturas[threading.get_ident()] = conn
+        return conn
+
+    def cerrar_lectura(self):
+        """
+        Cierra la conexión de lectura del hilo actual, si tiene una.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._candado:
+            self._lecturas.pop(threading.get_ident(), None)
+        conn.close()
+
+    def cerrar(self):
+        """
+        Cierra todas las conexiones. No debe haber hilos usándolas; se toma
+        `candado_escritura` para no cortar una transacción en curso.
+        """
+        with self.candado_escritura, self._candado:
+            conexiones = list(self._lecturas.values())
+            self._lecturas.clear()
+            if self._escritura is not None:
+                conexiones.append(self._escritura)
+                self._escritura = None
+            self._local = threading.local()
+            for conn in conexiones:
+                try:
+                    conn.close()
+                except sqlite3.Error as e:
+                    print(f"Error al cerrar la conexión: {e}")
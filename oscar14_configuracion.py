@@ -1,6 +1,174 @@
 # oscar14_configuracion.py
 
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QPushButton
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QCheckBox, QGroupBox,
+                             QTableWidget, QTableWidgetItem, QHeaderView, QFileDialog, QFormLayout, QSpinBox)
+from PyQt5.QtCore import QTimer
+from oscar14_metricas import METRICAS
+from oscar14_ajustes import AJUSTES, DEFINICIONES
+
+
+class PanelAjustes(QGroupBox):
+    """
+    Edita los ajustes de rendimiento (ver oscar14_ajustes). Cada cambio se
+    aplica en el momento; "Guardar Configuración" los deja para el próximo
+    arranque.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__("Ajustes de rendimiento", parent)
+        layout = QVBoxLayout(self)
+        formulario = QFormLayout()
+        layout.addLayout(formulario)
+
+        self.controles = {}
+        seccion = None
+        for definicion in DEFINICIONES:
+            if definicion.seccion != seccion:
+                seccion = definicion.seccion
+                formulario.addRow(QLabel(f"<b>{seccion}</b>"))
+            control = QSpinBox()
+            control.setRange(definicion.minimo, definicion.maximo)
+            control.setValue(AJUSTES[definicion.clave])
+            if definicion.unidad:
+                control.setSuffix(f" {definicion.unidad}")
+            control.setToolTip(definicion.ayuda)
+            # Sin esto cada tecla sería un cambio (y la cámara se reiniciaría al escribir)
+            control.setKeyboardTracking(False)
+            control.valueChanged.connect(lambda valor, clave=definicion.clave: self.cambiar(clave, valor))
+            formulario.addRow(definicion.etiqueta, control)
+            self.controles[definicion.clave] = control
+
+        fila_botones = QHBoxLayout()
+        btn_restablecer = QPushButton("Valores por defecto")
+        btn_restablecer.clicked.connect(AJUSTES.restablecer)
+        fila_botones.addWidget(btn_restablecer)
+        fila_botones.addStretch()
+        layout.addLayout(fila_botones)
+
+        self.label_estado = QLabel("")
+        layout.addWidget(self.label_estado)
+
+        AJUSTES.suscribir(self.mostrar_ajuste)
+
+    def cambiar(self, clave, valor):
+        AJUSTES.cambiar(clave, valor)
+        self.label_estado.setText("Cambios aplicados, sin guardar." if AJUSTES.modificado else "")
+
+    def mostrar_ajuste(self, clave, valor):
+        """
+        Refleja en el control un ajuste cambiado desde otro lugar (por ejemplo, al restablecer).
+        """
+        control = self.controles[clave]
+        control.blockSignals(True)
+        control.setValue(valor)
+        control.blockSignals(False)
+        self.label_estado.setText("Cambios aplicados, sin guardar.")
+
+    def guardar(self):
+        try:
+            AJUSTES.guardar()
+        except OSError as e:
+            print(f"Error al guardar los ajustes: {e}")
+            self.label_estado.setText(f"No se pudo guardar: {e}")
+            return
+        self.label_estado.setText(f"Ajustes guardados en {AJUSTES.ruta}")
+
+
+class PanelMetricas(QGroupBox):
+    """
+    Muestra las métricas de rendimiento (ver oscar14_metricas) y las
+    actualiza cada segundo mientras está visible.
+    """
+    COLUMNAS = ["Métrica", "Cantidad", "Por segundo", "p50 (ms)", "p95 (ms)", "Máx"]
+
+    def __init__(self, parent=None):
+        super().__init__("Rendimiento", parent)
+        layout = QVBoxLayout(self)
+
+        fila_botones = QHBoxLayout()
+        self.check_habilitado = QCheckBox("Medir rendimiento")
+        self.check_habilitado.setChecked(METRICAS.habilitado)
+        self.check_habilitado.toggled.connect(self.cambiar_habilitado)
+        fila_botones.addWidget(self.check_habilitado)
+        btn_reiniciar = QPushButton("Reiniciar")
+        btn_reiniciar.clicked.connect(self.reiniciar)
+        fila_botones.addWidget(btn_reiniciar)
+        btn_exportar = QPushButton("Exportar...")
+        btn_exportar.clicked.connect(self.exportar)
+        fila_botones.addWidget(btn_exportar)
+        fila_botones.addStretch()
+        layout.addLayout(fila_botones)
+
+        self.tabla = QTableWidget(0, len(self.COLUMNAS))
+        self.tabla.setHorizontalHeaderLabels(self.COLUMNAS)
+        self.tabla.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.tabla.horizontalHeader().setStretchLastSection(True)
+        self.tabla.verticalHeader().setVisible(False)
+        self.tabla.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.tabla)
+
+        self.label_estado = QLabel("")
+        layout.addWidget(self.label_estado)
+
+        self.temporizador = QTimer(self)
+        self.temporizador.setInterval(1000)
+        self.temporizador.timeout.connect(self.actualizar)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.actualizar()
+        self.temporizador.start()
+
+    def hideEvent(self, event):
+        self.temporizador.stop()
+        super().hideEvent(event)
+
+    def cambiar_habilitado(self, habilitado):
+        METRICAS.habilitar(habilitado)
+        self.actualizar()
+
+    def reiniciar(self):
+        METRICAS.reiniciar()
+        self.actualizar()
+
+    def actualizar(self):
+        if not METRICAS.habilitado:
+            self.label_estado.setText("La medición está desactivada.")
+            return
+        resumen = METRICAS.resumen()
+        filas = []
+        for nombre, etapa in resumen["etapas"].items():
+            filas.append([nombre, etapa["cantidad"], etapa["por_segundo"], etapa["p50_ms"], etapa["p95_ms"],
+                          etapa["max_ms"]])
+        for nombre, contador in resumen["contadores"].items():
+            filas.append([nombre, contador["valor"], contador["por_segundo"], "", "", ""])
+        for nombre, nivel in resumen["niveles"].items():
+            filas.append([nombre, nivel["actual"], "", "", "", nivel["maximo"]])
+        for nombre, proporcion in resumen["proporciones"].items():
+            filas.append([f"{nombre} (aciertos)", "" if proporcion is None else f"{proporcion:.1%}", "", "", "", ""])
+
+        self.tabla.setRowCount(len(filas))
+        for i, fila in enumerate(filas):
+            for j, valor in enumerate(fila):
+                item = self.tabla.item(i, j)
+                if item is None:
+                    item = QTableWidgetItem()
+                    self.tabla.setItem(i, j, item)
+                item.setText(str(valor))
+        self.label_estado.setText(f"Midiendo desde hace {resumen['segundos']:.0f} s")
+
+    def exportar(self):
+        ruta, _ = QFileDialog.getSaveFileName(self, "Exportar métricas", "metricas.json",
+                                              "JSON (*.json);;CSV (*.csv)")
+        if not ruta:
+            return
+        try:
+            METRICAS.volcar(ruta)
+            self.label_estado.setText(f"Métricas exportadas a {ruta}")
+        except OSError as e:
+            print(f"Error al exportar las métricas: {e}")
+            self.label_estado.setText(f"No se pudo exportar: {e}")
+
 
 class VentanaConfiguracion(QWidget):
     """
@@ -34,17 +202,24 @@ class VentanaConfiguracion(QWidget):
         label = QLabel("Esta es la ventana de configuración.")
         layout.addWidget(label)
 
-        # Botón de ejemplo
+        # Ajustes de rendimiento
+        self.panel_ajustes = PanelAjustes()
+        layout.addWidget(self.panel_ajustes)
+
+        # Guardar los ajustes para el próximo arranque
         boton_guardar = QPushButton("Guardar Configuración")
         boton_guardar.clicked.connect(self.guardar_configuracion)
         layout.addWidget(boton_guardar)
 
+        # Métricas de rendimiento
+        self.panel_metricas = PanelMetricas()
+        layout.addWidget(self.panel_metricas)
+
         self.setLayout(layout)
 
     def guardar_configuracion(self):
         """
         Guarda las configuraciones realizadas en la ventana.
         """
-        # Lógica para guardar configuraciones
-        pass
+        self.panel_ajustes.guardar()
 
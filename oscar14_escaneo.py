@@ -1,10 +1,359 @@
 # oscar14_escaneo.py
 import cv2
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QPushButton, QLineEdit, QHBoxLayout, QScrollArea, QFrame
+from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QLabel, QPushButton, QLineEdit, QHBoxLayout, QScrollArea, QFrame, QCheckBox
 from PyQt5.QtGui import QImage, QPixmap
-from PyQt5.QtCore import QTimer, Qt
+from PyQt5.QtCore import QObject, QThread, QTimer, Qt, pyqtSignal
+from collections import OrderedDict
+import hashlib
 import numpy as np
+import queue
 import re
+import time
+from oscar14_backend import CAMPOS_FORMULARIO, parsear_datos_qr, clave_natural
+from oscar14_qr import decodificar_qr_multiple
+from oscar14_metricas import METRICAS
+from oscar14_ajustes import AJUSTES
+
+# Etiqueta del formulario para cada columna
+ETIQUETAS_COLUMNAS = {columna: etiqueta for etiqueta, columna in CAMPOS_FORMULARIO.items()}
+
+
+def encolar_descartando(cola, elemento):
+    """
+    Pone `elemento` en una cola acotada; si está llena, descarta los más antiguos.
+    """
+    while True:
+        try:
+            cola.put_nowait(elemento)
+            return
+        except queue.Full:
+            try:
+                cola.get_nowait()
+                METRICAS.contar("escaneo.frames_descartados")
+            except queue.Empty:
+                pass
+
+
+class CacheEscaneos:
+    """
+    Recuerda los QR leídos recientemente para ignorar las lecturas repetidas.
+
+    Cada lectura se registra por el hash del texto y por la clave natural de
+    la factura, de modo que el mismo comprobante se reconoce aunque el texto
+    varíe. Una entrada caduca `ttl` segundos después de la última vez que se
+    vio; mientras el QR siga delante de la cámara no caduca. Como máximo se
+    guardan `max_entradas` (se descartan las menos recientes).
+    """
+
+    def __init__(self, ttl=30.0, max_entradas=512):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()  # clave -> instante de la última lectura
+
+    def _purgar(self, ahora):
+        while self._entradas:
+            clave, instante = next(iter(self._entradas.items()))
+            if ahora - instante < self.ttl and len(self._entradas) <= self.max_entradas:
+                break
+            self._entradas.popitem(last=False)
+
+    def ya_visto(self, data):
+        """
+        Registra la lectura y devuelve True si el QR o su factura ya se habían leído.
+        """
+        ahora = time.monotonic()
+        self._purgar(ahora)
+        claves = [("qr", hashlib.sha1(data.encode("utf-8")).hexdigest())]
+        clave = clave_natural(parsear_datos_qr(data))
+        if any(clave):
+            claves.append(("factura", clave))
+        visto = any(c in self._entradas for c in claves)
+        METRICAS.contar("escaneo.repetidos.aciertos" if visto else "escaneo.repetidos.fallos")
+        for c in claves:
+            self._entradas[c] = ahora
+            self._entradas.move_to_end(c)
+        self._purgar(ahora)
+        return visto
+
+    def limpiar(self):
+        self._entradas.clear()
+
+
+class DecodificadorAdaptativo:
+    """
+    Decodificación de QR que evita procesar el frame completo cuando no hace falta.
+
+    Lee todos los QR presentes en el frame. Por cada frame, en orden:
+    1. Si la escena no cambió respecto al último frame procesado (menos de
+       `proporcion_movimiento` de los píxeles de una miniatura en gris cambian
+       más de `umbral_movimiento`), se omite y se repite el último resultado.
+       Cada `forzar_cada` frames omitidos se procesa uno igualmente.
+    2. Si hubo QR en el frame anterior, se decodifica solo la región que rodea
+       a cada uno, a resolución completa. Cada `buscar_cada` frames se pasa
+       igualmente al paso 3 para descubrir QR nuevos.
+    3. Se decodifica una versión reducida en gris; los QR que se detectan pero
+       no se leen se reintentan en su región a resolución completa.
+    4. En el primer fallo tras un cambio de escena y luego cada
+       `cada_completo` fallos seguidos se prueba el frame completo, para los
+       QR demasiado pequeños para la versión reducida; así el primer frame
+       con QR se lee igual que antes.
+
+    `contadores` acumula cuántos frames resolvió cada etapa.
+    """
+
+    def __init__(self, ancho_reducido=640, umbral_movimiento=12, proporcion_movimiento=0.002,
+                 margen_roi=0.25, forzar_cada=15, cada_completo=5, buscar_cada=5):
+        self.detector = cv2.QRCodeDetector()
+        self.ancho_reducido = ancho_reducido
+        self.umbral_movimiento = umbral_movimiento
+        self.proporcion_movimiento = proporcion_movimiento
+        self.margen_roi = margen_roi
+        self.forzar_cada = forzar_cada
+        self.cada_completo = cada_completo
+        self.buscar_cada = buscar_cada
+        self._miniatura_anterior = None
+        self._omitidos_seguidos = 0
+        self._fallos_seguidos = 0
+        self._frames_sin_busqueda = 0
+        self._rois = []  # (x0, y0, x1, y1) de cada QR, en coordenadas del frame completo
+        self._ultimo_resultado = []
+        self.ultima_etapa = None
+        self.reiniciar_contadores()
+
+    def reiniciar_contadores(self):
+        self.contadores = {
+            "frames": 0,
+            "omitidos_sin_movimiento": 0,
+            "decodificados_roi": 0,
+            "decodificados_reducidos": 0,
+            "decodificados_completos": 0,
+            "sin_resultado": 0,
+        }
+
+    def _hay_movimiento(self, gris):
+        miniatura = cv2.resize(gris, (160, 120), interpolation=cv2.INTER_AREA)
+        if self._miniatura_anterior is not None and self._omitidos_seguidos < self.forzar_cada:
+            cambiados = np.count_nonzero(cv2.absdiff(miniatura, self._miniatura_anterior) > self.umbral_movimiento)
+            if cambiados < self.proporcion_movimiento * miniatura.size:
+                return False
+        self._miniatura_anterior = miniatura
+        return True
+
+    def _region(self, puntos, alto, ancho):
+        x0, y0 = puntos.min(axis=0)
+        x1, y1 = puntos.max(axis=0)
+        margen_x = (x1 - x0) * self.margen_roi
+        margen_y = (y1 - y0) * self.margen_roi
+        return (max(int(x0 - margen_x), 0), max(int(y0 - margen_y), 0),
+                min(int(x1 + margen_x), ancho), min(int(y1 + margen_y), alto))
+
+    def _decodificar_region(self, gris, region):
+        x0, y0, x1, y1 = region
+        if x1 - x0 < 21 or y1 - y0 < 21:
+            return "", None
+        data, points, _ = self.detector.detectAndDecode(gris[y0:y1, x0:x1])
+        if points is None:
+            return "", None
+        return data, points.reshape(-1, 2) + (x0, y0)
+
+    def _resultado(self, etapa, leidos, alto, ancho):
+        self.ultima_etapa = etapa
+        self.contadores[etapa] += 1
+        if leidos:
+            self._fallos_seguidos = 0
+        else:
+            self._fallos_seguidos += 1
+        self._rois = [self._region(puntos, alto, ancho) for puntos in leidos.values()]
+        self._ultimo_resultado = [
+            (data, np.array(puntos, dtype=np.int32).reshape((-1, 1, 2))) for data, puntos in leidos.items()
+        ]
+        return self._ultimo_resultado
+
+    def decodificar(self, frame):
+        """
+        Busca los QR del frame.
+
+        Returns:
+            list: Pares (texto decodificado, contorno np.int32 (-1, 1, 2)); vacía si no hay ninguno.
+        """
+        self.contadores["frames"] += 1
+        gris = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        alto, ancho = gris.shape
+
+        if not self._hay_movimiento(gris):
+            self._omitidos_seguidos += 1
+            self.ultima_etapa = "omitidos_sin_movimiento"
+            self.contadores["omitidos_sin_movimiento"] += 1
+            return self._ultimo_resultado
+        if self._omitidos_seguidos:
+            # La escena cambia tras un rato quieta: se trata como un intento nuevo
+            self._fallos_seguidos = 0
+        self._omitidos_seguidos = 0
+
+        leidos = {}  # texto -> puntos
+        if self._rois and self._frames_sin_busqueda < self.buscar_cada:
+            for region in self._rois:
+                data, puntos = self._decodificar_region(gris, region)
+                if not data:
+                    break
+                leidos[data] = puntos
+            else:
+                self._frames_sin_busqueda += 1
+                return self._resultado("decodificados_roi", leidos, alto, ancho)
+        self._frames_sin_busqueda = 0
+
+        escala = min(1.0, self.ancho_reducido / ancho)
+        reducido = gris if escala == 1.0 else cv2.resize(gris, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+        for data, puntos in decodificar_qr_multiple(reducido, self.detector, incluir_sin_leer=True, exhaustivo=False):
+            puntos = puntos / escala
+            if not data:
+                data, puntos = self._decodificar_region(gris, self._region(puntos, alto, ancho))
+            if data:
+                leidos.setdefault(data, puntos)
+        if leidos:
+            return self._resultado("decodificados_reducidos", leidos, alto, ancho)
+
+        if escala < 1.0 and self._fallos_seguidos % self.cada_completo == 0:
+            leidos = dict(decodificar_qr_multiple(gris, self.detector, exhaustivo=False))
+            if leidos:
+                return self._resultado("decodificados_completos", leidos, alto, ancho)
+
+        return self._resultado("sin_resultado", {}, alto, ancho)
+
+
+class HiloCaptura(QThread):
+    """
+    Lee frames de la webcam a un ritmo fijo, los deja en la cola de
+    decodificación y emite la imagen de vista previa ya convertida.
+    """
+    frame_listo = pyqtSignal(QImage)
+    error = pyqtSignal(str)
+
+    def __init__(self, cola_frames, hilo_decodificacion, indice_camara=0, fps=30, ancho=0, alto=0, parent=None):
+        super().__init__(parent)
+        self.cola_frames = cola_frames
+        self.hilo_decodificacion = hilo_decodificacion
+        self.indice_camara = indice_camara
+        self.fps = fps  # se lee en cada frame, puede cambiarse con el hilo en marcha
+        self.ancho = ancho  # 0 = la resolución que use la cámara
+        self.alto = alto
+
+    def run(self):
+        cap = cv2.VideoCapture(self.indice_camara)
+        if not cap.isOpened():
+            self.error.emit(f"No se pudo abrir la cámara {self.indice_camara}")
+            return
+        if self.ancho and self.alto:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.ancho)
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.alto)
+        cap.set(cv2.CAP_PROP_FPS, self.fps)
+        try:
+            while not self.isInterruptionRequested():
+                inicio = time.monotonic()
+                with METRICAS.medir("escaneo.captura"):
+                    ret, frame = cap.read()
+                if not ret:
+                    self.msleep(10)
+                    continue
+                encolar_descartando(self.cola_frames, frame)
+                METRICAS.nivel("escaneo.cola_frames", self.cola_frames.qsize())
+
+                # Convertir frame para mostrar en QLabel, con los últimos QR detectados marcados
+                with METRICAS.medir("escaneo.conversion_vista_previa"):
+                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                    contornos = self.hilo_decodificacion.ultimos_contornos
+                    if contornos:
+                        cv2.polylines(frame_rgb, contornos, True, (0, 255, 0), 2)
+                    h, w, ch = frame_rgb.shape
+                    qt_image = QImage(frame_rgb.data, w, h, ch * w, QImage.Format_RGB888).copy()
+                self.frame_listo.emit(qt_image)
+
+                espera = 1.0 / self.fps - (time.monotonic() - inicio)
+                if espera > 0:
+                    self.msleep(int(espera * 1000))
+        finally:
+            cap.release()
+
+
+class HiloDecodificacion(QThread):
+    """
+    Toma el frame más reciente de la cola y busca los códigos QR, como máximo
+    `decodificaciones_por_segundo` veces por segundo.
+
+    El detector (ver `DecodificadorAdaptativo`) se crea una sola vez y se
+    reutiliza entre frames; sus contadores se emiten una vez por segundo.
+    """
+    qrs_decodificados = pyqtSignal(list)  # textos de los QR leídos en un frame
+    estadisticas = pyqtSignal(dict)
+
+    def __init__(self, cola_frames, decodificaciones_por_segundo=10, parent=None):
+        super().__init__(parent)
+        self.cola_frames = cola_frames
+        self.decodificaciones_por_segundo = decodificaciones_por_segundo
+        self.ultimos_contornos = []  # contornos de los últimos QR, los lee el hilo de captura
+
+    def run(self):
+        decodificador = DecodificadorAdaptativo()
+        ultimo_aviso = time.monotonic()
+        while not self.isInterruptionRequested():
+            try:
+                frame = self.cola_frames.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            inicio = time.monotonic()
+            with METRICAS.medir("escaneo.decodificacion"):
+                codigos = decodificador.decodificar(frame)
+            self.ultimos_contornos = [contorno for _, contorno in codigos]
+            if codigos:
+                self.qrs_decodificados.emit([data for data, _ in codigos])
+            if inicio - ultimo_aviso >= 1.0:
+                self.estadisticas.emit(dict(decodificador.contadores))
+                ultimo_aviso = inicio
+
+            espera = 1.0 / self.decodificaciones_por_segundo - (time.monotonic() - inicio)
+            if espera > 0:
+                self.msleep(int(espera * 1000))
+
+
+class PipelineEscaneo(QObject):
+    """
+    Captura y decodificación de QR fuera del hilo de la interfaz.
+
+    Un hilo captura frames a `fps` y otro los decodifica a
+    `decodificaciones_por_segundo`; entre ambos hay una cola de tamaño
+    `tamano_cola` que descarta los frames viejos, así la decodificación
+    siempre trabaja sobre la imagen más reciente. Si la captura falla (por
+    ejemplo, no se pudo abrir la cámara) se detienen los dos hilos.
+    """
+    frame_listo = pyqtSignal(QImage)
+    qrs_decodificados = pyqtSignal(list)
+    estadisticas = pyqtSignal(dict)
+    error = pyqtSignal(str)
+
+    def __init__(self, indice_camara=0, fps=30, decodificaciones_por_segundo=10, tamano_cola=1, ancho=0, alto=0,
+                 parent=None):
+        super().__init__(parent)
+        self.cola_frames = queue.Queue(maxsize=tamano_cola)
+        self.hilo_decodificacion = HiloDecodificacion(self.cola_frames, decodificaciones_por_segundo)
+        self.hilo_captura = HiloCaptura(self.cola_frames, self.hilo_decodificacion, indice_camara, fps, ancho, alto)
+        self.hilo_captura.frame_listo.connect(self.frame_listo)
+        self.hilo_captura.error.connect(self.error)
+        self.hilo_captura.error.connect(self.detener)
+        self.hilo_decodificacion.qrs_decodificados.connect(self.qrs_decodificados)
+        self.hilo_decodificacion.estadisticas.connect(self.estadisticas)
+
+    def iniciar(self):
+        self.hilo_decodificacion.start()
+        self.hilo_captura.start()
+
+    def detener(self):
+        for hilo in (self.hilo_captura, self.hilo_decodificacion):
+            hilo.requestInterruption()
+        for hilo in (self.hilo_captura, self.hilo_decodificacion):
+            hilo.wait()
+
+    def esta_activo(self):
+        return self.hilo_captura.isRunning() and self.hilo_decodificacion.isRunning()
 
 class VentanaEscaneoQR(QWidget):
     """
@@ -12,17 +361,22 @@ class VentanaEscaneoQR(QWidget):
     Permite escanear un código QR con la webcam y extraer los datos para rellenar el formulario.
     """
 
-    def __init__(self, db):
+    def __init__(self, db, escritor):
         """
         Inicializa la ventana de escaneo QR.
 
         Args:
-            db: Objeto de la base de datos para guardar los datos escaneados.
+            db: Objeto de la base de datos.
+            escritor: EscritorFacturas que guarda los datos escaneados en segundo plano.
         """
         super().__init__()
         self.db = db
+        self.escritor = escritor
+        self.escritor.guardado.connect(self.guardado_terminado)
+        self.cache_escaneos = CacheEscaneos()
         self.init_ui()
-        self.cap = None  # Variable para la webcam
+        self.pipeline = None  # Captura y decodificación de la webcam
+        AJUSTES.suscribir(self.aplicar_ajuste)
 
     def init_ui(self):
         """
@@ -65,6 +419,15 @@ class VentanaEscaneoQR(QWidget):
         self.boton_limpiar.clicked.connect(self.limpiar_formulario)
         self.formulario_layout.addWidget(self.boton_limpiar)
 
+        # Guardado automático: cada factura nueva se guarda al leerse
+        self.check_guardado_automatico = QCheckBox("Guardado automático")
+        self.formulario_layout.addWidget(self.check_guardado_automatico)
+
+        # Confirmación visual del último guardado
+        self.label_confirmacion = QLabel("")
+        self.label_confirmacion.setAlignment(Qt.AlignCenter)
+        self.formulario_layout.addWidget(self.label_confirmacion)
+
         # Establecer diseño y color de fondo
         self.formulario_layout.setAlignment(Qt.AlignTop)
         layout_principal.addLayout(self.formulario_layout)
@@ -76,6 +439,10 @@ class VentanaEscaneoQR(QWidget):
         self.label_webcam.setAlignment(Qt.AlignCenter)
         self.webcam_layout.addWidget(self.label_webcam)
 
+        # Contadores de la etapa de decodificación
+        self.label_estadisticas = QLabel("")
+        self.webcam_layout.addWidget(self.label_estadisticas)
+
         # Botón para iniciar la webcam
         self.boton_iniciar_webcam = QPushButton("Iniciar Webcam")
         self.boton_iniciar_webcam.clicked.connect(self.iniciar_webcam)
@@ -84,68 +451,70 @@ class VentanaEscaneoQR(QWidget):
         self.webcam_frame.setLayout(self.webcam_layout)
         layout_principal.addWidget(self.webcam_frame)
 
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.mostrar_frame)
-
     def iniciar_webcam(self):
         """
         Inicia la cámara web para escanear códigos QR.
         """
-        self.cap = cv2.VideoCapture(0)
-        self.timer.start(20)
-
-    def mostrar_frame(self):
-        """
-        Captura y muestra el frame de la cámara web en tiempo real.
-        Intenta detectar y decodificar un código QR.
-        """
-        ret, frame = self.cap.read()
-        if ret:
-            # Detección de QR con OpenCV
-            qr_detector = cv2.QRCodeDetector()
-            data, points, _ = qr_detector.detectAndDecode(frame)
-            
-            if points is not None:
-                pts = np.array(points, dtype=np.int32)
-                pts = pts.reshape((-1, 1, 2))
-                frame = cv2.polylines(frame, [pts], True, (0, 255, 0), 2)
-                
-                if data:
-                    self.procesar_datos_qr(data)
-
-            # Convertir frame para mostrar en QLabel
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            h, w, ch = frame_rgb.shape
-            bytes_per_line = ch * w
-            qt_image = QImage(frame_rgb.data, w, h, bytes_per_line, QImage.Format_RGB888)
+        if self.pipeline and self.pipeline.esta_activo():
+            return
+        # Un pipeline a medias (p. ej. la cámara no abrió) se detiene antes de crear otro
+        self.cerrar_webcam()
+        self.pipeline = PipelineEscaneo(indice_camara=AJUSTES["camara.indice"], fps=AJUSTES["camara.fps"],
+                                        decodificaciones_por_segundo=AJUSTES["escaneo.decodificaciones_por_segundo"],
+                                        ancho=AJUSTES["camara.ancho"], alto=AJUSTES["camara.alto"])
+        self.pipeline.frame_listo.connect(self.mostrar_frame)
+        self.pipeline.qrs_decodificados.connect(self.recibir_qrs)
+        self.pipeline.estadisticas.connect(self.mostrar_estadisticas)
+        self.pipeline.error.connect(self.label_webcam.setText)
+        self.pipeline.iniciar()
+
+    def mostrar_frame(self, qt_image):
+        """
+        Muestra en la vista previa el frame ya convertido por el hilo de captura.
+        """
+        with METRICAS.medir("escaneo.mostrar_frame"):
             self.label_webcam.setPixmap(QPixmap.fromImage(qt_image))
 
+    def mostrar_estadisticas(self, contadores):
+        """
+        Muestra cuántos frames se omitieron o se decodificaron por la vía barata.
+        """
+        self.label_estadisticas.setText(
+            f"Frames: {contadores['frames']} | Sin movimiento: {contadores['omitidos_sin_movimiento']} | "
+            f"Región: {contadores['decodificados_roi']} | Reducidos: {contadores['decodificados_reducidos']} | "
+            f"Completos: {contadores['decodificados_completos']} | Sin QR: {contadores['sin_resultado']}"
+        )
+
+    def recibir_qrs(self, textos):
+        """
+        Atiende los QR leídos en un frame por el hilo de decodificación.
+
+        Las lecturas repetidas del mismo QR o de la misma factura se ignoran.
+        El formulario muestra la primera factura nueva y, con el guardado
+        automático activo, todas las facturas nuevas del frame se guardan en un
+        solo lote, que se escribe en segundo plano.
+        """
+        nuevos = [data for data in textos if not self.cache_escaneos.ya_visto(data)]
+        if not nuevos:
+            return
+        self.procesar_datos_qr(nuevos[0])
+        if self.check_guardado_automatico.isChecked():
+            facturas = [parsear_datos_qr(data) for data in nuevos]
+            if not self.escritor.encolar("escaneo", facturas, facturas):
+                # No se guardaron: que vuelvan a leerse en el próximo frame
+                self.cache_escaneos.limpiar()
+                self.mostrar_cola_llena()
+
     def procesar_datos_qr(self, data):
         """
         Procesa y muestra los datos extraídos del código QR en el formulario.
-        Utiliza una lógica más robusta para asignar los valores a los campos correctos.
 
         Args:
             data (str): Datos extraídos del código QR.
         """
-        # Descomponer los datos según un delimitador, asumiendo que es '|'
-        campos_extraidos = data.split('|')
-        
-        # Definir un mapeo directo según la posición en la lista (ajustar si es necesario)
-        mapeo_campos = [
-            "RUC Emisor", "Tipo Comprobante", "Serie", "Numeración",
-            "Monto Total", "Fecha Emisión", "Monto IGV", "RUC Adquiriente",
-            "Razón Social Emisor", "Razón Social Adquiriente",
-            "Valor Venta Gravada", "Valor Venta Inafecta",
-            "Valor Venta Exonerada", "Código Hash"
-        ]
-        
-        # Rellenar los campos con los datos extraídos
-        for i, nombre_campo in enumerate(mapeo_campos):
-            if i < len(campos_extraidos) and campos_extraidos[i].strip():
-                self.campos[nombre_campo].setText(campos_extraidos[i].strip())
-            else:
-                self.campos[nombre_campo].setText('')  # Dejar vacío si el dato no está disponible
+        # Rellenar los campos con los datos extraídos; vacío si el dato no está disponible
+        for columna, valor in parsear_datos_qr(data).items():
+            self.campos[ETIQUETAS_COLUMNAS[columna]].setText(valor)
 
     def limpiar_formulario(self):
         """
@@ -153,27 +522,109 @@ class VentanaEscaneoQR(QWidget):
         """
         for campo in self.campos.values():
             campo.clear()
+        # Permitir volver a leer las facturas ya escaneadas
+        self.cache_escaneos.limpiar()
 
     def guardar_datos(self):
         """
-        Lógica para guardar los datos en la base de datos.
+        Pide guardar los datos del formulario; el resultado llega a `guardado_terminado`.
+
+        Returns:
+            bool: False si la cola de guardado estaba llena.
         """
         # Crear un diccionario con los datos del formulario
         datos_a_guardar = {campo: self.campos[campo].text() for campo in self.campos}
-        self.db.guardar_factura(datos_a_guardar)
+        aceptado = self.escritor.encolar("escaneo", [datos_a_guardar],
+                                         [{"serie": datos_a_guardar["Serie"], "numeracion": datos_a_guardar["Numeración"]}])
+        if not aceptado:
+            self.mostrar_cola_llena()
+        return aceptado
+
+    def guardado_terminado(self, origen, facturas, resultado):
+        """
+        Recibe del escritor el resultado de un guardado; ignora los de otras ventanas.
+        """
+        if origen != "escaneo":
+            return
+        print(f"Facturas guardadas: {resultado['insertadas']}, rechazadas: {resultado['rechazadas']}, "
+              f"no guardadas: {resultado.get('no_guardadas', 0)}")
+        if resultado.get("no_guardadas"):
+            # La base estaba ocupada: que vuelvan a leerse para guardarlas otra vez
+            self.cache_escaneos.limpiar()
+        self.confirmar_guardado(resultado, facturas)
+
+    def mostrar_cola_llena(self):
+        self.label_confirmacion.setText("Guardado en espera, vuelva a intentarlo")
+        self.label_confirmacion.setStyleSheet("background-color: #C62828; color: white; font-size: 16px; padding: 6px;")
+        QTimer.singleShot(3000, self.ocultar_confirmacion)
+
+    def confirmar_guardado(self, resultado, facturas):
+        """
+        Avisa con un pitido y un mensaje de color del resultado del guardado.
+
+        Args:
+            resultado: Resultado de `guardar_facturas_lote`.
+            facturas: Diccionarios por columna de las facturas guardadas.
+        """
+        if len(facturas) == 1:
+            comprobante = f"{facturas[0]['serie']}-{facturas[0]['numeracion']}"
+        else:
+            comprobante = f"{len(facturas)} facturas"
+        if resultado["insertadas"] == len(facturas):
+            texto = f"Guardada {comprobante}" if len(facturas) == 1 else f"Guardadas {comprobante}"
+            color = "#2E7D32"
+            QApplication.beep()
+        elif resultado["insertadas"]:
+            texto, color = f"Guardadas {resultado['insertadas']} de {comprobante}", "#2E7D32"
+            QApplication.beep()
+        elif resultado.get("no_guardadas"):
+            texto, color = f"{comprobante} no guardada, vuelva a intentarlo", "#C62828"
+        else:
+            texto, color = f"{comprobante} ya registrada o rechazada", "#EF6C00"
+        self.label_confirmacion.setText(texto)
+        self.label_confirmacion.setStyleSheet(f"background-color: {color}; color: white; font-size: 16px; padding: 6px;")
+        QTimer.singleShot(1500, self.ocultar_confirmacion)
+
+    def ocultar_confirmacion(self):
+        self.label_confirmacion.setText("")
+        self.label_confirmacion.setStyleSheet("")
+
+    def aplicar_ajuste(self, clave, valor):
+        """
+        Aplica en el momento un ajuste cambiado en la pestaña Configuración.
+
+        Los ritmos de captura y decodificación se cambian con los hilos en
+        marcha; otra cámara u otra resolución reinician la captura.
+        """
+        if not (self.pipeline and self.pipeline.esta_activo()):
+            return
+        if clave == "camara.fps":
+            self.pipeline.hilo_captura.fps = valor
+        elif clave == "escaneo.decodificaciones_por_segundo":
+            self.pipeline.hilo_decodificacion.decodificaciones_por_segundo = valor
+        elif clave in ("camara.indice", "camara.ancho", "camara.alto"):
+            self.cerrar_webcam()
+            self.iniciar_webcam()
 
     def cerrar_webcam(self):
         """
         Libera los recursos de la cámara web.
         """
-        if self.cap:
-            self.cap.release()
-            self.timer.stop()
+        if self.pipeline:
+            self.pipeline.detener()
+            self.pipeline = None
+
+    def cerrar(self):
+        """
+        Detiene la captura y la decodificación.
+        """
+        AJUSTES.desuscribir(self.aplicar_ajuste)
+        self.cerrar_webcam()
 
     def closeEvent(self, event):
         """
         Evento que se ejecuta al cerrar la ventana.
         Cierra la cámara web si está activa.
         """
-        self.cerrar_webcam()
+        self.cerrar()
         super().closeEvent(event)
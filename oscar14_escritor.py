@@ -0,0 +1,178 @@
+# oscar14_escritor.py
+import queue
+import sqlite3
+import time
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from oscar14_metricas import METRICAS
+
+
+class EscritorFacturas(QThread):
+    """
+    Hilo que guarda las facturas en la base sin bloquear la interfaz.
+
+    Las ventanas encolan pedidos con `encolar` y siguen trabajando; el hilo
+    los escribe con la conexión de escritura de la base (ver
+    GestorConexiones), tomando su candado solo durante cada commit. Los pedidos que llegan juntos se
+    confirman en una sola transacción (commit en grupo): se junta hasta
+    `tamano_grupo` facturas o lo que llegue en `intervalo` segundos desde el
+    primer pedido, lo que ocurra antes.
+
+    La cola está acotada a `capacidad` pedidos. Si se llena (el disco o la
+    base no dan abasto), `encolar` espera un momento y, si sigue llena,
+    devuelve False para que quien guarda lo avise o lo reintente.
+
+    Cada pedido se valida e inserta igual que `FacturaDatabase.guardar_facturas_lote`
+    y su resultado se emite con `guardado`. Si la base está ocupada o bloqueada,
+    el grupo se repite hasta `reintentos` veces esperando `espera_reintento`
+    segundos (el doble en cada intento); si aun así no se pudo, el resultado
+    trae "no_guardadas" con las facturas que quedaron sin escribir, que no
+    cuentan como rechazadas.
+    """
+    guardado = pyqtSignal(str, object, dict)  # origen, contexto, {"insertadas", "rechazadas"[, "no_guardadas"]}
+    error = pyqtSignal(str)
+
+    def __init__(self, db, capacidad=1000, tamano_grupo=500, intervalo=0.1, reintentos=3, espera_reintento=0.5,
+                 parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.cola = queue.Queue(maxsize=capacidad)
+        self.tamano_grupo = tamano_grupo
+        self.intervalo = intervalo
+        self.reintentos = reintentos
+        self.espera_reintento = espera_reintento
+
+    def encolar(self, origen, facturas, contexto=None, espera=0.5):
+        """
+        Pide guardar facturas; no espera a que se escriban.
+
+        Args:
+            origen: Nombre de quien guarda, para reconocer su resultado en `guardado`.
+            facturas: Diccionarios de factura (ver `FacturaDatabase.preparar_fila`).
+            contexto: Cualquier dato que se devuelve tal cual con el resultado.
+            espera: Segundos que se espera si la cola está llena.
+
+        Returns:
+            bool: False si la cola siguió llena y el pedido no se aceptó.
+        """
+        try:
+            self.cola.put((origen, list(facturas), contexto), timeout=espera)
+        except queue.Full:
+            METRICAS.contar("escritor.rechazados_cola_llena")
+            self.error.emit("La cola de guardado está llena; las facturas no se guardaron")
+            return False
+        return True
+
+    def pendientes(self):
+        return self.cola.qsize()
+
+    def detener(self):
+        """
+        Escribe lo que queda en la cola y termina el hilo.
+        """
+        if self.isRunning():
+            self.cola.put(None)
+            self.wait()
+
+    def run(self):
+        terminar = False
+        while not terminar:
+            pedido = self.cola.get()
+            if pedido is None:
+                break
+            grupo, facturas = [pedido], len(pedido[1])
+            limite = time.monotonic() + self.intervalo
+            while facturas < self.tamano_grupo:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    pedido = self.cola.get(timeout=restante)
+                except queue.Empty:
+                    break
+                if pedido is None:
+                    terminar = True
+                    break
+                grupo.append(pedido)
+                facturas += len(pedido[1])
+            METRICAS.nivel("escritor.cola", self.cola.qsize())
+            METRICAS.contar("escritor.grupos")
+            METRICAS.contar("escritor.facturas", facturas)
+            with METRICAS.medir("escritor.commit"):
+                self._escribir(grupo)
+
+    def _escribir(self, grupo):
+        db = self.db
+        preparados = []
+        for origen, facturas, contexto in grupo:
+            rechazadas, filas = 0, []
+            for datos in facturas:
+                try:
+                    filas.append(db.preparar_fila(datos))
+                except (ValueError, AttributeError) as e:
+                    print(f"Factura rechazada: {e}")
+                    rechazadas += 1
+            preparados.append((origen, contexto, filas, rechazadas))
+
+        # Una base ocupada o bloqueada no es culpa de las filas: se repite el
+        # grupo con esperas crecientes y, si no se pudo, se avisa como no guardado
+        pendientes = list(range(len(preparados)))
+        resultados = [None] * len(preparados)
+        for intento in range(self.reintentos + 1):
+            try:
+                self._escribir_pedidos(preparados, pendientes, resultados)
+                break
+            except sqlite3.OperationalError as e:
+                if intento == self.reintentos:
+                    no_guardadas = sum(len(preparados[i][2]) for i in pendientes)
+                    METRICAS.contar("escritor.no_guardadas", no_guardadas)
+                    self.error.emit(f"No se guardaron {no_guardadas} facturas: {e}")
+                    for i in pendientes:
+                        filas, rechazadas = preparados[i][2], preparados[i][3]
+                        resultados[i] = {"insertadas": 0, "rechazadas": rechazadas, "no_guardadas": len(filas)}
+                    break
+                METRICAS.contar("escritor.reintentos")
+                print(f"Base ocupada al guardar, reintentando: {e}")
+                time.sleep(self.espera_reintento * 2 ** intento)
+
+        for (origen, contexto, _, _), resultado in zip(preparados, resultados):
+            self.guardado.emit(origen, contexto, resultado)
+
+    def _escribir_pedidos(self, preparados, pendientes, resultados):
+        """
+        Escribe los pedidos de `pendientes` (índices de `preparados`) y guarda
+        su resultado en `resultados`; los que se escriben salen de `pendientes`.
+
+        Raises:
+            sqlite3.OperationalError: Si la base está ocupada, bloqueada o no
+                se pudo escribir; lo confirmado antes queda fuera de `pendientes`.
+        """
+        db = self.db
+        consulta = db.consulta_insercion()
+        try:
+            parciales = []
+            with db.gestor.candado_escritura, db.conn:
+                for i in pendientes:
+                    filas, rechazadas = preparados[i][2], preparados[i][3]
+                    insertadas = db.conn.executemany(consulta, db.validar_lote(filas)).rowcount if filas else 0
+                    parciales.append({"insertadas": insertadas, "rechazadas": rechazadas + len(filas) - insertadas})
+            for i, resultado in zip(pendientes, parciales):
+                resultados[i] = resultado
+            pendientes.clear()
+            return
+        except sqlite3.OperationalError:
+            raise
+        except sqlite3.Error as e:
+            # El grupo se deshizo entero: se repite cada pedido por separado,
+            # que a su vez aísla las filas inválidas
+            self.error.emit(f"Error al guardar {len(pendientes)} pedidos juntos, reintentando por separado: {e}")
+
+        while pendientes:
+            i = pendientes[0]
+            filas, rechazadas = preparados[i][2], preparados[i][3]
+            resultado = {"insertadas": 0, "rechazadas": rechazadas}
+            if filas:
+                db._insertar_lote(filas, resultado)
+            resultados[i] = resultado
+            pendientes.pop(0)
@@ -4,11 +4,47 @@ from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButt
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 import numpy as np
+from oscar14_analitica import InstantaneaFacturas
+
+
+def actualizar_barras(ax, barras, posiciones, alturas, ancho=0.8, horizontal=False, **estilo):
+    """
+    Cambia las alturas y posiciones de un gráfico de barras sin recrearlo.
+
+    Si cambia el número de barras (un mes nuevo, por ejemplo) se borran y se
+    dibujan de nuevo; si no, se reutilizan los mismos rectángulos.
+
+    Returns:
+        BarContainer: Las barras que quedan en el gráfico.
+    """
+    if barras is not None and len(barras) == len(alturas):
+        for rectangulo, posicion, altura in zip(barras, posiciones, alturas):
+            if horizontal:
+                rectangulo.set_y(posicion - ancho / 2)
+                rectangulo.set_height(ancho)
+                rectangulo.set_width(altura)
+            else:
+                rectangulo.set_x(posicion - ancho / 2)
+                rectangulo.set_width(ancho)
+                rectangulo.set_height(altura)
+        return barras
+    if barras is not None:
+        barras.remove()
+    dibujar = ax.barh if horizontal else ax.bar
+    return dibujar(posiciones, alturas, ancho, **estilo)
+
+
+def reescalar(ax):
+    ax.relim()
+    ax.autoscale_view()
+
 
 class VentanaEstadisticas(QWidget):
     def __init__(self, db):
         super().__init__()
         self.db = db  # Almacenar la referencia de la base de datos
+        self.instantanea = None  # InstantaneaFacturas, se crea al mostrar la pestaña
+        self.barras = {}  # nombre del gráfico -> BarContainer, para actualizarlo en su sitio
         self.init_ui()
 
     def init_ui(self):
@@ -24,9 +60,34 @@ class VentanaEstadisticas(QWidget):
         scroll_widget = QWidget()
         scroll_layout = QVBoxLayout(scroll_widget)
         
-        # Área del gráfico
-        self.figura = Figure()
+        # Resumen en texto
+        self.label_resumen = QLabel("")
+        scroll_layout.addWidget(self.label_resumen)
+        self.label_analisis = QLabel("")
+        self.label_analisis.setWordWrap(True)
+        scroll_layout.addWidget(self.label_analisis)
+
+        # Área del gráfico: totales por mes arriba, emisores y tipos en medio,
+        # distribución de montos y volumen diario abajo. Los ejes y sus
+        # elementos se crean una vez y en cada actualización solo cambian sus datos.
+        self.figura = Figure(figsize=(10, 12))
         self.canvas = FigureCanvas(self.figura)
+        self.canvas.setMinimumHeight(900)
+        self.ax_meses = self.figura.add_subplot(3, 1, 1)
+        self.ax_emisores = self.figura.add_subplot(3, 2, 3)
+        self.ax_tipos = self.figura.add_subplot(3, 2, 4)
+        self.ax_histograma = self.figura.add_subplot(3, 2, 5)
+        self.ax_volumen = self.figura.add_subplot(3, 2, 6)
+        self.ax_meses.set_title("Total e IGV por mes")
+        self.ax_emisores.set_title("Principales emisores por monto")
+        self.ax_tipos.set_title("Comprobantes por tipo")
+        self.ax_histograma.set_title("Distribución del monto total")
+        self.ax_volumen.set_title("Facturas por día")
+        self.linea_diaria, = self.ax_volumen.plot([], [], linewidth=0.8, alpha=0.5, label="Diario")
+        self.linea_media, = self.ax_volumen.plot([], [], linewidth=1.5, label="Media 7 días")
+        self.ax_volumen.legend(loc="upper left")
+        self.ax_volumen.xaxis_date()
+        self.ax_volumen.tick_params(axis="x", labelrotation=30)
         scroll_layout.addWidget(self.canvas)
 
         # Botón para actualizar estadísticas
@@ -40,22 +101,81 @@ class VentanaEstadisticas(QWidget):
         layout_principal.addWidget(scroll_area)
         self.setLayout(layout_principal)
 
+    def showEvent(self, event):
+        # Las consultas leen las tablas de resumen, así que actualizar al mostrar la pestaña es barato
+        super().showEvent(event)
+        self.mostrar_estadisticas()
+
     def mostrar_estadisticas(self):
-        # Limpiar la figura antes de dibujar nuevas estadísticas
-        self.figura.clear()
+        """
+        Dibuja los totales e IGV por mes, los principales emisores y la cantidad
+        por tipo de comprobante a partir de las tablas de resumen, y la
+        distribución de montos, el volumen diario y las comprobaciones de
+        consistencia a partir de la instantánea en memoria.
+        """
+        meses = self.db.resumen_mensual()
+        emisores = self.db.top_emisores(10)
+        tipos = self.db.conteo_por_tipo()
+
+        cantidad = sum(m["cantidad"] for m in meses)
+        total = sum(m["monto_total"] for m in meses)
+        igv = sum(m["monto_igv"] for m in meses)
+        self.label_resumen.setText(f"Facturas: {cantidad}    Monto total: {total:,.2f}    IGV: {igv:,.2f}")
 
-        # Crear un gráfico de ejemplo, ajustar esto según los datos reales de la base de datos
-        ax = self.figura.add_subplot(111)
+        posiciones = np.arange(len(meses))
+        self.barras["total"] = actualizar_barras(self.ax_meses, self.barras.get("total"), posiciones - 0.2,
+                                                 [m["monto_total"] for m in meses], 0.4, color="C0", label="Total")
+        self.barras["igv"] = actualizar_barras(self.ax_meses, self.barras.get("igv"), posiciones + 0.2,
+                                               [m["monto_igv"] for m in meses], 0.4, color="C1", label="IGV")
+        self.ax_meses.set_xticks(posiciones)
+        self.ax_meses.set_xticklabels([m["mes"] or "Sin fecha" for m in meses], rotation=45, ha="right")
+        if meses and self.ax_meses.get_legend() is None:
+            self.ax_meses.legend()
+        reescalar(self.ax_meses)
 
-        # Aquí se debe obtener y procesar los datos desde self.db
-        # Ejemplo simple con datos aleatorios
-        data = np.random.rand(10)
-        ax.bar(range(len(data)), data)
+        emisores = emisores[::-1]  # el mayor arriba
+        posiciones = np.arange(len(emisores))
+        self.barras["emisores"] = actualizar_barras(self.ax_emisores, self.barras.get("emisores"), posiciones,
+                                                    [e["monto_total"] for e in emisores], horizontal=True, color="C0")
+        self.ax_emisores.set_yticks(posiciones)
+        self.ax_emisores.set_yticklabels([(e["razon_social"] or e["ruc_emisor"])[:25] for e in emisores])
+        reescalar(self.ax_emisores)
 
-        # Dibujar el gráfico
-        self.canvas.draw()
+        posiciones = np.arange(len(tipos))
+        self.barras["tipos"] = actualizar_barras(self.ax_tipos, self.barras.get("tipos"), posiciones,
+                                                 [t["cantidad"] for t in tipos], color="C0")
+        self.ax_tipos.set_xticks(posiciones)
+        self.ax_tipos.set_xticklabels([t["nombre"] for t in tipos])
+        reescalar(self.ax_tipos)
 
+        self.mostrar_analisis()
+        self.figura.tight_layout()
+        self.canvas.draw_idle()
 
+    def mostrar_analisis(self):
+        """
+        Actualiza la instantánea por columnas con las facturas nuevas y dibuja
+        los cálculos que necesitan cada factura y no solo los resúmenes.
+        """
+        if self.instantanea is None:
+            self.instantanea = InstantaneaFacturas(self.db)
+        else:
+            self.instantanea.refrescar()
 
+        conteos, bordes = self.instantanea.histograma("monto_total")
+        self.barras["histograma"] = actualizar_barras(self.ax_histograma, self.barras.get("histograma"),
+                                                      (bordes[:-1] + bordes[1:]) / 2, conteos, bordes[1] - bordes[0],
+                                                      color="C0")
+        reescalar(self.ax_histograma)
 
+        dias, cantidades, _, media = self.instantanea.volumen_diario(7)
+        self.linea_diaria.set_data(dias, cantidades)
+        self.linea_media.set_data(dias, media)
+        reescalar(self.ax_volumen)
 
+        percentiles = self.instantanea.percentiles("monto_total")
+        anomalias = self.instantanea.verificar_consistencia()
+        texto = "Monto total: " + ", ".join(f"p{q} {valor:,.2f}" for q, valor in percentiles.items())
+        texto += (f"    IGV distinto del 18% de la venta gravada: {len(anomalias['igv'])}"
+                  f"    Total que no cuadra con sus componentes: {len(anomalias['total'])}")
+        self.label_analisis.setText(texto)
@@ -0,0 +1,99 @@
+# oscar14_exportacion.py
+import csv
+import os
+
+from oscar14_metricas import METRICAS
+
+
+class ExportacionCancelada(Exception):
+    """
+    Se lanza cuando el usuario cancela una exportación en curso.
+    """
+
+
+def _escribir_excel(filas, encabezados, archivo, avisar):
+    from openpyxl import Workbook  # tarda en importarse; solo se carga al exportar a Excel
+
+    # En modo write_only openpyxl escribe cada fila al disco y no guarda celdas en memoria
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Facturas")
+    ws.append(list(encabezados))
+    for fila in filas:
+        ws.append(list(fila))
+        avisar()
+    wb.save(archivo)
+
+
+def _escribir_csv(filas, encabezados, archivo, avisar):
+    # utf-8-sig para que Excel reconozca las tildes al abrir el CSV
+    with open(archivo, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(encabezados)
+        for fila in filas:
+            writer.writerow(["" if valor is None else valor for valor in fila])
+            avisar()
+
+
+def _escribir_txt(filas, encabezados, archivo, avisar):
+    with open(archivo, "w", encoding="utf-8") as f:
+        for fila in filas:
+            f.write(", ".join(f"{clave}: {valor}" for clave, valor in zip(encabezados, fila)) + "\n")
+            avisar()
+
+
+ESCRITORES = {
+    "xlsx": _escribir_excel,
+    "csv": _escribir_csv,
+    "txt": _escribir_txt,
+}
+
+
+def exportar(filas, encabezados, ruta, formato=None, progreso=None, cancelado=None, intervalo_progreso=1000):
+    """
+    Escribe las filas en un archivo Excel, CSV o TXT sin cargarlas en memoria.
+
+    Las filas se consumen una a una del iterable (por ejemplo, un cursor de la
+    base de datos). El archivo se escribe primero con extensión ".parcial" y se
+    renombra al terminar, así una exportación cancelada o fallida no deja un
+    archivo a medias.
+
+    Args:
+        filas: Iterable de secuencias de valores, en el orden de `encabezados`.
+        encabezados: Nombres de las columnas.
+        ruta: Archivo de destino.
+        formato: "xlsx", "csv" o "txt"; por defecto según la extensión de `ruta`.
+        progreso: Función llamada con el número de filas escritas.
+        cancelado: Función sin argumentos que devuelve True para cancelar.
+        intervalo_progreso: Cada cuántas filas se consulta `progreso` y `cancelado`.
+
+    Returns:
+        int: Número de filas exportadas.
+    """
+    formato = (formato or os.path.splitext(ruta)[1].lstrip(".")).lower()
+    if formato not in ESCRITORES:
+        raise ValueError(f"Formato de exportación no soportado: {formato}")
+
+    escritas = 0
+
+    def avisar():
+        nonlocal escritas
+        escritas += 1
+        if escritas % intervalo_progreso == 0:
+            if cancelado and cancelado():
+                raise ExportacionCancelada()
+            if progreso:
+                progreso(escritas)
+
+    temporal = ruta + ".parcial"
+    try:
+        with METRICAS.medir(f"exportacion.{formato}"):
+            ESCRITORES[formato](filas, encabezados, temporal, avisar)
+            os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    if progreso:
+        progreso(escritas)
+    METRICAS.contar("exportacion.filas", escritas)
+    return escritas
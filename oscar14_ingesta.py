@@ -0,0 +1,281 @@
+# oscar14_ingesta.py
+"""
+Carga masiva de facturas desde un directorio de PDFs e imágenes, sin interfaz gráfica.
+
+Uso:
+    python oscar14_ingesta.py CARPETA [--procesos N] [--dpi 200] [--lote 500] [--sin-ocr] [--sin-cache] [--reprocesar]
+                                 [--informe informe.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import cv2
+
+from oscar14_backend import FacturaDatabase, parsear_datos_qr
+from oscar14_cache import CacheExtracciones
+from oscar14_ajustes import AJUSTES
+from oscar14_ocr import reconocer_imagen, parsear_campos, campos_a_factura
+from oscar14_pdf import EXTENSIONES_PDF, EXTENSIONES_IMAGEN, renderizar_paginas, cargar_imagen, huella_archivo
+from oscar14_qr import decodificar_qr_multiple
+
+
+def buscar_archivos(directorio):
+    """
+    Recorre el árbol de directorios y devuelve, ordenados, los PDFs e imágenes que contiene.
+    """
+    extensiones = set(EXTENSIONES_PDF + EXTENSIONES_IMAGEN)
+    archivos = []
+    for raiz, _, nombres in os.walk(directorio):
+        for nombre in nombres:
+            if os.path.splitext(nombre)[1].lower() in extensiones:
+                archivos.append(os.path.join(raiz, nombre))
+    return sorted(archivos)
+
+
+# Caché de solo lectura de cada proceso del pool; solo el proceso principal escribe
+_cache_proceso = None
+
+
+def _iniciar_proceso():
+    # Cada proceso usa un solo hilo de OpenCV y de tesseract para no saturar los núcleos
+    cv2.setNumThreads(1)
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def _abrir_cache(ruta_cache):
+    global _cache_proceso
+    if _cache_proceso is None:
+        _cache_proceso = CacheExtracciones(ruta_cache, solo_lectura=True)
+    return _cache_proceso
+
+
+def clave_ingesta(dpi, usar_ocr):
+    return f"dpi={dpi}|ocr={int(bool(usar_ocr))}"
+
+
+def procesar_archivo(ruta, dpi=200, usar_ocr=True, ruta_cache=None, omitir_ingestados=True):
+    """
+    Extrae las facturas de un archivo. Se ejecuta en un proceso del pool.
+
+    Por cada página se leen todos los QR; si una página no tiene ninguno y
+    `usar_ocr` está activo, se intenta reconocer la factura con OCR.
+
+    Con `ruta_cache`, un archivo ya cargado en la base se omite (si
+    `omitir_ingestados`) y uno ya procesado con los mismos parámetros
+    devuelve el resultado guardado sin rasterizar ni decodificar.
+
+    Returns:
+        dict: ruta, huella, paginas, facturas (diccionarios por columna),
+        por_qr, por_ocr, error (texto o None), omitido, desde_cache y segundos.
+    """
+    inicio = time.perf_counter()
+    resultado = {"ruta": ruta, "huella": None, "paginas": 0, "facturas": [], "por_qr": 0, "por_ocr": 0,
+                 "error": None, "omitido": False, "desde_cache": False}
+    try:
+        resultado["huella"] = huella_archivo(ruta)
+        if ruta_cache:
+            cache = _abrir_cache(ruta_cache)
+            if omitir_ingestados and cache.ingestado(resultado["huella"]):
+                resultado["omitido"] = True
+                resultado["segundos"] = time.perf_counter() - inicio
+                return resultado
+            guardado = cache.obtener(resultado["huella"], "ingesta", clave_ingesta(dpi, usar_ocr))
+            if guardado is not None:
+                resultado.update(guardado, desde_cache=True)
+                resultado["segundos"] = time.perf_counter() - inicio
+                return resultado
+
+        if os.path.splitext(ruta)[1].lower() in EXTENSIONES_PDF:
+            paginas = renderizar_paginas(ruta, dpi)
+        else:
+            paginas = [cargar_imagen(ruta)]
+
+        detector = cv2.QRCodeDetector()
+        for imagen in paginas:
+            resultado["paginas"] += 1
+            codigos = decodificar_qr_multiple(imagen, detector)
+            for data, _ in codigos:
+                resultado["facturas"].append(parsear_datos_qr(data))
+                resultado["por_qr"] += 1
+            if not codigos and usar_ocr:
+                try:
+                    factura = campos_a_factura(parsear_campos(reconocer_imagen(imagen)))
+                except Exception as e:
+                    # Un fallo del OCR no invalida las facturas ya leídas de otras páginas
+                    resultado["error"] = f"OCR en la página {resultado['paginas']}: {e}"
+                    continue
+                if factura:
+                    resultado["facturas"].append(factura)
+                    resultado["por_ocr"] += 1
+    except Exception as e:
+        resultado["error"] = f"{type(e).__name__}: {e}"
+    resultado["segundos"] = time.perf_counter() - inicio
+    return resultado
+
+
+def ingestar_directorio(directorio, db, procesos=None, dpi=200, tamano_lote=500, usar_ocr=True, progreso=None,
+                        cache=None, omitir_ingestados=True):
+    """
+    Procesa todos los archivos del directorio en un pool de procesos y guarda
+    las facturas en la base de datos por lotes.
+
+    Solo hay en vuelo unos pocos archivos por proceso, así que la memoria no
+    crece con el tamaño del directorio.
+
+    Args:
+        directorio: Carpeta raíz a recorrer.
+        db: FacturaDatabase donde se guardan las facturas.
+        procesos: Tamaño del pool; por defecto, el número de núcleos.
+        dpi: Resolución con que se rasterizan los PDFs.
+        tamano_lote: Facturas por transacción.
+        usar_ocr: Recurrir al OCR en las páginas sin QR.
+        progreso: Función llamada con (archivos procesados, total) tras cada archivo.
+        cache: CacheExtracciones donde se guardan los resultados y los archivos
+            cargados; sin caché se procesa todo cada vez.
+        omitir_ingestados: Saltar los archivos que ya se cargaron en una ejecución anterior.
+
+    Returns:
+        dict: Informe con totales, rendimiento y archivos fallidos.
+    """
+    inicio = time.perf_counter()
+    archivos = buscar_archivos(directorio)
+    procesos = procesos or os.cpu_count() or 1
+    informe = {
+        "directorio": os.path.abspath(directorio),
+        "archivos": len(archivos),
+        "procesos": procesos,
+        "paginas": 0,
+        "facturas_leidas": 0,
+        "por_qr": 0,
+        "por_ocr": 0,
+        "insertadas": 0,
+        "rechazadas": 0,
+        "omitidos": 0,
+        "desde_cache": 0,
+        "archivos_sin_facturas": [],
+        "archivos_fallidos": [],
+    }
+    pendientes = []
+    archivos_pendientes = []  # (huella, ruta) de los archivos cuyas facturas están en `pendientes`
+    clave = clave_ingesta(dpi, usar_ocr)
+
+    def volcar():
+        resultado = db.guardar_facturas_lote(pendientes, tamano_lote)
+        informe["insertadas"] += resultado["insertadas"]
+        informe["rechazadas"] += resultado["rechazadas"]
+        pendientes.clear()
+        # Un archivo se da por cargado solo cuando sus facturas ya están en la base
+        if cache:
+            cache.marcar_ingestados(archivos_pendientes)
+        archivos_pendientes.clear()
+
+    procesados = 0
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso) as pool:
+        en_vuelo = set()
+        restantes = iter(archivos)
+        while True:
+            for ruta in restantes:
+                en_vuelo.add(pool.submit(procesar_archivo, ruta, dpi, usar_ocr,
+                                         cache.ruta if cache else None, omitir_ingestados))
+                if len(en_vuelo) >= procesos * 4:
+                    break
+            if not en_vuelo:
+                break
+            listos, en_vuelo = wait(en_vuelo, return_when=FIRST_COMPLETED)
+            for futuro in listos:
+                resultado = futuro.result()
+                procesados += 1
+                if resultado["omitido"]:
+                    informe["omitidos"] += 1
+                    if progreso:
+                        progreso(procesados, len(archivos))
+                    continue
+                informe["paginas"] += resultado["paginas"]
+                informe["por_qr"] += resultado["por_qr"]
+                informe["por_ocr"] += resultado["por_ocr"]
+                informe["facturas_leidas"] += len(resultado["facturas"])
+                if resultado["error"]:
+                    informe["archivos_fallidos"].append({"ruta": resultado["ruta"], "error": resultado["error"]})
+                elif not resultado["facturas"]:
+                    informe["archivos_sin_facturas"].append(resultado["ruta"])
+                if resultado["desde_cache"]:
+                    informe["desde_cache"] += 1
+                elif cache and not resultado["error"]:
+                    # Los archivos con error no se guardan, para reintentarlos en la próxima ejecución
+                    cache.guardar(resultado["huella"], "ingesta",
+                                  {campo: resultado[campo] for campo in ("paginas", "facturas", "por_qr", "por_ocr")},
+                                  clave)
+                if not resultado["error"]:
+                    archivos_pendientes.append((resultado["huella"], resultado["ruta"]))
+                pendientes.extend(resultado["facturas"])
+                if len(pendientes) >= tamano_lote:
+                    volcar()
+                if progreso:
+                    progreso(procesados, len(archivos))
+    if pendientes or archivos_pendientes:
+        volcar()
+
+    segundos = time.perf_counter() - inicio
+    informe["segundos"] = round(segundos, 3)
+    informe["archivos_por_segundo"] = round(len(archivos) / segundos, 2) if segundos else 0.0
+    informe["paginas_por_segundo"] = round(informe["paginas"] / segundos, 2) if segundos else 0.0
+    return informe
+
+
+def imprimir_informe(informe):
+    print(f"Archivos: {informe['archivos']} ({informe['paginas']} páginas) con {informe['procesos']} procesos")
+    print(f"Facturas leídas: {informe['facturas_leidas']} (QR: {informe['por_qr']}, OCR: {informe['por_ocr']})")
+    print(f"Insertadas: {informe['insertadas']}, rechazadas o repetidas: {informe['rechazadas']}")
+    print(f"Omitidos por estar ya cargados: {informe['omitidos']}, resultados desde la caché: {informe['desde_cache']}")
+    print(f"Tiempo: {informe['segundos']} s, {informe['archivos_por_segundo']} archivos/s, "
+          f"{informe['paginas_por_segundo']} páginas/s")
+    print(f"Archivos sin facturas: {len(informe['archivos_sin_facturas'])}")
+    print(f"Archivos con error: {len(informe['archivos_fallidos'])}")
+    for fallo in informe["archivos_fallidos"]:
+        print(f"  {fallo['ruta']}: {fallo['error']}")
+
+
+def main(argv=None):
+    # Los valores por defecto salen de los ajustes guardados desde la pestaña Configuración
+    AJUSTES.cargar()
+    parser = argparse.ArgumentParser(description="Carga masiva de facturas desde PDFs e imágenes.")
+    parser.add_argument("directorio", help="Carpeta con los archivos a procesar (se recorre con subcarpetas)")
+    parser.add_argument("--procesos", type=int, default=AJUSTES["ingesta.procesos"] or None,
+                        help="Procesos en paralelo (por defecto, el ajuste guardado o uno por núcleo)")
+    parser.add_argument("--dpi", type=int, default=AJUSTES["pdf.dpi_qr"], help="Resolución para rasterizar los PDFs")
+    parser.add_argument("--lote", type=int, default=AJUSTES["bd.tamano_lote"], help="Facturas por transacción")
+    parser.add_argument("--sin-ocr", action="store_true", help="No usar OCR en las páginas sin QR")
+    parser.add_argument("--sin-cache", action="store_true", help="No usar ni guardar resultados en la caché de extracciones")
+    parser.add_argument("--reprocesar", action="store_true", help="Procesar también los archivos ya cargados")
+    parser.add_argument("--informe", help="Guardar el informe en este archivo JSON")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directorio):
+        parser.error(f"No existe el directorio {args.directorio}")
+
+    def mostrar_progreso(hechos, total):
+        print(f"\r{hechos}/{total} archivos", end="", file=sys.stderr, flush=True)
+
+    db = FacturaDatabase(tamano_lote=args.lote)
+    cache = None if args.sin_cache else CacheExtracciones(max_bytes=AJUSTES["cache.extracciones_mb"] * 1024 * 1024)
+    try:
+        informe = ingestar_directorio(args.directorio, db, args.procesos, args.dpi, args.lote,
+                                      not args.sin_ocr, mostrar_progreso, cache, not args.reprocesar)
+    finally:
+        db.cerrar_conexion()
+        if cache:
+            cache.cerrar()
+    print(file=sys.stderr)
+    imprimir_informe(informe)
+    if args.informe:
+        with open(args.informe, "w", encoding="utf-8") as f:
+            json.dump(informe, f, ensure_ascii=False, indent=2)
+    return 1 if informe["archivos_fallidos"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
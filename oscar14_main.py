@@ -1,12 +1,90 @@
 # oscar14_main.py
+import time
+
+INICIO = time.perf_counter()  # antes de cualquier otra importación, para medir el arranque completo
+
+import argparse
 import sys
-from PyQt5.QtWidgets import QApplication, QMainWindow, QTabWidget
+from PyQt5.QtWidgets import QApplication, QMainWindow, QTabWidget, QLabel, QSplashScreen
+from PyQt5.QtGui import QPixmap, QColor
+from PyQt5.QtCore import Qt
 from oscar14_backend import FacturaDatabase
-from oscar14_escaneo import VentanaEscaneoQR
-from oscar14_carga_archivos import VentanaCargaArchivos
-from oscar14_visualizacion_bd import VentanaVisualizacionDB
-from oscar14_estadistica import VentanaEstadisticas
-from oscar14_configuracion import VentanaConfiguracion  # Asegúrate de que esta clase esté definida
+from oscar14_escritor import EscritorFacturas
+from oscar14_ajustes import AJUSTES
+
+# Segundos desde que se empieza a cargar este módulo hasta que la ventana es visible
+PRESUPUESTO_VENTANA = 1.5
+
+
+class TiemposArranque:
+    """
+    Marcas de tiempo del arranque, medidas desde INICIO.
+    """
+
+    def __init__(self, inicio):
+        self.inicio = inicio
+        self.marcas = []  # (etapa, segundos desde el inicio)
+
+    def marcar(self, etapa):
+        self.marcas.append((etapa, time.perf_counter() - self.inicio))
+
+    def segundos(self, etapa):
+        return next((segundos for nombre, segundos in self.marcas if nombre == etapa), None)
+
+    def informe(self):
+        lineas = ["Tiempos de arranque:"]
+        anterior = 0.0
+        for etapa, segundos in self.marcas:
+            lineas.append(f"  {segundos * 1000:7.0f} ms  (+{(segundos - anterior) * 1000:5.0f} ms)  {etapa}")
+            anterior = segundos
+        visible = self.segundos("ventana visible")
+        if visible is not None:
+            estado = "dentro del" if visible <= PRESUPUESTO_VENTANA else "FUERA DEL"
+            lineas.append(f"  Ventana visible en {visible:.2f} s, {estado} presupuesto de {PRESUPUESTO_VENTANA:.2f} s")
+        return "\n".join(lineas)
+
+
+TIEMPOS = TiemposArranque(INICIO)
+TIEMPOS.marcar("importaciones")
+
+
+# Cada pestaña se crea la primera vez que se abre. Las funciones importan su
+# módulo al llamarse, así cv2, PyMuPDF, matplotlib... no se cargan al arrancar.
+
+def crear_escaneo(app):
+    from oscar14_escaneo import VentanaEscaneoQR
+    return VentanaEscaneoQR(app.db, app.escritor)
+
+
+def crear_carga_archivos(app):
+    from oscar14_carga_archivos import VentanaCargaArchivos
+    return VentanaCargaArchivos(app.db, app.escritor)
+
+
+def crear_visualizacion(app):
+    from oscar14_visualizacion_bd import VentanaVisualizacionDB
+    return VentanaVisualizacionDB(app.db)
+
+
+def crear_estadisticas(app):
+    from oscar14_estadistica import VentanaEstadisticas
+    return VentanaEstadisticas(app.db)
+
+
+def crear_configuracion(app):
+    from oscar14_configuracion import VentanaConfiguracion
+    return VentanaConfiguracion(app)
+
+
+# Título, atributo de MainApp y función que crea la pestaña, en orden
+PESTANAS = [
+    ("Escaneo QR", "ventana_escaneo_qr", crear_escaneo),
+    ("Carga de Archivos", "ventana_carga_archivos", crear_carga_archivos),
+    ("Visualización BD", "ventana_visualizacion_bd", crear_visualizacion),
+    ("Estadísticas", "ventana_estadisticas", crear_estadisticas),
+    ("Configuración", "ventana_configuracion", crear_configuracion),
+]
+
 
 class MainApp(QMainWindow):
     def __init__(self):
@@ -14,33 +92,116 @@ class MainApp(QMainWindow):
         self.setWindowTitle("Gestor de Facturas QR")
         self.setGeometry(100, 100, 1200, 800)
 
+        # Ajustes de rendimiento de este equipo (pestaña Configuración)
+        AJUSTES.cargar()
+        AJUSTES.suscribir(self.aplicar_ajuste)
+
         # Inicializar la base de datos
-        self.db = FacturaDatabase()
+        self.db = FacturaDatabase(tamano_lote=AJUSTES["bd.tamano_lote"])
 
-        # Crear las pestañas
+        # Los guardados de escaneo y carga se escriben en segundo plano
+        self.escritor = EscritorFacturas(self.db, tamano_grupo=AJUSTES["escritor.tamano_grupo"],
+                                         intervalo=AJUSTES["escritor.intervalo_ms"] / 1000)
+        self.escritor.error.connect(self.mostrar_error)
+        self.escritor.start()
+
+        # Crear las pestañas; al principio cada una es un aviso que se
+        # reemplaza por la ventana real al abrirla
         self.tab_widget = QTabWidget()
         self.setCentralWidget(self.tab_widget)
+        for titulo, atributo, _ in PESTANAS:
+            setattr(self, atributo, None)
+            aviso = QLabel("Cargando...")
+            aviso.setAlignment(Qt.AlignCenter)
+            self.tab_widget.addTab(aviso, titulo)
+        self.tab_widget.currentChanged.connect(self.construir_pestana)
 
-        # Añadir pestañas
-        self.ventana_escaneo_qr = VentanaEscaneoQR(self.db)
-        self.tab_widget.addTab(self.ventana_escaneo_qr, "Escaneo QR")
+    def construir_pestana(self, indice):
+        """
+        Crea la ventana de la pestaña `indice` si aún no existe.
+        """
+        titulo, atributo, crear = PESTANAS[indice]
+        if getattr(self, atributo) is not None:
+            return
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            ventana = crear(self)
+        finally:
+            QApplication.restoreOverrideCursor()
+        setattr(self, atributo, ventana)
 
-        self.ventana_carga_archivos = VentanaCargaArchivos(self.db)
-        self.tab_widget.addTab(self.ventana_carga_archivos, "Carga de Archivos")
+        aviso = self.tab_widget.widget(indice)
+        self.tab_widget.blockSignals(True)
+        self.tab_widget.removeTab(indice)
+        self.tab_widget.insertTab(indice, ventana, titulo)
+        self.tab_widget.setCurrentIndex(indice)
+        self.tab_widget.blockSignals(False)
+        aviso.deleteLater()
+        TIEMPOS.marcar(f"pestaña {titulo}")
 
-        self.ventana_visualizacion_bd = VentanaVisualizacionDB(self.db)
-        self.tab_widget.addTab(self.ventana_visualizacion_bd, "Visualización BD")
+    def aplicar_ajuste(self, clave, valor):
+        # El escritor lee estos valores en cada grupo, así que se aplican en el momento
+        if clave == "bd.tamano_lote":
+            self.db.tamano_lote = valor
+        elif clave == "escritor.tamano_grupo":
+            self.escritor.tamano_grupo = valor
+        elif clave == "escritor.intervalo_ms":
+            self.escritor.intervalo = valor / 1000
 
-        self.ventana_estadisticas = VentanaEstadisticas(self.db)
-        self.tab_widget.addTab(self.ventana_estadisticas, "Estadísticas")
+    def mostrar_error(self, mensaje):
+        print(mensaje)
+        self.statusBar().showMessage(mensaje, 5000)
 
-        self.ventana_configuracion = VentanaConfiguracion(self)
-        self.tab_widget.addTab(self.ventana_configuracion, "Configuración")
+    def closeEvent(self, event):
+        # Qt no envía closeEvent a las pestañas, así que se detienen aquí sus
+        # hilos y pools antes de cerrar las conexiones que usan
+        for _, atributo, _ in PESTANAS:
+            ventana = getattr(self, atributo)
+            if ventana is not None and hasattr(ventana, "cerrar"):
+                ventana.cerrar()
+        # Escribir lo que quede pendiente antes de salir
+        self.escritor.detener()
+        self.db.cerrar_conexion()
+        super().closeEvent(event)
 
 def main():
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="Gestor de Facturas QR")
+    parser.add_argument("--tiempos", action="store_true", help="Mostrar cuánto tardó cada etapa del arranque")
+    parser.add_argument("--medir-arranque", action="store_true",
+                        help="Arrancar, mostrar los tiempos y salir; termina con error si la ventana "
+                             "tardó más que el presupuesto")
+    parser.add_argument("--metricas", action="store_true",
+                        help="Medir el rendimiento desde el arranque (ver la pestaña Configuración)")
+    args, resto = parser.parse_known_args()
+    if args.metricas:
+        from oscar14_metricas import METRICAS
+        METRICAS.habilitar()
+
+    app = QApplication(sys.argv[:1] + resto)
+    TIEMPOS.marcar("QApplication")
+
+    pixmap = QPixmap(400, 160)
+    pixmap.fill(QColor("#2E7D32"))
+    splash = QSplashScreen(pixmap)
+    splash.showMessage("Gestor de Facturas QR\nCargando...", Qt.AlignCenter, Qt.white)
+    splash.show()
+    app.processEvents()
+
     ventana_principal = MainApp()
+    TIEMPOS.marcar("base de datos y ventana principal")
     ventana_principal.show()
+    splash.finish(ventana_principal)
+    app.processEvents()
+    TIEMPOS.marcar("ventana visible")
+
+    # La pestaña inicial se crea ya con la ventana en pantalla
+    ventana_principal.construir_pestana(ventana_principal.tab_widget.currentIndex())
+
+    if args.tiempos or args.medir_arranque:
+        print(TIEMPOS.informe())
+    if args.medir_arranque:
+        ventana_principal.close()
+        sys.exit(0 if TIEMPOS.segundos("ventana visible") <= PRESUPUESTO_VENTANA else 1)
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
@@ -0,0 +1,180 @@
+# oscar14_metricas.py
+"""
+Tiempos y contadores de las etapas de la aplicación.
+
+Uso:
+    from oscar14_metricas import METRICAS
+
+    with METRICAS.medir("pdf.renderizado"):
+        ...
+    METRICAS.contar("cache.qr.aciertos")
+    METRICAS.nivel("escaneo.cola_frames", cola.qsize())
+
+Mientras está deshabilitado (lo normal) `medir` devuelve un contexto que no
+hace nada y `contar` y `nivel` salen en la primera línea, así los puntos
+medidos no cuestan casi nada. Se habilita con `METRICAS.habilitar()`, desde
+la pestaña Configuración, con `--metricas` al arrancar o con la variable de
+entorno OSCAR14_METRICAS=1.
+"""
+import csv
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class _SinMedicion:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        return False
+
+
+_SIN_MEDICION = _SinMedicion()
+
+
+class _Medicion:
+    __slots__ = ("metricas", "etapa", "inicio")
+
+    def __init__(self, metricas, etapa):
+        self.metricas = metricas
+        self.etapa = etapa
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *excepcion):
+        self.metricas.registrar(self.etapa, time.perf_counter() - self.inicio)
+        return False
+
+
+class Metricas:
+    """
+    Registro de tiempos por etapa, contadores y niveles (por ejemplo, lo que
+    hay en una cola), seguro para usar desde varios hilos.
+
+    De cada etapa se guardan las últimas `muestras` duraciones, con las que
+    se calculan p50 y p95, y el total de mediciones desde el inicio, con el
+    que se calcula la tasa por segundo.
+    """
+
+    def __init__(self, habilitado=False, muestras=2048):
+        self.habilitado = habilitado
+        self.muestras = muestras
+        self._candado = threading.Lock()
+        self.reiniciar()
+
+    def habilitar(self, habilitado=True):
+        if habilitado and not self.habilitado:
+            self.reiniciar()
+        self.habilitado = habilitado
+
+    def reiniciar(self):
+        with self._candado:
+            self.inicio = time.monotonic()
+            self._duraciones = {}  # etapa -> deque de segundos
+            self._mediciones = {}  # etapa -> cantidad total
+            self._contadores = {}
+            self._niveles = {}  # nombre -> (último valor, máximo)
+
+    def medir(self, etapa):
+        """
+        Contexto que mide cuánto tarda su bloque y lo registra en `etapa`.
+        """
+        if not self.habilitado:
+            return _SIN_MEDICION
+        return _Medicion(self, etapa)
+
+    def registrar(self, etapa, segundos):
+        if not self.habilitado:
+            return
+        with self._candado:
+            duraciones = self._duraciones.get(etapa)
+            if duraciones is None:
+                duraciones = self._duraciones[etapa] = deque(maxlen=self.muestras)
+            duraciones.append(segundos)
+            self._mediciones[etapa] = self._mediciones.get(etapa, 0) + 1
+
+    def contar(self, nombre, cantidad=1):
+        if not self.habilitado:
+            return
+        with self._candado:
+            self._contadores[nombre] = self._contadores.get(nombre, 0) + cantidad
+
+    def nivel(self, nombre, valor):
+        if not self.habilitado:
+            return
+        with self._candado:
+            _, maximo = self._niveles.get(nombre, (0, valor))
+            self._niveles[nombre] = (valor, max(maximo, valor))
+
+    def resumen(self):
+        """
+        Estado actual de todas las métricas.
+
+        Returns:
+            dict: {"segundos": tiempo medido,
+                   "etapas": {etapa: {"cantidad", "por_segundo", "p50_ms", "p95_ms", "max_ms"}},
+                   "contadores": {nombre: {"valor", "por_segundo"}},
+                   "niveles": {nombre: {"actual", "maximo"}},
+                   "proporciones": {nombre: aciertos / (aciertos + fallos)}}
+        """
+        with self._candado:
+            segundos = max(time.monotonic() - self.inicio, 1e-9)
+            duraciones = {etapa: np.fromiter(valores, dtype=np.float64) for etapa, valores in self._duraciones.items()}
+            mediciones = dict(self._mediciones)
+            contadores = dict(self._contadores)
+            niveles = dict(self._niveles)
+        etapas = {}
+        for etapa, valores in sorted(duraciones.items()):
+            p50, p95 = np.percentile(valores, [50, 95]) * 1000
+            etapas[etapa] = {"cantidad": mediciones[etapa], "por_segundo": round(mediciones[etapa] / segundos, 2),
+                             "p50_ms": round(p50, 2), "p95_ms": round(p95, 2),
+                             "max_ms": round(valores.max() * 1000, 2)}
+        # Para cada par "x.aciertos"/"x.fallos" se calcula la proporción de aciertos de x
+        proporciones = {}
+        for nombre, aciertos in contadores.items():
+            if nombre.endswith(".aciertos"):
+                base = nombre[:-len(".aciertos")]
+                total = aciertos + contadores.get(base + ".fallos", 0)
+                proporciones[base] = round(aciertos / total, 3) if total else None
+        return {
+            "segundos": round(segundos, 1),
+            "etapas": etapas,
+            "contadores": {nombre: {"valor": valor, "por_segundo": round(valor / segundos, 2)}
+                           for nombre, valor in sorted(contadores.items())},
+            "niveles": {nombre: {"actual": actual, "maximo": maximo}
+                        for nombre, (actual, maximo) in sorted(niveles.items())},
+            "proporciones": proporciones,
+        }
+
+    def volcar(self, ruta):
+        """
+        Guarda el resumen en JSON o CSV, según la extensión de `ruta`.
+
+        El CSV tiene una fila por métrica: tipo, nombre y las columnas de su resumen.
+        """
+        resumen = self.resumen()
+        if os.path.splitext(ruta)[1].lower() != ".csv":
+            resumen["fecha"] = time.strftime("%Y-%m-%d %H:%M:%S")
+            with open(ruta, "w", encoding="utf-8") as f:
+                json.dump(resumen, f, ensure_ascii=False, indent=2)
+            return
+        columnas = ["tipo", "nombre", "cantidad", "por_segundo", "p50_ms", "p95_ms", "max_ms",
+                    "valor", "actual", "maximo", "proporcion"]
+        with open(ruta, "w", newline="", encoding="utf-8") as f:
+            escritor = csv.DictWriter(f, fieldnames=columnas)
+            escritor.writeheader()
+            for tipo in ("etapas", "contadores", "niveles"):
+                for nombre, valores in resumen[tipo].items():
+                    escritor.writerow({"tipo": tipo, "nombre": nombre, **valores})
+            for nombre, proporcion in resumen["proporciones"].items():
+                escritor.writerow({"tipo": "proporciones", "nombre": nombre, "proporcion": proporcion})
+
+
+METRICAS = Metricas(habilitado=os.environ.get("OSCAR14_METRICAS") == "1")
@@ -0,0 +1,484 @@
+# oscar14_migraciones.py
+import re
+import sqlite3
+from datetime import datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Columnas que guardan montos como enteros en céntimos
+COLUMNAS_MONTO = [
+    "monto_total", "monto_igv", "valor_venta_gravada",
+    "valor_venta_inafecta", "valor_venta_exonerada"
+]
+
+FORMATOS_FECHA = ["%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d", "%d.%m.%Y"]
+
+
+def a_centimos(valor):
+    """
+    Convierte un monto ("1,180.00", "1.180,00", "S/ 118", 118.5) a céntimos enteros.
+
+    Si el texto tiene coma y punto, el último de los dos es el separador
+    decimal. Devuelve None si el valor está vacío o no es un número.
+    """
+    if valor is None:
+        return None
+    if isinstance(valor, int):
+        return valor * 100
+    texto = str(valor).strip().upper().replace("S/", "").replace(" ", "")
+    if not texto:
+        return None
+    if "," in texto and "." in texto:
+        if texto.rfind(",") > texto.rfind("."):
+            texto = texto.replace(".", "").replace(",", ".")
+        else:
+            texto = texto.replace(",", "")
+    elif "," in texto:
+        # "1,5" o "1,50" es decimal; "1,180" es separador de miles
+        entero, _, decimales = texto.rpartition(",")
+        texto = f"{entero.replace(',', '')}.{decimales}" if len(decimales) <= 2 else texto.replace(",", "")
+    try:
+        monto = Decimal(texto)
+    except InvalidOperation:
+        return None
+    if not monto.is_finite():
+        return None
+    return int((monto * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+def de_centimos(centimos):
+    """
+    Convierte céntimos enteros al texto decimal con dos dígitos ("118.00").
+    """
+    if centimos is None:
+        return None
+    signo = "-" if centimos < 0 else ""
+    centimos = abs(int(centimos))
+    return f"{signo}{centimos // 100}.{centimos % 100:02d}"
+
+
+def normalizar_fecha(valor):
+    """
+    Convierte una fecha en cualquiera de los formatos habituales a ISO (AAAA-MM-DD).
+
+    Devuelve None si el valor está vacío o no se reconoce.
+    """
+    if valor is None:
+        return None
+    texto = str(valor).strip()
+    if not texto:
+        return None
+    # Quitar la hora si viene incluida ("2024-09-14T10:20:00", "14/09/2024 10:20")
+    texto = re.split(r"[T ]", texto, maxsplit=1)[0]
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto, formato).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def normalizar_numeracion(valor):
+    """
+    Quita los ceros a la izquierda de una numeración solo de dígitos, para
+    que "00000002" (leído por OCR) y "2" (leído del QR) sean el mismo comprobante.
+
+    Las numeraciones con otros caracteres solo se recortan.
+    """
+    texto = str(valor or "").strip()
+    if texto.isdigit():
+        return texto.lstrip("0") or "0"
+    return texto
+
+
+def _migracion_1_tabla_inicial(conn):
+    """
+    Tabla original, con todas las columnas como TEXT.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS facturas (
+        ruc_emisor TEXT,
+        tipo_comprobante TEXT,
+        serie TEXT,
+        numeracion TEXT,
+        monto_total TEXT,
+        fecha_emision TEXT,
+        monto_igv TEXT,
+        ruc_adquiriente TEXT,
+        razon_social_emisor TEXT,
+        razon_social_adquiriente TEXT,
+        valor_venta_gravada TEXT,
+        valor_venta_inafecta TEXT,
+        valor_venta_exonerada TEXT,
+        codigo_hash TEXT,
+        domicilio_emisor TEXT,
+        domicilio_adquiriente TEXT,
+        fecha_registro TEXT,
+        estado_validacion TEXT
+    )
+    """)
+
+
+def _migracion_2_tipos_e_indices(conn):
+    """
+    Reconstruye la tabla con clave primaria, montos en céntimos, fechas ISO,
+    clave natural única e índices de búsqueda.
+
+    Las filas repetidas según la clave natural se descartan conservando la primera.
+
+    Los montos y fechas que no se pueden convertir quedan en NULL, pero su
+    texto original se guarda en valores_originales (id de la factura,
+    columna, valor) para poder corregirlos a mano.
+    """
+    conn.create_function("a_centimos", 1, a_centimos, deterministic=True)
+    conn.create_function("normalizar_fecha", 1, normalizar_fecha, deterministic=True)
+
+    conn.execute("""
+    CREATE TABLE facturas_nueva (
+        id INTEGER PRIMARY KEY,
+        ruc_emisor TEXT NOT NULL DEFAULT '',
+        tipo_comprobante TEXT NOT NULL DEFAULT '',
+        serie TEXT NOT NULL DEFAULT '',
+        numeracion TEXT NOT NULL DEFAULT '',
+        monto_total INTEGER,
+        fecha_emision TEXT,
+        monto_igv INTEGER,
+        ruc_adquiriente TEXT,
+        razon_social_emisor TEXT,
+        razon_social_adquiriente TEXT,
+        valor_venta_gravada INTEGER,
+        valor_venta_inafecta INTEGER,
+        valor_venta_exonerada INTEGER,
+        codigo_hash TEXT,
+        domicilio_emisor TEXT,
+        domicilio_adquiriente TEXT,
+        fecha_registro TEXT,
+        estado_validacion TEXT,
+        UNIQUE (ruc_emisor, tipo_comprobante, serie, numeracion)
+    )
+    """)
+    conn.execute("""
+    INSERT OR IGNORE INTO facturas_nueva (
+        ruc_emisor, tipo_comprobante, serie, numeracion, monto_total, fecha_emision,
+        monto_igv, ruc_adquiriente, razon_social_emisor, razon_social_adquiriente,
+        valor_venta_gravada, valor_venta_inafecta, valor_venta_exonerada, codigo_hash,
+        domicilio_emisor, domicilio_adquiriente, fecha_registro, estado_validacion
+    )
+    SELECT
+        TRIM(IFNULL(ruc_emisor, '')), TRIM(IFNULL(tipo_comprobante, '')),
+        TRIM(IFNULL(serie, '')), TRIM(IFNULL(numeracion, '')),
+        a_centimos(monto_total), normalizar_fecha(fecha_emision), a_centimos(monto_igv),
+        ruc_adquiriente, razon_social_emisor, razon_social_adquiriente,
+        a_centimos(valor_venta_gravada), a_centimos(valor_venta_inafecta),
+        a_centimos(valor_venta_exonerada), codigo_hash,
+        domicilio_emisor, domicilio_adquiriente, fecha_registro, estado_validacion
+    FROM facturas
+    ORDER BY rowid
+    """)
+
+    conn.execute("""
+    CREATE TABLE valores_originales (
+        factura_id INTEGER NOT NULL,
+        columna TEXT NOT NULL,
+        valor TEXT,
+        PRIMARY KEY (factura_id, columna)
+    )
+    """)
+    for columna, conversion in [(c, "a_centimos") for c in COLUMNAS_MONTO] + [("fecha_emision", "normalizar_fecha")]:
+        # Solo la primera fila de cada clave natural, que es la que quedó en facturas_nueva
+        conn.execute(f"""
+        INSERT INTO valores_originales (factura_id, columna, valor)
+        SELECT n.id, '{columna}', v.{columna}
+        FROM facturas v
+        JOIN facturas_nueva n
+            ON n.ruc_emisor = TRIM(IFNULL(v.ruc_emisor, '')) AND n.tipo_comprobante = TRIM(IFNULL(v.tipo_comprobante, ''))
+            AND n.serie = TRIM(IFNULL(v.serie, '')) AND n.numeracion = TRIM(IFNULL(v.numeracion, ''))
+        WHERE TRIM(IFNULL(v.{columna}, '')) <> '' AND {conversion}(v.{columna}) IS NULL
+            AND v.rowid IN (
+                SELECT MIN(rowid) FROM facturas
+                GROUP BY TRIM(IFNULL(ruc_emisor, '')), TRIM(IFNULL(tipo_comprobante, '')),
+                         TRIM(IFNULL(serie, '')), TRIM(IFNULL(numeracion, ''))
+            )
+        """)
+    sin_convertir = conn.execute("SELECT COUNT(DISTINCT factura_id) FROM valores_originales").fetchone()[0]
+    if sin_convertir:
+        print(f"Migración 2: {sin_convertir} facturas tienen montos o fechas que no se pudieron convertir; "
+              f"el texto original quedó en la tabla valores_originales")
+
+    conn.execute("DROP TABLE facturas")
+    conn.execute("ALTER TABLE facturas_nueva RENAME TO facturas")
+    conn.execute("CREATE INDEX idx_facturas_ruc_emisor ON facturas (ruc_emisor)")
+    conn.execute("CREATE INDEX idx_facturas_ruc_adquiriente ON facturas (ruc_adquiriente)")
+    conn.execute("CREATE INDEX idx_facturas_fecha_emision ON facturas (fecha_emision)")
+
+
+def _migracion_3_indice_montos(conn):
+    """
+    Índice sobre el monto total para filtrar por rango y ordenar sin recorrer la tabla.
+    """
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_facturas_monto_total ON facturas (monto_total)")
+
+
+def _sumar_resumenes(fila, signo):
+    """
+    Sentencias que suman (signo "+") o restan (signo "-") una factura de las
+    tablas de resumen. `fila` es NEW u OLD dentro de un trigger.
+    """
+    cantidad = "1" if signo == "+" else "-1"
+    total = f"{signo}IFNULL({fila}.monto_total, 0)"
+    igv = f"{signo}IFNULL({fila}.monto_igv, 0)"
+    return f"""
+        INSERT INTO resumen_mensual (mes, cantidad, monto_total, monto_igv)
+        VALUES (IFNULL(substr({fila}.fecha_emision, 1, 7), ''), {cantidad}, {total}, {igv})
+        ON CONFLICT (mes) DO UPDATE SET
+            cantidad = cantidad + excluded.cantidad,
+            monto_total = monto_total + excluded.monto_total,
+            monto_igv = monto_igv + excluded.monto_igv;
+        INSERT INTO resumen_emisores (ruc_emisor, razon_social, cantidad, monto_total)
+        VALUES ({fila}.ruc_emisor, {fila}.razon_social_emisor, {cantidad}, {total})
+        ON CONFLICT (ruc_emisor) DO UPDATE SET
+            razon_social = IFNULL(excluded.razon_social, razon_social),
+            cantidad = cantidad + excluded.cantidad,
+            monto_total = monto_total + excluded.monto_total;
+        INSERT INTO resumen_tipos (tipo_comprobante, cantidad, monto_total)
+        VALUES ({fila}.tipo_comprobante, {cantidad}, {total})
+        ON CONFLICT (tipo_comprobante) DO UPDATE SET
+            cantidad = cantidad + excluded.cantidad,
+            monto_total = monto_total + excluded.monto_total;
+    """
+
+
+def _migracion_4_tablas_resumen(conn):
+    """
+    Tablas de resumen por mes, por emisor y por tipo de comprobante,
+    mantenidas por triggers en cada alta, baja o cambio de una factura.
+
+    Las estadísticas se leen de estas tablas, que tienen una fila por mes,
+    emisor o tipo, en lugar de agrupar toda la tabla facturas. Los montos
+    están en céntimos, como en facturas.
+    """
+    conn.execute("""
+    CREATE TABLE resumen_mensual (
+        mes TEXT PRIMARY KEY,
+        cantidad INTEGER NOT NULL,
+        monto_total INTEGER NOT NULL,
+        monto_igv INTEGER NOT NULL
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE resumen_emisores (
+        ruc_emisor TEXT PRIMARY KEY,
+        razon_social TEXT,
+        cantidad INTEGER NOT NULL,
+        monto_total INTEGER NOT NULL
+    )
+    """)
+    conn.execute("CREATE INDEX idx_resumen_emisores_monto ON resumen_emisores (monto_total)")
+    conn.execute("""
+    CREATE TABLE resumen_tipos (
+        tipo_comprobante TEXT PRIMARY KEY,
+        cantidad INTEGER NOT NULL,
+        monto_total INTEGER NOT NULL
+    )
+    """)
+
+    conn.execute("""
+    INSERT INTO resumen_mensual (mes, cantidad, monto_total, monto_igv)
+    SELECT IFNULL(substr(fecha_emision, 1, 7), ''), COUNT(*), IFNULL(SUM(monto_total), 0), IFNULL(SUM(monto_igv), 0)
+    FROM facturas GROUP BY 1
+    """)
+    conn.execute("""
+    INSERT INTO resumen_emisores (ruc_emisor, razon_social, cantidad, monto_total)
+    SELECT ruc_emisor, MAX(razon_social_emisor), COUNT(*), IFNULL(SUM(monto_total), 0)
+    FROM facturas GROUP BY ruc_emisor
+    """)
+    conn.execute("""
+    INSERT INTO resumen_tipos (tipo_comprobante, cantidad, monto_total)
+    SELECT tipo_comprobante, COUNT(*), IFNULL(SUM(monto_total), 0)
+    FROM facturas GROUP BY tipo_comprobante
+    """)
+
+    conn.execute(f"""
+    CREATE TRIGGER trg_facturas_resumen_insert AFTER INSERT ON facturas
+    BEGIN {_sumar_resumenes("NEW", "+")} END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER trg_facturas_resumen_delete AFTER DELETE ON facturas
+    BEGIN {_sumar_resumenes("OLD", "-")}
+        DELETE FROM resumen_emisores WHERE ruc_emisor = OLD.ruc_emisor AND cantidad = 0;
+    END
+    """)
+    # Solo las columnas que entran en los resúmenes: cambiar el estado de validación no los toca
+    conn.execute(f"""
+    CREATE TRIGGER trg_facturas_resumen_update
+    AFTER UPDATE OF fecha_emision, monto_total, monto_igv, ruc_emisor, razon_social_emisor, tipo_comprobante
+    ON facturas
+    BEGIN {_sumar_resumenes("OLD", "-")} {_sumar_resumenes("NEW", "+")}
+        DELETE FROM resumen_emisores WHERE ruc_emisor = OLD.ruc_emisor AND cantidad = 0;
+    END
+    """)
+
+
+# Columnas de texto indexadas en facturas_fts
+COLUMNAS_TEXTO = ["razon_social_emisor", "razon_social_adquiriente", "domicilio_emisor", "domicilio_adquiriente"]
+
+
+def _migracion_5_busqueda_texto(conn):
+    """
+    Índice de texto completo (FTS5) sobre razones sociales y domicilios.
+
+    Es una tabla de contenido externo: guarda solo el índice y lee el texto
+    de facturas. unicode61 con remove_diacritics 2 hace que "CAÑETE" y
+    "canete" o "Pérez" y "perez" coincidan, y el índice de prefijos de 2 y 3
+    letras acelera la búsqueda mientras se escribe. Los triggers lo mantienen
+    al día en cada alta, baja o cambio de esas columnas.
+    """
+    columnas = ", ".join(COLUMNAS_TEXTO)
+    nuevas = ", ".join(f"NEW.{columna}" for columna in COLUMNAS_TEXTO)
+    viejas = ", ".join(f"OLD.{columna}" for columna in COLUMNAS_TEXTO)
+    conn.execute(f"""
+    CREATE VIRTUAL TABLE facturas_fts USING fts5(
+        {columnas},
+        content='facturas', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """)
+    conn.execute("INSERT INTO facturas_fts (facturas_fts) VALUES ('rebuild')")
+    conn.execute(f"""
+    CREATE TRIGGER trg_facturas_fts_insert AFTER INSERT ON facturas BEGIN
+        INSERT INTO facturas_fts (rowid, {columnas}) VALUES (NEW.id, {nuevas});
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER trg_facturas_fts_delete AFTER DELETE ON facturas BEGIN
+        INSERT INTO facturas_fts (facturas_fts, rowid, {columnas}) VALUES ('delete', OLD.id, {viejas});
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER trg_facturas_fts_update AFTER UPDATE OF {columnas} ON facturas BEGIN
+        INSERT INTO facturas_fts (facturas_fts, rowid, {columnas}) VALUES ('delete', OLD.id, {viejas});
+        INSERT INTO facturas_fts (rowid, {columnas}) VALUES (NEW.id, {nuevas});
+    END
+    """)
+
+
+def _migracion_6_validacion(conn):
+    """
+    Columnas con el resultado de la validación local: las reglas que no se
+    cumplen y la versión de las reglas con que se validó cada factura, que
+    permite revalidar solo lo pendiente cuando cambian las reglas.
+    """
+    conn.execute("ALTER TABLE facturas ADD COLUMN observaciones_validacion TEXT")
+    conn.execute("ALTER TABLE facturas ADD COLUMN version_validacion INTEGER")
+    conn.execute("CREATE INDEX idx_facturas_version_validacion ON facturas (version_validacion)")
+    conn.execute("CREATE INDEX idx_facturas_estado_validacion ON facturas (estado_validacion)")
+
+
+def _migracion_7_verificaciones_sunat(conn):
+    """
+    Caché de las consultas de validez a SUNAT, por clave natural del comprobante.
+
+    Guarda el estado devuelto, la respuesta completa (JSON) y cuándo se
+    consultó, para no repetir la consulta mientras siga vigente.
+    """
+    conn.execute("""
+    CREATE TABLE verificaciones_sunat (
+        ruc_emisor TEXT NOT NULL,
+        tipo_comprobante TEXT NOT NULL,
+        serie TEXT NOT NULL,
+        numeracion TEXT NOT NULL,
+        estado TEXT NOT NULL,
+        respuesta TEXT,
+        fecha_consulta REAL NOT NULL,
+        PRIMARY KEY (ruc_emisor, tipo_comprobante, serie, numeracion)
+    )
+    """)
+
+
+def _migracion_8_numeracion_sin_ceros(conn):
+    """
+    Quita los ceros a la izquierda de las numeraciones en facturas y en
+    verificaciones_sunat (ver `normalizar_numeracion`).
+
+    Si al normalizar dos facturas quedan con la misma clave natural se
+    conserva la primera (menor id); de las verificaciones se conserva la
+    consulta más reciente.
+    """
+    conn.create_function("normalizar_numeracion", 1, normalizar_numeracion, deterministic=True)
+
+    repetida = """
+        EXISTS (
+            SELECT 1 FROM {tabla} o
+            WHERE o.ruc_emisor = t.ruc_emisor AND o.tipo_comprobante = t.tipo_comprobante AND o.serie = t.serie
+                AND normalizar_numeracion(o.numeracion) = normalizar_numeracion(t.numeracion)
+                AND {anterior}
+        )
+    """
+    repetida_factura = repetida.format(tabla="facturas", anterior="o.id < t.id")
+    conn.execute(f"""
+    DELETE FROM valores_originales
+    WHERE factura_id IN (SELECT t.id FROM facturas t WHERE {repetida_factura})
+    """)
+    descartadas = conn.execute(f"DELETE FROM facturas AS t WHERE {repetida_factura}").rowcount
+    if descartadas:
+        print(f"Migración 8: {descartadas} facturas repetidas (misma numeración con ceros a la izquierda) "
+              f"se descartaron conservando la primera")
+    conn.execute("""
+    UPDATE facturas SET numeracion = normalizar_numeracion(numeracion)
+    WHERE numeracion <> normalizar_numeracion(numeracion)
+    """)
+
+    repetida_verificacion = repetida.format(
+        tabla="verificaciones_sunat",
+        anterior="(o.fecha_consulta > t.fecha_consulta OR (o.fecha_consulta = t.fecha_consulta AND o.rowid > t.rowid))")
+    conn.execute(f"DELETE FROM verificaciones_sunat AS t WHERE {repetida_verificacion}")
+    conn.execute("""
+    UPDATE verificaciones_sunat SET numeracion = normalizar_numeracion(numeracion)
+    WHERE numeracion <> normalizar_numeracion(numeracion)
+    """)
+
+
+# Lista ordenada de migraciones: (versión, función). La versión aplicada se
+# guarda en PRAGMA user_version; nunca se deben renumerar las ya publicadas.
+MIGRACIONES = [
+    (1, _migracion_1_tabla_inicial),
+    (2, _migracion_2_tipos_e_indices),
+    (3, _migracion_3_indice_montos),
+    (4, _migracion_4_tablas_resumen),
+    (5, _migracion_5_busqueda_texto),
+    (6, _migracion_6_validacion),
+    (7, _migracion_7_verificaciones_sunat),
+    (8, _migracion_8_numeracion_sin_ceros),
+]
+
+
+def version_esquema(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def aplicar_migraciones(conn):
+    """
+    Lleva el esquema de la base de datos a la última versión.
+
+    Cada migración se ejecuta en su propia transacción junto con la
+    actualización de user_version, de modo que un fallo deja la base en la
+    última versión completa.
+
+    Returns:
+        int: Versión final del esquema.
+    """
+    version = version_esquema(conn)
+    for numero, migracion in MIGRACIONES:
+        if numero <= version:
+            continue
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            migracion(conn)
+            conn.execute(f"PRAGMA user_version = {numero}")
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        version = numero
+    return version
@@ -0,0 +1,385 @@
+# oscar14_ocr.py
+import os
+import re
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+from oscar14_migraciones import a_centimos, normalizar_fecha
+from oscar14_qr import a_gris
+
+# Se sube al cambiar el preprocesado o el parser, para no usar resultados guardados con la anterior
+VERSION_EXTRACTOR = "1"
+
+# Por debajo de esta confianza (0-100) un campo se marca para revisarlo
+UMBRAL_CONFIANZA = 60
+
+PATRON_RUC = re.compile(r"\b(?:10|15|17|20)\d{9}\b")
+PATRON_SERIE_NUMERO = re.compile(r"\b([FBE][A-Z0-9]{3})\s*[-–]\s*(\d{1,8})\b")
+PATRON_FECHA = re.compile(r"\b(\d{2}[/.-]\d{2}[/.-]\d{4}|\d{4}-\d{2}-\d{2})\b")
+PATRON_MONTO = re.compile(r"(\d{1,3}(?:[,.]\d{3})*[.,]\d{2}|\d+[.,]\d{2})(?!\d)")
+PATRON_HASH = re.compile(r"[A-Za-z0-9+/]{20,}={0,2}")
+PATRON_SOCIEDAD = re.compile(r"\b(S\.?A\.?C|S\.?A\.?A|S\.?R\.?L|E\.?I\.?R\.?L|S\.?A)\.?\b")
+PATRON_ADQUIRIENTE = re.compile(r"(SENOR\(?ES\)?|CLIENTE|ADQUIRIENTE|RAZON SOCIAL)\s*:?\s*(.*)")
+
+# Etiquetas de los montos, en orden de prioridad: "TOTAL OP. GRAVADA" es la
+# venta gravada y no el total
+ETIQUETAS_MONTO = [
+    ("valor_venta_gravada", re.compile(r"GRAVAD")),
+    ("valor_venta_inafecta", re.compile(r"INAFECT")),
+    ("valor_venta_exonerada", re.compile(r"EXONERAD")),
+    ("monto_igv", re.compile(r"\bI\.?\s?G\.?\s?V\b")),
+    ("monto_total", re.compile(r"(?<!SUB )\bTOTAL\b")),
+]
+
+# Palabras que identifican el tipo de comprobante (códigos SUNAT)
+TIPOS_COMPROBANTE = [
+    ("07", re.compile(r"NOTA DE CREDITO")),
+    ("08", re.compile(r"NOTA DE DEBITO")),
+    ("03", re.compile(r"BOLETA")),
+    ("01", re.compile(r"FACTURA")),
+]
+
+
+def _normalizar(texto):
+    """
+    Mayúsculas y sin tildes, para comparar etiquetas sin depender del OCR de los acentos.
+    """
+    descompuesto = unicodedata.normalize("NFKD", texto.upper())
+    return "".join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def estimar_inclinacion(binaria, max_grados=5.0, paso=0.5, ancho=800):
+    """
+    Ángulo (en grados) que endereza las líneas de texto de una imagen binarizada.
+
+    Se prueban rotaciones de la imagen reducida y se elige la que hace más
+    marcado el perfil de tinta por filas: con las líneas horizontales, las
+    filas de texto y los espacios entre líneas se separan mejor.
+    """
+    escala = min(1.0, ancho / binaria.shape[1])
+    tinta = (binaria < 128).astype(np.uint8) * 255
+    if escala < 1.0:
+        tinta = cv2.resize(tinta, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+    if not tinta.any():
+        return 0.0
+    alto, ancho = tinta.shape
+    centro = (ancho / 2, alto / 2)
+    mejor_angulo, mejor_puntaje = 0.0, -1.0
+    for angulo in np.arange(-max_grados, max_grados + paso / 2, paso):
+        matriz = cv2.getRotationMatrix2D(centro, float(angulo), 1.0)
+        rotada = cv2.warpAffine(tinta, matriz, (ancho, alto), flags=cv2.INTER_NEAREST, borderValue=0)
+        perfil = rotada.sum(axis=1, dtype=np.float64)
+        puntaje = np.square(np.diff(perfil)).sum()
+        if puntaje > mejor_puntaje:
+            mejor_angulo, mejor_puntaje = float(angulo), puntaje
+    return mejor_angulo
+
+
+def preprocesar(imagen, enderezar=True):
+    """
+    Prepara una página para el OCR: gris, umbral adaptativo y enderezado.
+
+    El umbral adaptativo quita sombras y fondos irregulares de los escaneos
+    mejor que el umbral global de tesseract.
+
+    Returns:
+        numpy.ndarray: Imagen binaria (texto negro sobre blanco).
+    """
+    gris = a_gris(imagen)
+    binaria = cv2.adaptiveThreshold(gris, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 15)
+    if enderezar:
+        angulo = estimar_inclinacion(binaria)
+        if angulo:
+            alto, ancho = binaria.shape
+            matriz = cv2.getRotationMatrix2D((ancho / 2, alto / 2), angulo, 1.0)
+            binaria = cv2.warpAffine(binaria, matriz, (ancho, alto), flags=cv2.INTER_LINEAR, borderValue=255)
+    return binaria
+
+
+def dividir_regiones(binaria, regiones=4):
+    """
+    Corta la página en franjas horizontales para reconocerlas en paralelo.
+
+    Los cortes se hacen en filas sin tinta cercanas a divisiones iguales, así
+    ninguna línea de texto queda partida. Las franjas en blanco se descartan.
+
+    Returns:
+        list: Franjas de la imagen, de arriba abajo.
+    """
+    alto = binaria.shape[0]
+    filas_vacias = np.flatnonzero((binaria < 128).sum(axis=1) == 0)
+    cortes = [0]
+    if regiones > 1 and len(filas_vacias):
+        for k in range(1, regiones):
+            objetivo = k * alto // regiones
+            fila = filas_vacias[np.abs(filas_vacias - objetivo).argmin()]
+            if abs(fila - objetivo) <= alto // (2 * regiones) and fila > cortes[-1]:
+                cortes.append(int(fila))
+    cortes.append(alto)
+    franjas = [binaria[inicio:fin] for inicio, fin in zip(cortes, cortes[1:])]
+    return [franja for franja in franjas if (franja < 128).any()]
+
+
+@lru_cache(maxsize=1)
+def idioma_por_defecto():
+    """
+    "spa" si tesseract tiene instalado el español; si no, su idioma por defecto.
+    """
+    import pytesseract
+
+    try:
+        return "spa" if "spa" in pytesseract.get_languages(config="") else None
+    except Exception:
+        return None
+
+
+def reconocer_lineas(imagen, idioma=None, config="--psm 6"):
+    """
+    Pasa tesseract por una imagen y la devuelve agrupada en líneas.
+
+    Returns:
+        list: Pares (texto, confianza) por línea, con la confianza media de
+        sus palabras entre 0 y 100.
+    """
+    # Se importa aquí para no cargarlo al arrancar la aplicación; en los
+    # procesos del pool solo se paga la primera vez
+    import pytesseract
+
+    datos = pytesseract.image_to_data(imagen, lang=idioma or idioma_por_defecto(), config=config,
+                                      output_type=pytesseract.Output.DICT)
+    lineas = {}
+    for i, palabra in enumerate(datos["text"]):
+        confianza = float(datos["conf"][i])
+        if confianza < 0 or not palabra.strip():
+            continue
+        clave = (datos["block_num"][i], datos["par_num"][i], datos["line_num"][i])
+        lineas.setdefault(clave, []).append((palabra.strip(), confianza))
+    return [(" ".join(p for p, _ in palabras), sum(c for _, c in palabras) / len(palabras))
+            for palabras in lineas.values()]
+
+
+def _preparar_pagina(gris, regiones):
+    # Se ejecuta en un proceso del pool
+    return dividir_regiones(preprocesar(gris), regiones)
+
+
+def _iniciar_proceso():
+    # Cada proceso usa un solo hilo de OpenCV y de tesseract para no saturar los núcleos
+    cv2.setNumThreads(1)
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def reconocer_imagen(imagen, idioma=None, regiones=1):
+    """
+    Preprocesa y reconoce una página en el proceso actual.
+
+    Pensado para código que ya se ejecuta en un proceso del pool (la carga
+    masiva); desde la interfaz se usa MotorOCR.
+    """
+    lineas = []
+    for franja in dividir_regiones(preprocesar(imagen), regiones):
+        lineas.extend(reconocer_lineas(franja, idioma))
+    return lineas
+
+
+class MotorOCR:
+    """
+    Reconoce páginas en un pool de procesos.
+
+    Cada página se preprocesa en un proceso y se corta en `regiones` franjas
+    que se reconocen en paralelo, así también una sola página aprovecha
+    varios núcleos. El pool se crea al primer uso y se reutiliza.
+    """
+
+    def __init__(self, procesos=None, idioma=None, regiones=4):
+        self.procesos = procesos or os.cpu_count() or 1
+        self.idioma = idioma
+        self.regiones = regiones
+        self._pool = None
+        self._procesos_pool = None
+
+    def _obtener_pool(self):
+        # Si cambió `procesos`, el pool anterior termina lo que tiene en curso
+        # y el próximo reconocimiento usa uno nuevo
+        if self._pool is not None and self._procesos_pool != self.procesos:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.procesos, initializer=_iniciar_proceso)
+            self._procesos_pool = self.procesos
+        return self._pool
+
+    def reconocer(self, imagenes, progreso=None, total=None):
+        """
+        Reconoce una o varias páginas.
+
+        Como mucho hay `procesos` x 2 páginas en curso: la siguiente imagen se
+        pide al iterable cuando una termina, así la memoria no crece con el
+        número de páginas y el progreso avanza desde la primera.
+
+        Args:
+            imagenes: Iterable de imágenes PIL o arreglos; se consume a medida
+                que se envían las páginas al pool.
+            progreso: Función llamada con (páginas reconocidas, total de páginas).
+            total: Número de páginas, para el progreso; por defecto len(imagenes)
+                si se puede, si no el total es None.
+
+        Returns:
+            list: Pares (texto, confianza) de todas las líneas, en el orden de las páginas.
+        """
+        pool = self._obtener_pool()
+        if total is None and hasattr(imagenes, "__len__"):
+            total = len(imagenes)
+        max_en_curso = self.procesos * 2
+        imagenes = iter(imagenes)
+        agotadas = False
+        lineas_por_pagina = []  # por página, las líneas de cada franja
+        preparando = {}  # futuro de _preparar_pagina -> página
+        reconociendo = {}  # futuro de reconocer_lineas -> (página, franja)
+        faltan = {}  # página -> franjas sin reconocer
+        hechas = 0
+
+        def terminar_pagina(pagina):
+            nonlocal hechas
+            del faltan[pagina]
+            hechas += 1
+            if progreso:
+                progreso(hechas, total)
+
+        while True:
+            while not agotadas and len(preparando) + len(faltan) < max_en_curso:
+                imagen = next(imagenes, None)
+                if imagen is None:
+                    agotadas = True
+                    break
+                # Se envía solo el gris para copiar un tercio de datos entre procesos
+                preparando[pool.submit(_preparar_pagina, a_gris(imagen), self.regiones)] = len(lineas_por_pagina)
+                lineas_por_pagina.append([])
+            if not preparando and not reconociendo:
+                break
+            listos, _ = wait(list(preparando) + list(reconociendo), return_when=FIRST_COMPLETED)
+            for futuro in listos:
+                if futuro in preparando:
+                    pagina = preparando.pop(futuro)
+                    franjas = futuro.result()
+                    lineas_por_pagina[pagina] = [[] for _ in franjas]
+                    faltan[pagina] = len(franjas)
+                    for indice, franja in enumerate(franjas):
+                        reconociendo[pool.submit(reconocer_lineas, franja, self.idioma)] = (pagina, indice)
+                    if not franjas:  # página en blanco
+                        terminar_pagina(pagina)
+                else:
+                    pagina, indice = reconociendo.pop(futuro)
+                    lineas_por_pagina[pagina][indice] = futuro.result()
+                    faltan[pagina] -= 1
+                    if not faltan[pagina]:
+                        terminar_pagina(pagina)
+        return [linea for franjas in lineas_por_pagina for franja in franjas for linea in franja]
+
+    def extraer_campos(self, imagenes, progreso=None, total=None):
+        """
+        Reconoce las páginas y devuelve los campos de la factura (ver parsear_campos).
+        """
+        return parsear_campos(self.reconocer(imagenes, progreso, total))
+
+    def cerrar(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def parsear_campos(lineas):
+    """
+    Extrae los campos de una factura de las líneas reconocidas por el OCR.
+
+    Se toma la primera aparición de cada dato, así en un documento de varias
+    páginas manda la primera. La confianza de un campo es la de la línea de
+    la que salió.
+
+    Args:
+        lineas: Pares (texto, confianza) como los de reconocer_lineas.
+
+    Returns:
+        dict: Columna -> (valor, confianza) solo con los campos encontrados.
+    """
+    campos = {}
+
+    def poner(columna, valor, confianza):
+        if columna not in campos and valor:
+            campos[columna] = (valor, round(confianza, 1))
+
+    rucs = []
+    fecha_con_etiqueta = False
+    for texto, confianza in lineas:
+        normal = _normalizar(texto)
+
+        for ruc in PATRON_RUC.findall(texto):
+            if ruc not in rucs:
+                rucs.append(ruc)
+                poner("ruc_emisor" if len(rucs) == 1 else "ruc_adquiriente", ruc, confianza)
+
+        for codigo, patron in TIPOS_COMPROBANTE:
+            if patron.search(normal):
+                poner("tipo_comprobante", codigo, confianza)
+                break
+
+        serie_numero = PATRON_SERIE_NUMERO.search(normal)
+        if serie_numero:
+            poner("serie", serie_numero.group(1), confianza)
+            poner("numeracion", serie_numero.group(2), confianza)
+
+        fecha = PATRON_FECHA.search(texto)
+        fecha_iso = normalizar_fecha(fecha.group(1).replace(".", "/")) if fecha else None
+        if fecha_iso and "EMISION" in normal and not fecha_con_etiqueta:
+            # La fecha rotulada como de emisión manda sobre la primera que aparezca
+            campos["fecha_emision"] = (fecha_iso, round(confianza, 1))
+            fecha_con_etiqueta = True
+        else:
+            poner("fecha_emision", fecha_iso, confianza)
+
+        montos = PATRON_MONTO.findall(texto)
+        if montos:
+            for columna, patron in ETIQUETAS_MONTO:
+                if not patron.search(normal):
+                    continue
+                if columna == "monto_total":
+                    # Puede haber varias líneas con "TOTAL"; el importe total es el mayor
+                    anterior = campos.get(columna)
+                    if anterior is None or (a_centimos(montos[-1]) or 0) > (a_centimos(anterior[0]) or 0):
+                        campos[columna] = (montos[-1], round(confianza, 1))
+                else:
+                    poner(columna, montos[-1], confianza)
+                break
+
+        if "HASH" in normal or "RESUMEN" in normal:
+            codigo = PATRON_HASH.search(texto.split(":", 1)[-1])
+            if codigo:
+                poner("codigo_hash", codigo.group(0), confianza)
+
+        adquiriente = PATRON_ADQUIRIENTE.search(normal)
+        if adquiriente:
+            inicio = len(texto) - len(adquiriente.group(2))
+            poner("razon_social_adquiriente", texto[inicio:].strip(" :"), confianza)
+        elif PATRON_SOCIEDAD.search(normal) and not PATRON_RUC.search(texto):
+            poner("razon_social_emisor", texto.strip(), confianza)
+
+    if "tipo_comprobante" not in campos and "serie" in campos:
+        # Sin la palabra en el texto, la primera letra de la serie indica el tipo
+        valor, confianza = campos["serie"]
+        campos["tipo_comprobante"] = ("03" if valor.startswith("B") else "01", confianza)
+    return campos
+
+
+def campos_a_factura(campos):
+    """
+    Quita las confianzas de parsear_campos y devuelve un diccionario por columna.
+
+    Devuelve None si no están al menos el RUC del emisor, la serie y la numeración.
+    """
+    if not all(columna in campos for columna in ("ruc_emisor", "serie", "numeracion")):
+        return None
+    return {columna: valor for columna, (valor, _) in campos.items()}
@@ -0,0 +1,246 @@
+# oscar14_pdf.py
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import fitz  # PyMuPDF
+from PIL import Image
+from oscar14_metricas import METRICAS
+
+EXTENSIONES_PDF = [".pdf"]
+EXTENSIONES_IMAGEN = [".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp"]
+
+# Resolución de renderizado según para qué se usa la página
+DPI_POR_PROPOSITO = {
+    "vista_previa": 150,
+    "qr": 200,
+    "ocr": 300,
+}
+
+
+def contar_paginas(archivo_pdf):
+    """
+    Devuelve el número de páginas de un PDF.
+    """
+    with fitz.open(archivo_pdf) as documento:
+        return documento.page_count
+
+
+def renderizar_pagina(archivo_pdf, pagina=0, dpi=200):
+    """
+    Rasteriza una sola página de un PDF como imagen PIL en RGB.
+
+    Usa PyMuPDF y, si falla, pdf2image limitado a esa página.
+
+    Args:
+        archivo_pdf: Ruta al archivo PDF.
+        pagina: Índice de la página, empezando en 0.
+        dpi: Resolución del renderizado.
+    """
+    try:
+        with fitz.open(archivo_pdf) as documento:
+            pix = documento.load_page(pagina).get_pixmap(dpi=dpi, alpha=False)
+            return Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    except Exception as e:
+        print(f"Error al procesar el PDF con PyMuPDF: {e}")
+
+    from pdf2image import convert_from_path  # solo como respaldo de PyMuPDF
+
+    paginas = convert_from_path(archivo_pdf, dpi=dpi, first_page=pagina + 1, last_page=pagina + 1)
+    if not paginas:
+        raise ValueError(f"El PDF no tiene la página {pagina + 1}")
+    return paginas[0].convert("RGB")
+
+
+def renderizar_paginas(archivo_pdf, dpi=200):
+    """
+    Generador de las páginas de un PDF, una a una, como imágenes PIL en RGB.
+
+    El documento se abre una sola vez; si PyMuPDF no puede con una página se
+    renderiza esa página con pdf2image.
+    """
+    with fitz.open(archivo_pdf) as documento:
+        for pagina in range(documento.page_count):
+            try:
+                pix = documento.load_page(pagina).get_pixmap(dpi=dpi, alpha=False)
+                yield Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+            except Exception as e:
+                print(f"Error al procesar la página {pagina + 1} con PyMuPDF: {e}")
+                from pdf2image import convert_from_path
+                yield convert_from_path(archivo_pdf, dpi=dpi, first_page=pagina + 1, last_page=pagina + 1)[0].convert("RGB")
+
+
+def huella_archivo(ruta, tamano_bloque=1024 * 1024):
+    """
+    SHA-256 del contenido del archivo, en hexadecimal.
+    """
+    sha = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(tamano_bloque), b""):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+class ServicioRenderPDF:
+    """
+    Renderiza páginas sueltas de PDFs con documentos abiertos y caché de páginas.
+
+    - Solo se rasteriza la página pedida, a la resolución de su propósito
+      (ver DPI_POR_PROPOSITO).
+    - Se mantienen abiertos los últimos `max_documentos` PDFs.
+    - Las páginas renderizadas se guardan en una caché LRU con clave
+      (huella del archivo, página, dpi, rotación) que no supera `memoria_max`
+      bytes; la huella es el SHA-256 del contenido, así un archivo modificado
+      no devuelve páginas viejas. Se recuerdan las huellas de los últimos
+      `max_huellas` archivos para no volver a leerlos enteros.
+    - `precargar` renderiza páginas vecinas en un hilo aparte.
+
+    PyMuPDF no admite uso concurrente de un documento, por eso todo el acceso
+    a los documentos pasa por un mismo candado.
+    """
+
+    def __init__(self, dpi_por_proposito=None, max_documentos=8, memoria_max=256 * 1024 * 1024, max_huellas=1024):
+        self.dpi_por_proposito = dict(DPI_POR_PROPOSITO, **(dpi_por_proposito or {}))
+        self.max_documentos = max_documentos
+        self.memoria_max = memoria_max
+        self.max_huellas = max_huellas
+        self._documentos = OrderedDict()  # ruta -> ((ruta, mtime, tamaño) al abrirlo, documento fitz)
+        self._huellas = OrderedDict()  # (ruta, mtime, tamaño) -> huella
+        self._paginas = OrderedDict()  # (huella, página, dpi, rotación) -> imagen PIL
+        self._memoria = 0
+        self._candado = threading.RLock()
+        self._precarga = ThreadPoolExecutor(max_workers=1)
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _estado(self, ruta):
+        estado = os.stat(ruta)
+        return os.path.abspath(ruta), estado.st_mtime_ns, estado.st_size
+
+    def huella(self, ruta, estado=None):
+        clave = estado or self._estado(ruta)
+        with self._candado:
+            if clave not in self._huellas:
+                self._huellas[clave] = huella_archivo(ruta)
+                while len(self._huellas) > self.max_huellas:
+                    self._huellas.popitem(last=False)
+            self._huellas.move_to_end(clave)
+            return self._huellas[clave]
+
+    def _documento(self, ruta, estado=None):
+        """
+        Documento abierto de `ruta`. Si el archivo cambió desde que se abrió
+        (otra fecha de modificación o tamaño), se cierra y se vuelve a abrir.
+        """
+        estado = estado or self._estado(ruta)
+        ruta = estado[0]
+        abierto = self._documentos.get(ruta)
+        if abierto is not None and abierto[0] != estado:
+            del self._documentos[ruta]
+            abierto[1].close()
+            abierto = None
+        if abierto is None:
+            abierto = (estado, fitz.open(ruta))
+            self._documentos[ruta] = abierto
+            while len(self._documentos) > self.max_documentos:
+                _, (_, viejo) = self._documentos.popitem(last=False)
+                viejo.close()
+        self._documentos.move_to_end(ruta)
+        return abierto[1]
+
+    def contar_paginas(self, ruta):
+        with self._candado:
+            return self._documento(ruta).page_count
+
+    def _guardar(self, clave, imagen):
+        tamano = imagen.width * imagen.height * len(imagen.getbands())
+        if tamano > self.memoria_max:
+            return
+        self._paginas[clave] = imagen
+        self._memoria += tamano
+        self._recortar()
+
+    def _recortar(self):
+        while self._memoria > self.memoria_max:
+            _, vieja = self._paginas.popitem(last=False)
+            self._memoria -= vieja.width * vieja.height * len(vieja.getbands())
+
+    def limitar_memoria(self, memoria_max):
+        """
+        Cambia el límite de la caché de páginas y descarta las más viejas si lo supera.
+        """
+        with self._candado:
+            self.memoria_max = memoria_max
+            self._recortar()
+
+    def renderizar(self, ruta, pagina=0, proposito="vista_previa", rotacion=0, dpi=None):
+        """
+        Devuelve la página como imagen PIL en RGB, desde la caché si ya se había renderizado.
+
+        Args:
+            ruta: Archivo PDF.
+            pagina: Índice de la página, empezando en 0.
+            proposito: Clave de `dpi_por_proposito` ("vista_previa", "qr", "ocr").
+            rotacion: Grados de rotación en sentido horario (múltiplo de 90).
+            dpi: Resolución explícita; tiene prioridad sobre `proposito`.
+        """
+        dpi = dpi or self.dpi_por_proposito[proposito]
+        # El documento se abre con el mismo estado del archivo con que se
+        # calculó la huella, así una página nunca se guarda con la huella de otro contenido
+        estado = self._estado(ruta)
+        clave = (self.huella(ruta, estado), pagina, dpi, rotacion % 360)
+        with self._candado:
+            imagen = self._paginas.get(clave)
+            if imagen is not None:
+                self._paginas.move_to_end(clave)
+                self.aciertos += 1
+                METRICAS.contar("pdf.paginas.aciertos")
+                return imagen
+            self.fallos += 1
+            METRICAS.contar("pdf.paginas.fallos")
+            with METRICAS.medir(f"pdf.renderizado.{proposito}"):
+                try:
+                    documento = self._documento(ruta, estado)
+                    matriz = fitz.Matrix(dpi / 72, dpi / 72).prerotate(rotacion)
+                    pix = documento.load_page(pagina).get_pixmap(matrix=matriz, alpha=False)
+                    imagen = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+                except Exception as e:
+                    print(f"Error al procesar el PDF con PyMuPDF: {e}")
+                    imagen = renderizar_pagina(ruta, pagina, dpi)
+                    if rotacion % 360:
+                        imagen = imagen.rotate(-rotacion, expand=True)
+            self._guardar(clave, imagen)
+            return imagen
+
+    def precargar(self, ruta, paginas, proposito="vista_previa", rotacion=0):
+        """
+        Renderiza en segundo plano las páginas indicadas que existan en el documento.
+        """
+        def tarea():
+            try:
+                total = self.contar_paginas(ruta)
+                for pagina in paginas:
+                    if 0 <= pagina < total:
+                        self.renderizar(ruta, pagina, proposito, rotacion)
+            except Exception as e:
+                print(f"Error al precargar páginas: {e}")
+        self._precarga.submit(tarea)
+
+    def cerrar(self):
+        self._precarga.shutdown(wait=True, cancel_futures=True)
+        with self._candado:
+            for _, documento in self._documentos.values():
+                documento.close()
+            self._documentos.clear()
+            self._huellas.clear()
+            self._paginas.clear()
+            self._memoria = 0
+
+
+def cargar_imagen(archivo_imagen):
+    """
+    Abre un archivo de imagen y lo devuelve en RGB.
+    """
+    with Image.open(archivo_imagen) as imagen:
+        return imagen.convert("RGB")
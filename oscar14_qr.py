@@ -0,0 +1,76 @@
+# oscar14_qr.py
+import cv2
+import numpy as np
+
+# Se sube al cambiar la forma de decodificar, para no usar resultados guardados con la anterior
+VERSION_EXTRACTOR = "1"
+
+
+def a_gris(imagen):
+    """
+    Convierte una imagen (PIL o arreglo RGB/BGR/gris) a un arreglo en gris.
+
+    El canal de color no importa para leer un QR, por eso no se distingue
+    entre RGB y BGR.
+    """
+    arreglo = np.asarray(imagen)
+    if arreglo.ndim == 3:
+        codigo = cv2.COLOR_RGBA2GRAY if arreglo.shape[2] == 4 else cv2.COLOR_RGB2GRAY
+        return cv2.cvtColor(arreglo, codigo)
+    return arreglo
+
+
+def decodificar_qr_multiple(imagen, detector=None, incluir_sin_leer=False, exhaustivo=True, max_codigos=16):
+    """
+    Busca y decodifica todos los códigos QR de una imagen.
+
+    Args:
+        imagen: Imagen PIL o arreglo de NumPy.
+        detector: cv2.QRCodeDetector reutilizable; si no se da, se crea uno.
+        incluir_sin_leer: Devolver también los QR localizados que no se pudieron leer (texto "").
+        exhaustivo: detectAndDecodeMulti no siempre localiza todos los QR de una
+            hoja; con esta opción se prueba también el detector ArUco si no se
+            leyó nada, y se tapan los encontrados para repetir la búsqueda con
+            el detector simple hasta que no aparezcan más. Cuesta pasadas
+            extra, por eso la webcam no la usa.
+        max_codigos: Límite de códigos en la búsqueda exhaustiva.
+
+    Returns:
+        list: Pares (texto, puntos) con los puntos como arreglo float (4, 2), sin textos repetidos.
+    """
+    detector = detector or cv2.QRCodeDetector()
+    gris = a_gris(imagen)
+    encontrados = []
+    ok, textos, puntos, _ = detector.detectAndDecodeMulti(gris)
+    if ok and puntos is not None:
+        encontrados = [(texto, p.reshape(-1, 2)) for texto, p in zip(textos, puntos)]
+    if not any(texto for texto, _ in encontrados):
+        # detectAndDecodeMulti a veces no lee un QR aislado que el detector simple sí
+        texto, p, _ = detector.detectAndDecode(gris)
+        if p is not None and (texto or not encontrados):
+            encontrados = [(texto, p.reshape(-1, 2))]
+
+    if exhaustivo and not any(texto for texto, _ in encontrados) and hasattr(cv2, "QRCodeDetectorAruco"):
+        # El detector basado en ArUco (OpenCV >= 4.7) encuentra QR que el clásico pasa por alto
+        ok, textos, puntos, _ = cv2.QRCodeDetectorAruco().detectAndDecodeMulti(gris)
+        if ok and puntos is not None:
+            encontrados = [(texto, p.reshape(-1, 2)) for texto, p in zip(textos, puntos)]
+
+    if exhaustivo and encontrados:
+        tapada = gris.copy()
+        nuevos = encontrados
+        while nuevos and len(encontrados) < max_codigos:
+            for _, p in nuevos:
+                cv2.fillConvexPoly(tapada, p.astype(np.int32), 255)
+            texto, p, _ = detector.detectAndDecode(tapada)
+            nuevos = [(texto, p.reshape(-1, 2))] if p is not None else []
+            encontrados = encontrados + nuevos
+
+    resultado, vistos = [], set()
+    for texto, p in encontrados:
+        if texto in vistos or (not texto and not incluir_sin_leer):
+            continue
+        if texto:
+            vistos.add(texto)
+        resultado.append((texto, p))
+    return resultado
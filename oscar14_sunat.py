@@ -0,0 +1,376 @@
+# oscar14_sunat.py
+"""
+Consulta la validez de los comprobantes en SUNAT y guarda el estado en la base.
+
+Uso:
+    python oscar14_sunat.py [--url URL] [--token TOKEN] [--concurrencia 20] [--tasa 50]
+                            [--limite N] [--reverificar]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+
+import aiohttp
+
+from oscar14_migraciones import de_centimos
+from oscar14_validacion import ESTADO_VALIDO
+
+# Servicio de consulta de validez de comprobantes; {ruc} es el RUC de quien consulta
+URL_SUNAT = "https://api.sunat.gob.pe/v1/contribuyente/contribuyentes/{ruc}/validarcomprobante"
+
+# Valores de estadoCp en la respuesta de SUNAT
+ESTADOS_CP = {
+    "0": "NO EXISTE",
+    "1": "ACEPTADO",
+    "2": "ANULADO",
+    "3": "AUTORIZADO",
+    "4": "NO AUTORIZADO",
+}
+
+# Tiempo durante el que se reutiliza una respuesta guardada, según el estado.
+# Un comprobante anulado no vuelve a cambiar; uno aceptado puede darse de
+# baja después, y uno que no existe puede haberse enviado con retraso.
+VIGENCIA_POR_ESTADO = {
+    "ANULADO": None,  # para siempre
+    "NO AUTORIZADO": None,
+    "ACEPTADO": 30 * 24 * 3600,
+    "AUTORIZADO": 30 * 24 * 3600,
+    "NO EXISTE": 24 * 3600,
+}
+
+# Respuestas HTTP que se reintentan; el resto de errores del servidor se dan por definitivos
+ESTADOS_HTTP_REINTENTABLES = {408, 429, 500, 502, 503, 504}
+
+
+class ErrorConsulta(Exception):
+    """
+    La consulta no se pudo completar (tras los reintentos, si correspondía).
+    """
+
+
+class LimitadorTasa:
+    """
+    Cubeta de fichas: como mucho `tasa` consultas por segundo de media, con
+    ráfagas de hasta `capacidad` consultas.
+    """
+
+    def __init__(self, tasa, capacidad=None):
+        self.tasa = tasa
+        self.capacidad = capacidad or max(1.0, tasa)
+        self._fichas = self.capacidad
+        self._ultimo = time.monotonic()
+        self._candado = None
+
+    async def adquirir(self):
+        if self._candado is None:
+            # Se crea dentro del bucle de eventos que lo usa
+            self._candado = asyncio.Lock()
+        async with self._candado:
+            while True:
+                ahora = time.monotonic()
+                self._fichas = min(self.capacidad, self._fichas + (ahora - self._ultimo) * self.tasa)
+                self._ultimo = ahora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                await asyncio.sleep((1 - self._fichas) / self.tasa)
+
+
+def cuerpo_consulta(factura):
+    """
+    Cuerpo JSON de la consulta para una factura leída de la base.
+    """
+    fecha = factura["fecha_emision"] or ""
+    if len(fecha) == 10:
+        fecha = f"{fecha[8:10]}/{fecha[5:7]}/{fecha[0:4]}"  # SUNAT espera DD/MM/AAAA
+    cuerpo = {
+        "numRuc": factura["ruc_emisor"],
+        "codComp": factura["tipo_comprobante"],
+        "numeroSerie": factura["serie"],
+        "numero": int(factura["numeracion"]) if factura["numeracion"].isdigit() else factura["numeracion"],
+        "fechaEmision": fecha,
+    }
+    if factura["monto_total"] is not None:
+        cuerpo["monto"] = de_centimos(factura["monto_total"])
+    return cuerpo
+
+
+class VerificadorSUNAT:
+    """
+    Verifica muchos comprobantes en SUNAT sin saturar el servicio.
+
+    - Una sola sesión HTTP con conexiones reutilizadas (keep-alive), a lo más
+      `concurrencia` a la vez.
+    - Limitador de tasa compartido por todas las consultas.
+    - Reintentos con espera exponencial y aleatoria ante errores de red,
+      tiempos agotados, 429 y 5xx, respetando Retry-After.
+    - Las respuestas se guardan en la tabla verificaciones_sunat y se
+      reutilizan mientras sigan vigentes (VIGENCIA_POR_ESTADO).
+    - El estado se escribe en facturas.estado_validacion por lotes.
+
+    Args:
+        ruta_db: Archivo de la base de facturas; se abre una conexión propia.
+        url: Plantilla de la URL del servicio; "{ruc}" se reemplaza por `ruc_consultante`.
+        token: Token Bearer para el servicio, si lo requiere.
+        ruc_consultante: RUC de quien consulta (parte de la URL de SUNAT).
+        concurrencia: Consultas simultáneas como máximo.
+        tasa: Consultas por segundo como máximo.
+        reintentos: Reintentos por consulta antes de darla por fallida.
+        espera_base: Segundos de espera antes del primer reintento.
+        espera_maxima: Tope de la espera entre reintentos, también si el
+            servidor pide más con Retry-After.
+        timeout: Segundos máximos por consulta.
+        tamano_lote: Resultados que se acumulan antes de escribirlos en la base.
+    """
+
+    def __init__(self, ruta_db, url=URL_SUNAT, token=None, ruc_consultante="", concurrencia=20, tasa=50.0,
+                 reintentos=4, espera_base=0.5, espera_maxima=60.0, timeout=15.0, tamano_lote=200):
+        self.ruta_db = ruta_db
+        self.url = url
+        self.token = token
+        self.ruc_consultante = ruc_consultante
+        self.concurrencia = concurrencia
+        self.limitador = LimitadorTasa(tasa)
+        self.reintentos = reintentos
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.timeout = timeout
+        self.tamano_lote = tamano_lote
+        self.conn = None
+        self._pendientes = []  # (factura, estado, respuesta) por escribir
+        self.resumen = {}
+
+    # --- Base de datos ---
+
+    def _abrir(self):
+        self.conn = sqlite3.connect(self.ruta_db, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+
+    def leer_facturas(self, reverificar=False, limite=None, tamano_bloque=1000):
+        """
+        Generador de las facturas a verificar, leídas por bloques.
+
+        Por defecto, las que pasaron la validación local y aún no tienen
+        respuesta de SUNAT; con `reverificar`, también las que ya la tienen.
+        """
+        condicion = "estado_validacion = ?"
+        parametros = [ESTADO_VALIDO]
+        if reverificar:
+            condicion = "(estado_validacion = ? OR estado_validacion IN ({}))".format(
+                ", ".join("?" for _ in ESTADOS_CP))
+            parametros += list(ESTADOS_CP.values())
+        query = (f"SELECT id, ruc_emisor, tipo_comprobante, serie, numeracion, fecha_emision, monto_total "
+                 f"FROM facturas WHERE {condicion} AND id > ? ORDER BY id LIMIT ?")
+        ultimo_id, leidas = 0, 0
+        while limite is None or leidas < limite:
+            bloque = tamano_bloque if limite is None else min(tamano_bloque, limite - leidas)
+            filas = self.conn.execute(query, parametros + [ultimo_id, bloque]).fetchall()
+            if not filas:
+                return
+            for fila in filas:
+                yield dict(fila)
+            ultimo_id = filas[-1]["id"]
+            leidas += len(filas)
+
+    def estado_guardado(self, factura):
+        """
+        Estado de la caché si la respuesta guardada sigue vigente; si no, None.
+        """
+        fila = self.conn.execute(
+            "SELECT estado, fecha_consulta FROM verificaciones_sunat "
+            "WHERE ruc_emisor = ? AND tipo_comprobante = ? AND serie = ? AND numeracion = ?",
+            (factura["ruc_emisor"], factura["tipo_comprobante"], factura["serie"], factura["numeracion"])
+        ).fetchone()
+        if fila is None:
+            return None
+        vigencia = VIGENCIA_POR_ESTADO.get(fila["estado"], 0)
+        if vigencia is not None and time.time() - fila["fecha_consulta"] > vigencia:
+            return None
+        return fila["estado"]
+
+    def _anotar(self, factura, estado, respuesta):
+        self._pendientes.append((factura, estado, respuesta))
+        if len(self._pendientes) >= self.tamano_lote:
+            self._volcar()
+
+    def _volcar(self):
+        if not self._pendientes:
+            return
+        ahora = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE facturas SET estado_validacion = ? WHERE id = ?",
+                [(estado, factura["id"]) for factura, estado, _ in self._pendientes])
+            # Solo las respuestas nuevas van a la caché; las que vienen de ella ya están
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO verificaciones_sunat "
+                "(ruc_emisor, tipo_comprobante, serie, numeracion, estado, respuesta, fecha_consulta) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(f["ruc_emisor"], f["tipo_comprobante"], f["serie"], f["numeracion"], estado,
+                  json.dumps(respuesta, ensure_ascii=False), ahora)
+                 for f, estado, respuesta in self._pendientes if respuesta is not None])
+        self._pendientes.clear()
+
+    # --- HTTP ---
+
+    async def consultar(self, sesion, factura):
+        """
+        Consulta un comprobante, con reintentos.
+
+        Returns:
+            tuple: (estado, datos de la respuesta).
+
+        Raises:
+            ErrorConsulta: Si la consulta falla de forma definitiva o se agotan los reintentos.
+        """
+        url = self.url.format(ruc=self.ruc_consultante or factura["ruc_emisor"])
+        cuerpo = cuerpo_consulta(factura)
+        ultimo_error = None
+        for intento in range(self.reintentos + 1):
+            if intento:
+                espera = self.espera_base * 2 ** (intento - 1) * (0.5 + random.random())
+                if isinstance(ultimo_error, ErrorConsulta) and ultimo_error.args[1:]:
+                    espera = max(espera, ultimo_error.args[1])  # Retry-After
+                await asyncio.sleep(min(espera, self.espera_maxima))
+            await self.limitador.adquirir()
+            try:
+                async with sesion.post(url, json=cuerpo) as respuesta:
+                    if respuesta.status in ESTADOS_HTTP_REINTENTABLES:
+                        reintentar_en = respuesta.headers.get("Retry-After", "")
+                        ultimo_error = ErrorConsulta(f"HTTP {respuesta.status}",
+                                                     *([float(reintentar_en)] if reintentar_en.isdigit() else []))
+                        self.resumen["reintentos"] += 1
+                        continue
+                    if respuesta.status >= 400:
+                        raise ErrorConsulta(f"HTTP {respuesta.status}: {(await respuesta.text())[:200]}")
+                    datos = await respuesta.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                ultimo_error = e
+                self.resumen["reintentos"] += 1
+                continue
+            except ValueError:
+                # Un 200 que no es JSON suele ser una página de mantenimiento: se reintenta
+                ultimo_error = ErrorConsulta("La respuesta no es JSON")
+                self.resumen["reintentos"] += 1
+                continue
+            if not isinstance(datos, dict) or not isinstance(datos.get("data") or {}, dict):
+                raise ErrorConsulta(f"Respuesta con formato inesperado: {str(datos)[:200]}")
+            if not datos.get("success", False):
+                raise ErrorConsulta(datos.get("message") or "Respuesta sin éxito")
+            codigo = str((datos.get("data") or {}).get("estadoCp", ""))
+            if codigo not in ESTADOS_CP:
+                raise ErrorConsulta(f"estadoCp desconocido: {codigo!r}")
+            return ESTADOS_CP[codigo], datos["data"]
+        raise ErrorConsulta(f"Sin respuesta tras {self.reintentos + 1} intentos: {ultimo_error}")
+
+    async def _trabajador(self, sesion, cola, progreso):
+        while True:
+            factura = await cola.get()
+            if factura is None:
+                return
+            try:
+                estado, datos = await self.consultar(sesion, factura)
+                self._anotar(factura, estado, datos)
+                self.resumen["consultadas"] += 1
+                self.resumen["por_estado"][estado] = self.resumen["por_estado"].get(estado, 0) + 1
+            except ErrorConsulta as e:
+                self.resumen["errores"] += 1
+                if len(self.resumen["ultimos_errores"]) < 20:
+                    self.resumen["ultimos_errores"].append({"id": factura["id"], "error": str(e)})
+            if progreso:
+                progreso(self.resumen)
+
+    async def verificar(self, reverificar=False, limite=None, progreso=None):
+        """
+        Verifica las facturas pendientes y escribe su estado.
+
+        Las facturas se leen de la base a medida que los trabajadores las
+        piden (la cola es acotada), así la memoria no crece con la tabla.
+
+        Args:
+            reverificar: Incluir facturas que ya tienen estado de SUNAT.
+            limite: Máximo de facturas a verificar.
+            progreso: Función llamada con el resumen tras cada factura.
+
+        Returns:
+            dict: Resumen con desde_cache, consultadas, errores, reintentos,
+            por_estado, ultimos_errores y segundos.
+        """
+        inicio = time.perf_counter()
+        self.resumen = {"desde_cache": 0, "consultadas": 0, "errores": 0, "reintentos": 0,
+                        "por_estado": {}, "ultimos_errores": []}
+        self._abrir()
+        cabeceras = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        conector = aiohttp.TCPConnector(limit=self.concurrencia, keepalive_timeout=30)
+        tiempo = aiohttp.ClientTimeout(total=self.timeout)
+        try:
+            async with aiohttp.ClientSession(connector=conector, timeout=tiempo, headers=cabeceras) as sesion:
+                cola = asyncio.Queue(maxsize=self.concurrencia * 4)
+                trabajadores = [asyncio.create_task(self._trabajador(sesion, cola, progreso))
+                                for _ in range(self.concurrencia)]
+                try:
+                    for factura in self.leer_facturas(reverificar, limite):
+                        estado = self.estado_guardado(factura)
+                        if estado is not None:
+                            self._anotar(factura, estado, None)
+                            self.resumen["desde_cache"] += 1
+                            self.resumen["por_estado"][estado] = self.resumen["por_estado"].get(estado, 0) + 1
+                            continue
+                        await cola.put(factura)
+                    for _ in trabajadores:
+                        await cola.put(None)
+                    await asyncio.gather(*trabajadores)
+                finally:
+                    for trabajador in trabajadores:
+                        trabajador.cancel()
+        finally:
+            self._volcar()
+            self.conn.close()
+        self.resumen["segundos"] = round(time.perf_counter() - inicio, 3)
+        return self.resumen
+
+
+def verificar_facturas(ruta_db, reverificar=False, limite=None, progreso=None, **opciones):
+    """
+    Versión síncrona de VerificadorSUNAT.verificar, para la línea de comandos o un hilo.
+    """
+    return asyncio.run(VerificadorSUNAT(ruta_db, **opciones).verificar(reverificar, limite, progreso))
+
+
+def main(argv=None):
+    from oscar14_backend import FacturaDatabase
+
+    parser = argparse.ArgumentParser(description="Verifica en SUNAT el estado de los comprobantes guardados.")
+    parser.add_argument("--url", default=os.environ.get("SUNAT_URL", URL_SUNAT),
+                        help="URL del servicio; {ruc} se reemplaza por el RUC consultante")
+    parser.add_argument("--token", default=os.environ.get("SUNAT_TOKEN"), help="Token Bearer (o SUNAT_TOKEN)")
+    parser.add_argument("--ruc", default=os.environ.get("SUNAT_RUC", ""), help="RUC consultante (o SUNAT_RUC)")
+    parser.add_argument("--concurrencia", type=int, default=20, help="Consultas simultáneas")
+    parser.add_argument("--tasa", type=float, default=50.0, help="Consultas por segundo como máximo")
+    parser.add_argument("--limite", type=int, default=None, help="Verificar como mucho estas facturas")
+    parser.add_argument("--reverificar", action="store_true", help="Incluir las que ya tienen estado de SUNAT")
+    args = parser.parse_args(argv)
+
+    def mostrar_progreso(resumen):
+        hechas = resumen["consultadas"] + resumen["errores"]
+        print(f"\r{hechas} consultadas, {resumen['errores']} errores", end="", file=sys.stderr, flush=True)
+
+    # Abrir la base aplica las migraciones (crea la tabla de caché) antes de la conexión propia
+    db = FacturaDatabase()
+    db.cerrar_conexion()
+
+    resumen = verificar_facturas(db.db_path, args.reverificar, args.limite, mostrar_progreso, url=args.url,
+                                 token=args.token, ruc_consultante=args.ruc,
+                                 concurrencia=args.concurrencia, tasa=args.tasa)
+    print(file=sys.stderr)
+    print(json.dumps(resumen, ensure_ascii=False, indent=2))
+    return 1 if resumen["errores"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,336 @@
+# oscar14_validacion.py
+"""
+Validación de facturas por reglas locales, sin consultar a SUNAT.
+
+Uso:
+    python oscar14_validacion.py [--todo] [--bloque 50000]
+"""
+import argparse
+import contextlib
+import re
+import sqlite3
+import sys
+import time
+from datetime import date
+
+import numpy as np
+
+# Se sube al cambiar cualquier regla: las facturas validadas con una versión
+# anterior se vuelven a validar
+VERSION_REGLAS = 1
+
+ESTADO_VALIDO = "VALIDO"
+ESTADO_OBSERVADO = "OBSERVADO"
+# Estados que pone esta validación; cualquier otro (por ejemplo, la respuesta
+# de SUNAT) no se sobrescribe
+ESTADOS_LOCALES = ("", ESTADO_VALIDO, ESTADO_OBSERVADO)
+# Estados que pone la consulta a SUNAT (ver ESTADOS_CP en oscar14_sunat)
+ESTADOS_SUNAT = ("ACEPTADO", "ANULADO", "AUTORIZADO", "NO AUTORIZADO", "NO EXISTE")
+
+PREFIJOS_RUC = [10, 15, 16, 17, 20]
+PESOS_RUC = np.array([5, 4, 3, 2, 7, 6, 5, 4, 3, 2])
+
+# Formato de la serie según el tipo de comprobante: electrónica (F/B + 3),
+# emitida desde SEE-SOL (E001, EB01) o física (4 dígitos)
+PATRONES_SERIE = {
+    "01": re.compile(r"^(F[A-Z0-9]{3}|E001|\d{4})$"),
+    "03": re.compile(r"^(B[A-Z0-9]{3}|EB01|\d{4})$"),
+    "07": re.compile(r"^([FB][A-Z0-9]{3}|E001|EB01|\d{4})$"),
+    "08": re.compile(r"^([FB][A-Z0-9]{3}|E001|EB01|\d{4})$"),
+}
+
+FECHA_MINIMA = np.datetime64("2000-01-01")
+
+TASA_IGV = 0.18
+TOLERANCIA_CENTIMOS = 10
+TOLERANCIA_RELATIVA = 0.005
+
+# Columnas que necesita la validación, en el orden en que se leen de la base
+COLUMNAS_VALIDACION = [
+    "ruc_emisor", "tipo_comprobante", "serie", "numeracion", "monto_total", "fecha_emision",
+    "monto_igv", "ruc_adquiriente", "valor_venta_gravada", "valor_venta_inafecta", "valor_venta_exonerada",
+]
+
+
+def _codigos(valores, ancho):
+    """
+    Matriz (n, ancho) con los puntos de código de cada texto, rellena con ceros.
+
+    Los textos más largos se cortan en `ancho`, así que para medir longitudes
+    de hasta N caracteres se usa un ancho de N + 1.
+    """
+    textos = np.array(["" if valor is None else str(valor).strip() for valor in valores], dtype=f"U{ancho}")
+    return textos.view(np.uint32).reshape(len(textos), ancho).astype(np.int64)
+
+
+def _solo_digitos(codigos):
+    """
+    Longitud de cada texto y si está formado solo por dígitos ASCII.
+    """
+    usados = codigos != 0
+    longitudes = usados.sum(axis=1)
+    digitos = (codigos >= 48) & (codigos <= 57)
+    return longitudes, (digitos | ~usados).all(axis=1) & (longitudes > 0)
+
+
+def ruc_valido(rucs):
+    """
+    Comprueba a la vez muchos RUC: 11 dígitos, prefijo válido y dígito
+    verificador módulo 11.
+
+    Returns:
+        numpy.ndarray: Arreglo booleano, True para los RUC válidos.
+    """
+    codigos = _codigos(rucs, 12)
+    longitudes, numericos = _solo_digitos(codigos)
+    candidatos = (longitudes == 11) & numericos
+    digitos = np.where(candidatos[:, None], codigos[:, :11] - 48, 0)
+    resto = 11 - (digitos[:, :10] * PESOS_RUC).sum(axis=1) % 11
+    verificador = np.where(resto == 10, 0, np.where(resto == 11, 1, resto))
+    prefijo_valido = np.isin(digitos[:, 0] * 10 + digitos[:, 1], PREFIJOS_RUC)
+    return candidatos & prefijo_valido & (verificador == digitos[:, 10])
+
+
+def documento_adquiriente_valido(documentos):
+    """
+    El adquiriente puede faltar (boletas), ser un DNI de 8 dígitos o un RUC válido.
+    """
+    codigos = _codigos(documentos, 12)
+    longitudes, numericos = _solo_digitos(codigos)
+    return (longitudes == 0) | ((longitudes == 8) & numericos) | ruc_valido(documentos)
+
+
+def numeracion_valida(numeraciones):
+    """
+    La numeración es de 1 a 8 dígitos.
+    """
+    longitudes, numericos = _solo_digitos(_codigos(numeraciones, 9))
+    return numericos & (longitudes <= 8)
+
+
+def serie_valida(tipos, series):
+    """
+    Comprueba el tipo de comprobante y el formato de su serie.
+
+    Las combinaciones (tipo, serie) se repiten mucho, así que la expresión
+    regular se evalúa solo una vez por combinación distinta.
+
+    Returns:
+        tuple: (tipo válido, serie válida) como arreglos booleanos.
+    """
+    claves = np.array([f"{tipo or ''}|{serie or ''}" for tipo, serie in zip(tipos, series)], dtype=object)
+    if not len(claves):
+        return np.zeros(0, dtype=bool), np.zeros(0, dtype=bool)
+    unicas, inversa = np.unique(claves, return_inverse=True)
+    tipo_ok = np.empty(len(unicas), dtype=bool)
+    serie_ok = np.empty(len(unicas), dtype=bool)
+    for i, clave in enumerate(unicas):
+        tipo, _, serie = clave.partition("|")
+        patron = PATRONES_SERIE.get(tipo)
+        tipo_ok[i] = patron is not None
+        serie_ok[i] = patron is not None and patron.match(serie) is not None
+    return tipo_ok[inversa], serie_ok[inversa]
+
+
+def fecha_valida(fechas, hoy=None):
+    """
+    La fecha de emisión existe, no es anterior a FECHA_MINIMA ni posterior a hoy.
+
+    Args:
+        fechas: Fechas ISO ("AAAA-MM-DD") o None, como se guardan en la base.
+    """
+    hoy = np.datetime64(hoy or date.today())
+    try:
+        dias = np.array([fecha or "NaT" for fecha in fechas], dtype="datetime64[D]")
+    except ValueError:
+        # Alguna fecha no es ISO: se convierten una a una
+        dias = np.array([_a_dia(fecha) for fecha in fechas], dtype="datetime64[D]")
+    return ~np.isnat(dias) & (dias >= FECHA_MINIMA) & (dias <= hoy)
+
+
+def _a_dia(fecha):
+    try:
+        return np.datetime64(fecha or "NaT", "D")
+    except ValueError:
+        return np.datetime64("NaT")
+
+
+def igv_inconsistente(gravada, igv, tasa=TASA_IGV, tolerancia=TOLERANCIA_CENTIMOS,
+                      tolerancia_relativa=TOLERANCIA_RELATIVA):
+    """
+    True donde el IGV se aparta de `tasa` por la venta gravada.
+
+    Los montos son arreglos float en céntimos con NaN donde faltan; sin
+    alguno de los dos no se puede comprobar y se da por bueno. Se admite una
+    diferencia de `tolerancia` céntimos o de `tolerancia_relativa` del monto,
+    la que sea mayor, por los redondeos.
+    """
+    esperado = gravada * tasa
+    margen = np.maximum(tolerancia, tolerancia_relativa * np.abs(esperado))
+    with np.errstate(invalid="ignore"):
+        return ~np.isnan(gravada) & ~np.isnan(igv) & (np.abs(igv - esperado) > margen)
+
+
+def total_inconsistente(total, gravada, inafecta, exonerada, igv, tolerancia=TOLERANCIA_CENTIMOS,
+                        tolerancia_relativa=TOLERANCIA_RELATIVA):
+    """
+    True donde el total no es la suma de gravada, inafecta, exonerada e IGV.
+
+    Hace falta el total y al menos uno de los valores de venta; los
+    componentes que faltan cuentan como cero.
+    """
+    ventas = np.stack([gravada, inafecta, exonerada])
+    comprobable = ~np.isnan(total) & ~np.isnan(ventas).all(axis=0)
+    suma = np.nansum(ventas, axis=0) + np.nan_to_num(igv)
+    margen = np.maximum(tolerancia, tolerancia_relativa * np.abs(total))
+    with np.errstate(invalid="ignore"):
+        return comprobable & (np.abs(total - suma) > margen)
+
+
+def validar_columnas(columnas, hoy=None):
+    """
+    Aplica todas las reglas a un bloque de facturas.
+
+    Args:
+        columnas: Diccionario columna -> secuencia de valores como se guardan
+            en la base (montos en céntimos o None, fechas ISO o None), con las
+            columnas de COLUMNAS_VALIDACION.
+        hoy: Fecha de referencia para las fechas futuras; por defecto, hoy.
+
+    Returns:
+        list: Observaciones de cada factura: los nombres de las reglas que no
+        cumple separados por comas, o "" si las cumple todas.
+    """
+    def montos(columna):
+        return np.array(columnas[columna], dtype=np.float64)  # None -> NaN
+
+    total = montos("monto_total")
+    gravada = montos("valor_venta_gravada")
+    igv = montos("monto_igv")
+    tipo_ok, serie_ok = serie_valida(columnas["tipo_comprobante"], columnas["serie"])
+    with np.errstate(invalid="ignore"):
+        total_ok = total > 0
+    fallos = {
+        "ruc_emisor": ~ruc_valido(columnas["ruc_emisor"]),
+        "ruc_adquiriente": ~documento_adquiriente_valido(columnas["ruc_adquiriente"]),
+        "tipo_comprobante": ~tipo_ok,
+        "serie": tipo_ok & ~serie_ok,
+        "numeracion": ~numeracion_valida(columnas["numeracion"]),
+        "fecha_emision": ~fecha_valida(columnas["fecha_emision"], hoy),
+        "monto_total": ~total_ok,
+        "igv": igv_inconsistente(gravada, igv),
+        "total_componentes": total_inconsistente(total, gravada, montos("valor_venta_inafecta"),
+                                                 montos("valor_venta_exonerada"), igv),
+    }
+    nombres = list(fallos)
+    matriz = np.stack([fallos[nombre] for nombre in nombres])
+    observaciones = [""] * len(total)
+    # Solo se arma el texto de las facturas con algún fallo
+    for fila in np.flatnonzero(matriz.any(axis=0)):
+        observaciones[fila] = ",".join(nombre for nombre, falla in zip(nombres, matriz[:, fila]) if falla)
+    return observaciones
+
+
+def estado_para(observaciones):
+    return ESTADO_OBSERVADO if observaciones else ESTADO_VALIDO
+
+
+def revalidar(conn, todo=False, tamano_bloque=50000, progreso=None, cancelado=None, lectura=None, candado=None):
+    """
+    Valida las facturas pendientes (o todas) por bloques y guarda el resultado.
+
+    Recorre la tabla por id y valida cada bloque de forma vectorizada. Solo
+    se reescriben las facturas cuyo resultado cambió; la versión de las
+    reglas del bloque se actualiza con un único UPDATE por rango de id. Cada
+    bloque se confirma en su propia transacción para no bloquear a otros
+    escritores más que un momento. El estado solo se cambia si es uno de
+    ESTADOS_LOCALES, así no se pisa la respuesta de SUNAT.
+
+    Args:
+        conn: Conexión de escritura.
+        todo: Validar también las facturas ya validadas con la versión actual.
+        tamano_bloque: Facturas por bloque.
+        progreso: Función llamada con (facturas validadas, observadas) tras cada bloque.
+        cancelado: Función sin argumentos que devuelve True para detener.
+        lectura: Conexión para leer los bloques; por defecto `conn`.
+        candado: Candado que se toma mientras se escribe cada bloque, si la
+            conexión de escritura se comparte con otros hilos.
+
+    Returns:
+        dict: {"validadas": int, "observadas": int, "cambiadas": int}
+    """
+    condicion = "1" if todo else "(version_validacion IS NULL OR version_validacion < ?)"
+    parametros = [] if todo else [VERSION_REGLAS]
+    query = (f"SELECT id, estado_validacion, observaciones_validacion, {', '.join(COLUMNAS_VALIDACION)} "
+             f"FROM facturas WHERE id > ? AND {condicion} ORDER BY id LIMIT ?")
+    # El estado se vuelve a comprobar al escribir: SUNAT pudo cambiarlo después de leer el bloque
+    locales = ", ".join(f"'{estado}'" for estado in ESTADOS_LOCALES)
+    actualizacion = (f"UPDATE facturas SET observaciones_validacion = ?, estado_validacion = "
+                     f"CASE WHEN IFNULL(estado_validacion, '') IN ({locales}) THEN ? ELSE estado_validacion END "
+                     f"WHERE id = ?")
+    actualizacion_version = (f"UPDATE facturas SET version_validacion = ? WHERE id > ? AND id <= ? "
+                             f"AND version_validacion IS NOT ? AND {condicion}")
+    lectura = lectura or conn
+    candado = candado or contextlib.nullcontext()
+    resultado = {"validadas": 0, "observadas": 0, "cambiadas": 0}
+    ultimo_id = 0
+    while not (cancelado and cancelado()):
+        filas = lectura.execute(query, [ultimo_id] + parametros + [tamano_bloque]).fetchall()
+        if not filas:
+            break
+        ids, estados, anteriores, *valores = zip(*filas)
+        observaciones = validar_columnas(dict(zip(COLUMNAS_VALIDACION, valores)))
+        cambios = []
+        for id_factura, estado, anterior, observacion in zip(ids, estados, anteriores, observaciones):
+            nuevo_estado = estado_para(observacion) if (estado or "") in ESTADOS_LOCALES else estado
+            if observacion != anterior or nuevo_estado != estado:
+                cambios.append((observacion, nuevo_estado, id_factura))
+        with candado, conn:
+            conn.executemany(actualizacion, cambios)
+            conn.execute(actualizacion_version, [VERSION_REGLAS, ultimo_id, ids[-1], VERSION_REGLAS] + parametros)
+        ultimo_id = ids[-1]
+        resultado["validadas"] += len(ids)
+        resultado["observadas"] += sum(1 for observacion in observaciones if observacion)
+        resultado["cambiadas"] += len(cambios)
+        if progreso:
+            progreso(resultado["validadas"], resultado["observadas"])
+    return resultado
+
+
+def hay_pendientes(conn):
+    """
+    True si alguna factura no se validó con la versión actual de las reglas.
+    """
+    return conn.execute(
+        "SELECT 1 FROM facturas WHERE version_validacion IS NULL OR version_validacion < ? LIMIT 1",
+        (VERSION_REGLAS,)
+    ).fetchone() is not None
+
+
+def main(argv=None):
+    from oscar14_backend import FacturaDatabase
+
+    parser = argparse.ArgumentParser(description="Valida las facturas guardadas con las reglas locales.")
+    parser.add_argument("--todo", action="store_true", help="Validar también las ya validadas con estas reglas")
+    parser.add_argument("--bloque", type=int, default=50000, help="Facturas por bloque")
+    args = parser.parse_args(argv)
+
+    db = FacturaDatabase()
+    inicio = time.perf_counter()
+    try:
+        resultado = revalidar(db.conn, args.todo, args.bloque,
+                              lambda hechas, _: print(f"\r{hechas} facturas", end="", file=sys.stderr, flush=True))
+    except sqlite3.Error as e:
+        print(f"Error al validar las facturas: {e}")
+        return 1
+    finally:
+        db.cerrar_conexion()
+    print(file=sys.stderr)
+    print(f"Validadas: {resultado['validadas']}, observadas: {resultado['observadas']}, "
+          f"con resultado distinto al anterior: {resultado['cambiadas']}, "
+          f"en {time.perf_counter() - inicio:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,247 @@
 # oscar14_visualizacion_bd.py
 import os
-import openpyxl
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QPushButton, QTableWidget, QTableWidgetItem, QHeaderView, QFileDialog, QMessageBox
-from PyQt5.QtCore import Qt
+import sqlite3
+import time
+from collections import OrderedDict
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QTableView, QHeaderView, QFileDialog, QMessageBox, QProgressBar, QComboBox
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QThread, QTimer, pyqtSignal
+from oscar14_backend import COLUMNAS_FACTURA
+from oscar14_exportacion import exportar, ExportacionCancelada
+from oscar14_validacion import revalidar, hay_pendientes, ESTADO_VALIDO, ESTADO_OBSERVADO, ESTADOS_SUNAT
+from oscar14_metricas import METRICAS
+
+ENCABEZADOS = [
+    "RUC Emisor", "Tipo Comprobante", "Serie", "Numeración", "Monto Total",
+    "Fecha Emisión", "Monto IGV", "RUC Adquiriente", "Razón Social Emisor",
+    "Razón Social Adquiriente", "Valor Venta Gravada", "Valor Venta Inafecta",
+    "Valor Venta Exonerada", "Código Hash", "Domicilio Emisor", "Domicilio Adquiriente",
+    "Fecha Registro", "Estado Validación", "Observaciones Validación"
+]
+
+
+class ModeloFacturas(QAbstractTableModel):
+    """
+    Modelo de tabla que lee las facturas directamente de la base de datos.
+
+    Las filas se cargan por páginas a medida que la vista las pide
+    (canFetchMore/fetchMore) usando paginación por clave, y solo se mantienen
+    en memoria las últimas `max_paginas` páginas usadas; una página expulsada
+    se vuelve a leer desde su cursor. El orden y los filtros se resuelven en SQL.
+
+    Con una búsqueda de texto y sin ordenar por una columna, las facturas se
+    muestran por relevancia; esas páginas se piden por desplazamiento porque
+    la relevancia no es una columna sobre la que avanzar con un cursor. Si se
+    ordena por una columna, la búsqueda pasa a ser un filtro más.
+    """
+
+    def __init__(self, db, tamano_pagina=200, max_paginas=50, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.tamano_pagina = tamano_pagina
+        self.max_paginas = max_paginas
+        self.orden = "id"
+        self.descendente = False
+        self.filtros = {}
+        self.busqueda = ""
+        self._reiniciar_estado()
+
+    def _reiniciar_estado(self):
+        self._anclas = [None]  # cursor keyset con el que empieza cada página
+        self._paginas = OrderedDict()  # índice de página -> filas (caché LRU)
+        self._filas = 0
+        self._hay_mas = True
+
+    def recargar(self):
+        """
+        Descarta las filas cargadas y vuelve a leer la primera página.
+        """
+        self.beginResetModel()
+        self._reiniciar_estado()
+        self.endResetModel()
+        if self.canFetchMore(QModelIndex()):
+            self.fetchMore(QModelIndex())
+
+    def establecer_filtros(self, **filtros):
+        """
+        Aplica filtros de `FacturaDatabase.construir_filtros` y recarga el modelo.
+        Los filtros en None se ignoran.
+
+        Raises:
+            ValueError: Si una fecha o un monto no se reconoce; los filtros
+                anteriores siguen aplicados.
+        """
+        filtros = {clave: valor for clave, valor in filtros.items() if valor is not None}
+        self.db.construir_filtros(**filtros)
+        self.filtros = filtros
+        self.recargar()
+
+    def establecer_busqueda(self, texto):
+        """
+        Busca el texto en razones sociales y domicilios y recarga el modelo.
+        """
+        self.busqueda = texto.strip()
+        self.recargar()
+
+    def por_relevancia(self):
+        return bool(self.busqueda) and self.orden == "id"
+
+    def filtros_consulta(self):
+        """
+        Filtros actuales con la búsqueda de texto incluida, para contar o exportar.
+        """
+        return dict(self.filtros, texto=self.busqueda) if self.busqueda else dict(self.filtros)
+
+    def _leer_pagina(self, numero):
+        if self.por_relevancia():
+            desplazamiento = self._anclas[numero] or 0
+            with METRICAS.medir("bd.pagina_busqueda"):
+                facturas = self.db.buscar_texto(self.busqueda, self.tamano_pagina, desplazamiento, **self.filtros)
+            siguiente = desplazamiento + len(facturas) if len(facturas) == self.tamano_pagina else None
+        else:
+            with METRICAS.medir("bd.pagina"):
+                facturas, siguiente = self.db.obtener_pagina(
+                    self.tamano_pagina, self._anclas[numero], self.orden, self.descendente, **self.filtros_consulta()
+                )
+        filas = [
+            tuple("" if factura[columna] is None else str(factura[columna]) for columna in COLUMNAS_FACTURA)
+            for factura in facturas
+        ]
+        return filas, siguiente
+
+    def _guardar_pagina(self, numero, filas):
+        self._paginas[numero] = filas
+        self._paginas.move_to_end(numero)
+        while len(self._paginas) > self.max_paginas:
+            self._paginas.popitem(last=False)
+
+    def _pagina(self, numero):
+        if numero in self._paginas:
+            self._paginas.move_to_end(numero)
+            return self._paginas[numero]
+        filas, _ = self._leer_pagina(numero)
+        self._guardar_pagina(numero, filas)
+        return filas
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._filas
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNAS_FACTURA)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        numero, posicion = divmod(index.row(), self.tamano_pagina)
+        filas = self._pagina(numero)
+        if posicion >= len(filas):
+            return None
+        return filas[posicion][index.column()]
+
+    def headerData(self, seccion, orientacion, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientacion == Qt.Horizontal:
+            return ENCABEZADOS[seccion]
+        return str(seccion + 1)
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and self._hay_mas
+
+    def fetchMore(self, parent):
+        if parent.isValid() or not self._hay_mas:
+            return
+        numero = len(self._anclas) - 1
+        filas, siguiente = self._leer_pagina(numero)
+        if siguiente is None:
+            self._hay_mas = False
+        else:
+            self._anclas.append(siguiente)
+        if not filas:
+            return
+        self.beginInsertRows(QModelIndex(), self._filas, self._filas + len(filas) - 1)
+        self._guardar_pagina(numero, filas)
+        self._filas += len(filas)
+        self.endInsertRows()
+
+    def sort(self, columna, orden=Qt.AscendingOrder):
+        self.orden = COLUMNAS_FACTURA[columna] if columna >= 0 else "id"
+        self.descendente = orden == Qt.DescendingOrder
+        self.recargar()
+
+
+class HiloExportacion(QThread):
+    """
+    Exporta facturas en segundo plano leyendo directamente del cursor de la base de datos.
+
+    Usa su propia conexión de solo lectura, ya que la del hilo principal no
+    puede compartirse entre hilos.
+    """
+    progreso = pyqtSignal(int)  # porcentaje
+    terminado = pyqtSignal(str, int)  # ruta, filas exportadas
+    error = pyqtSignal(str)
+    cancelado = pyqtSignal()
+
+    def __init__(self, db, ruta, formato, orden="id", descendente=False, filtros=None, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.ruta = ruta
+        self.formato = formato
+        self.orden = orden
+        self.descendente = descendente
+        self.filtros = filtros or {}
+
+    def run(self):
+        facturas = None
+        try:
+            # Las consultas usan la conexión de lectura de este hilo
+            total = max(self.db.contar_facturas(**self.filtros), 1)
+            facturas = self.db.iterar_facturas(self.orden, self.descendente, **self.filtros)
+            filas = ([factura[columna] for columna in COLUMNAS_FACTURA] for factura in facturas)
+            exportadas = exportar(
+                filas, ENCABEZADOS, self.ruta, self.formato,
+                progreso=lambda n: self.progreso.emit(min(100, n * 100 // total)),
+                cancelado=self.isInterruptionRequested,
+            )
+            self.terminado.emit(self.ruta, exportadas)
+        except ExportacionCancelada:
+            self.cancelado.emit()
+        except Exception as e:
+            self.error.emit(str(e))
+        finally:
+            # Cerrar el cursor antes que la conexión del hilo
+            if facturas is not None:
+                facturas.close()
+            self.db.cerrar_lectura()
+
+
+class HiloValidacion(QThread):
+    """
+    Valida las facturas con las reglas locales en segundo plano.
+
+    Lee con la conexión de lectura del hilo y confirma cada bloque por
+    separado con la de escritura, así el escaneo puede seguir guardando
+    facturas entre bloque y bloque.
+    """
+    progreso = pyqtSignal(int, int)  # validadas, observadas
+    terminado = pyqtSignal(dict)
+    error = pyqtSignal(str)
+
+    def __init__(self, db, todo=False, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.todo = todo
+
+    def run(self):
+        try:
+            resultado = revalidar(self.db.conn, self.todo, progreso=self.progreso.emit,
+                                  cancelado=self.isInterruptionRequested, lectura=self.db.lectura,
+                                  candado=self.db.gestor.candado_escritura)
+            self.terminado.emit(resultado)
+        except Exception as e:
+            self.error.emit(str(e))
+        finally:
+            self.db.cerrar_lectura()
+
 
 class VentanaVisualizacionDB(QWidget):
 
@@ -17,17 +256,51 @@ class VentanaVisualizacionDB(QWidget):
         # Layout principal
         self.layout = QVBoxLayout(self)
 
-        # Tabla para visualizar los datos
-        self.tabla_facturas = QTableWidget()
-        self.tabla_facturas.setColumnCount(18)  # Número de columnas en la base de datos
-        self.tabla_facturas.setHorizontalHeaderLabels([
-            "RUC Emisor", "Tipo Comprobante", "Serie", "Numeración", "Monto Total", 
-            "Fecha Emisión", "Monto IGV", "RUC Adquiriente", "Razón Social Emisor",
-            "Razón Social Adquiriente", "Valor Venta Gravada", "Valor Venta Inafecta",
-            "Valor Venta Exonerada", "Código Hash", "Domicilio Emisor", "Domicilio Adquiriente", 
-            "Fecha Registro", "Estado Validación"
-        ])
+        # Filtros, aplicados en la consulta SQL
+        self.layout_filtros = QHBoxLayout()
+        self.filtros = {}
+        for clave, etiqueta in [("ruc", "RUC"), ("fecha_desde", "Fecha desde"), ("fecha_hasta", "Fecha hasta"),
+                                ("monto_min", "Monto mínimo"), ("monto_max", "Monto máximo")]:
+            campo = QLineEdit()
+            campo.setPlaceholderText(etiqueta)
+            campo.returnPressed.connect(self.aplicar_filtros)
+            self.layout_filtros.addWidget(campo)
+            self.filtros[clave] = campo
+        # El estado se elige de una lista: "" son las facturas aún no validadas
+        self.combo_estado = QComboBox()
+        self.combo_estado.addItem("Todos los estados", None)
+        self.combo_estado.addItem("Pendiente", "")
+        for estado in (ESTADO_VALIDO, ESTADO_OBSERVADO) + ESTADOS_SUNAT:
+            self.combo_estado.addItem(estado, estado)
+        self.combo_estado.activated.connect(self.aplicar_filtros)
+        self.layout_filtros.addWidget(self.combo_estado)
+        self.btn_filtrar = QPushButton("Filtrar")
+        self.btn_filtrar.clicked.connect(self.aplicar_filtros)
+        self.layout_filtros.addWidget(self.btn_filtrar)
+        self.layout.addLayout(self.layout_filtros)
+
+        # Búsqueda de texto en razones sociales y domicilios, mientras se escribe
+        self.layout_busqueda = QHBoxLayout()
+        self.campo_busqueda = QLineEdit()
+        self.campo_busqueda.setPlaceholderText("Buscar por razón social o domicilio")
+        self.campo_busqueda.textChanged.connect(lambda: self.temporizador_busqueda.start())
+        self.campo_busqueda.returnPressed.connect(self.buscar)
+        self.layout_busqueda.addWidget(self.campo_busqueda)
+        self.label_busqueda = QLabel("")
+        self.layout_busqueda.addWidget(self.label_busqueda)
+        self.layout.addLayout(self.layout_busqueda)
+        self.temporizador_busqueda = QTimer(self)
+        self.temporizador_busqueda.setSingleShot(True)
+        self.temporizador_busqueda.setInterval(250)
+        self.temporizador_busqueda.timeout.connect(self.buscar)
+
+        # Tabla para visualizar los datos, con carga perezosa desde la base de datos
+        self.modelo_facturas = ModeloFacturas(self.db)
+        self.tabla_facturas = QTableView()
+        self.tabla_facturas.setModel(self.modelo_facturas)
         self.tabla_facturas.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.tabla_facturas.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.tabla_facturas.setSortingEnabled(True)
         self.layout.addWidget(self.tabla_facturas)
 
         # Botones para cargar y exportar datos
@@ -43,6 +316,32 @@ class VentanaVisualizacionDB(QWidget):
         self.btn_exportar_excel.clicked.connect(self.exportar_a_excel)
         self.layout.addWidget(self.btn_exportar_excel)
 
+        self.btn_exportar_csv = QPushButton("Exportar a CSV")
+        self.btn_exportar_csv.clicked.connect(self.exportar_a_csv)
+        self.layout.addWidget(self.btn_exportar_csv)
+
+        # Progreso de la exportación en segundo plano
+        self.layout_exportacion = QHBoxLayout()
+        self.progress_exportacion = QProgressBar()
+        self.progress_exportacion.setVisible(False)
+        self.layout_exportacion.addWidget(self.progress_exportacion)
+        self.btn_cancelar_exportacion = QPushButton("Cancelar Exportación")
+        self.btn_cancelar_exportacion.setVisible(False)
+        self.btn_cancelar_exportacion.clicked.connect(self.cancelar_exportacion)
+        self.layout_exportacion.addWidget(self.btn_cancelar_exportacion)
+        self.layout.addLayout(self.layout_exportacion)
+        self.hilo_exportacion = None
+
+        # Validación con las reglas locales en segundo plano
+        self.layout_validacion = QHBoxLayout()
+        self.btn_revalidar = QPushButton("Revalidar Facturas")
+        self.btn_revalidar.clicked.connect(lambda: self.iniciar_validacion(todo=True))
+        self.layout_validacion.addWidget(self.btn_revalidar)
+        self.label_validacion = QLabel("")
+        self.layout_validacion.addWidget(self.label_validacion)
+        self.layout.addLayout(self.layout_validacion)
+        self.hilo_validacion = None
+
         # Estilos
         self.setStyleSheet("""
             QWidget {
@@ -55,79 +354,148 @@ class VentanaVisualizacionDB(QWidget):
                 font-size: 14px;
                 padding: 5px;
             }
-            QTableWidget {
+            QTableView {
                 background-color: #FFFFFF;
                 color: black;
             }
         """)
 
+    def showEvent(self, event):
+        super().showEvent(event)
+        # Validar lo que quedó pendiente (facturas antiguas o reglas nuevas) al abrir la pestaña
+        if self.hilo_validacion is None:
+            try:
+                pendientes = hay_pendientes(self.db.lectura)
+            except sqlite3.Error as e:
+                print(f"Error al consultar las facturas pendientes de validación: {e}")
+                pendientes = False
+            if pendientes:
+                self.iniciar_validacion(todo=False)
+
+    def iniciar_validacion(self, todo):
+        if self.hilo_validacion is not None:
+            return
+        self.btn_revalidar.setEnabled(False)
+        self.label_validacion.setText("Validando...")
+        self.hilo_validacion = HiloValidacion(self.db, todo, self)
+        self.hilo_validacion.progreso.connect(
+            lambda validadas, observadas: self.label_validacion.setText(
+                f"Validando: {validadas} facturas, {observadas} observadas"))
+        self.hilo_validacion.terminado.connect(self.validacion_terminada)
+        self.hilo_validacion.error.connect(
+            lambda mensaje: self.label_validacion.setText(f"Error al validar: {mensaje}"))
+        self.hilo_validacion.finished.connect(self.terminar_validacion)
+        self.hilo_validacion.start()
+
+    def validacion_terminada(self, resultado):
+        self.label_validacion.setText(
+            f"Validadas: {resultado['validadas']} facturas, {resultado['observadas']} observadas")
+        self.modelo_facturas.recargar()
+
+    def terminar_validacion(self):
+        self.hilo_validacion = None
+        self.btn_revalidar.setEnabled(True)
+
     def cargar_datos(self):
         try:
-            # Obtener datos de la base de datos
-            facturas = self.db.obtener_facturas()
-
-            # Limpiar la tabla
-            self.tabla_facturas.setRowCount(0)
-
-            # Rellenar la tabla con los datos
-            for factura in facturas:
-                fila_actual = self.tabla_facturas.rowCount()
-                self.tabla_facturas.insertRow(fila_actual)
-                for columna, (key, value) in enumerate(factura.items()):
-                    self.tabla_facturas.setItem(fila_actual, columna, QTableWidgetItem(str(value)))
+            self.modelo_facturas.recargar()
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Ocurrió un error al cargar los datos: {e}")
 
-    def exportar_a_txt(self):
+    def aplicar_filtros(self):
         try:
-            # Obtener datos de la tabla
-            facturas = self.obtener_datos_tabla()
-
-            # Seleccionar ruta para guardar el archivo
-            opciones = QFileDialog.Options()
-            archivo, _ = QFileDialog.getSaveFileName(self, "Guardar Archivo TXT", "", "Archivos de Texto (*.txt)", options=opciones)
-            if archivo:
-                with open(archivo, 'w') as f:
-                    for factura in facturas:
-                        f.write(", ".join(f"{key}: {value}" for key, value in factura.items()) + "\n")
-                QMessageBox.information(self, "Éxito", f"Datos exportados a {archivo}")
+            self.modelo_facturas.establecer_filtros(
+                **{clave: campo.text().strip() or None for clave, campo in self.filtros.items()},
+                estado_validacion=self.combo_estado.currentData()
+            )
         except Exception as e:
-            QMessageBox.critical(self, "Error", f"Ocurrió un error al exportar a TXT: {e}")
+            QMessageBox.critical(self, "Error", f"Ocurrió un error al filtrar los datos: {e}")
 
-    def exportar_a_excel(self):
+    def buscar(self):
+        self.temporizador_busqueda.stop()
+        texto = self.campo_busqueda.text().strip()
+        if texto == self.modelo_facturas.busqueda:
+            return
+        if texto and self.modelo_facturas.orden != "id":
+            # Volver al orden por relevancia al empezar una búsqueda (llama a sort con la columna -1)
+            self.tabla_facturas.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        inicio = time.perf_counter()
         try:
-            # Obtener datos de la tabla
-            facturas = self.obtener_datos_tabla()
-
-            # Seleccionar ruta para guardar el archivo
-            opciones = QFileDialog.Options()
-            archivo, _ = QFileDialog.getSaveFileName(self, "Guardar Archivo Excel", "", "Archivos Excel (*.xlsx)", options=opciones)
-            if archivo:
-                wb = openpyxl.Workbook()
-                ws = wb.active
-                ws.title = "Facturas"
-
-                # Escribir encabezados
-                encabezados = facturas[0].keys()
-                ws.append(list(encabezados))
-
-                # Escribir datos
-                for factura in facturas:
-                    ws.append(list(factura.values()))
-
-                wb.save(archivo)
-                QMessageBox.information(self, "Éxito", f"Datos exportados a {archivo}")
+            self.modelo_facturas.establecer_busqueda(texto)
         except Exception as e:
-            QMessageBox.critical(self, "Error", f"Ocurrió un error al exportar a Excel: {e}")
-
-    def obtener_datos_tabla(self):
-        # Recopilar datos de la tabla en una lista de diccionarios
-        facturas = []
-        for fila in range(self.tabla_facturas.rowCount()):
-            factura = {}
-            for columna in range(self.tabla_facturas.columnCount()):
-                encabezado = self.tabla_facturas.horizontalHeaderItem(columna).text()
-                item = self.tabla_facturas.item(fila, columna)
-                factura[encabezado] = item.text() if item else ""
-            facturas.append(factura)
-        return facturas
+            QMessageBox.critical(self, "Error", f"Ocurrió un error al buscar: {e}")
+            return
+        milisegundos = (time.perf_counter() - inicio) * 1000
+        self.label_busqueda.setText(f"{milisegundos:.0f} ms" if texto else "")
+
+    def exportar_a_txt(self):
+        self.iniciar_exportacion("txt", "Guardar Archivo TXT", "Archivos de Texto (*.txt)")
+
+    def exportar_a_excel(self):
+        self.iniciar_exportacion("xlsx", "Guardar Archivo Excel", "Archivos Excel (*.xlsx)")
+
+    def exportar_a_csv(self):
+        self.iniciar_exportacion("csv", "Guardar Archivo CSV", "Archivos CSV (*.csv)")
+
+    def iniciar_exportacion(self, formato, titulo, filtro_archivos):
+        """
+        Exporta en segundo plano las facturas con el orden y los filtros actuales de la tabla.
+        """
+        if self.hilo_exportacion and self.hilo_exportacion.isRunning():
+            QMessageBox.warning(self, "Exportación", "Ya hay una exportación en curso.")
+            return
+
+        # Seleccionar ruta para guardar el archivo
+        opciones = QFileDialog.Options()
+        archivo, _ = QFileDialog.getSaveFileName(self, titulo, "", filtro_archivos, options=opciones)
+        if not archivo:
+            return
+        if not archivo.lower().endswith("." + formato):
+            archivo += "." + formato
+
+        modelo = self.modelo_facturas
+        self.hilo_exportacion = HiloExportacion(self.db, archivo, formato, modelo.orden, modelo.descendente,
+                                                modelo.filtros_consulta(), self)
+        self.hilo_exportacion.progreso.connect(self.progress_exportacion.setValue)
+        self.hilo_exportacion.terminado.connect(self.exportacion_terminada)
+        self.hilo_exportacion.error.connect(self.exportacion_fallida)
+        self.hilo_exportacion.cancelado.connect(self.exportacion_cancelada)
+        self.hilo_exportacion.finished.connect(lambda: self.mostrar_exportacion_en_curso(False))
+        self.mostrar_exportacion_en_curso(True)
+        self.hilo_exportacion.start()
+
+    def cancelar_exportacion(self):
+        if self.hilo_exportacion:
+            self.hilo_exportacion.requestInterruption()
+
+    def mostrar_exportacion_en_curso(self, en_curso):
+        self.progress_exportacion.setValue(0)
+        self.progress_exportacion.setVisible(en_curso)
+        self.btn_cancelar_exportacion.setVisible(en_curso)
+        for boton in (self.btn_exportar_txt, self.btn_exportar_excel, self.btn_exportar_csv):
+            boton.setEnabled(not en_curso)
+
+    def exportacion_terminada(self, archivo, filas):
+        QMessageBox.information(self, "Éxito", f"{filas} facturas exportadas a {archivo}")
+
+    def exportacion_fallida(self, mensaje):
+        QMessageBox.critical(self, "Error", f"Ocurrió un error al exportar: {mensaje}")
+
+    def exportacion_cancelada(self):
+        QMessageBox.information(self, "Exportación", "Exportación cancelada.")
+
+    def cerrar(self):
+        """
+        Cancela la exportación y la validación en curso y espera a que terminen.
+        """
+        self.temporizador_busqueda.stop()
+        if self.hilo_exportacion and self.hilo_exportacion.isRunning():
+            self.hilo_exportacion.requestInterruption()
+            self.hilo_exportacion.wait()
+        if self.hilo_validacion is not None:
+            self.hilo_validacion.requestInterruption()
+            self.hilo_validacion.wait()
+
+    def closeEvent(self, event):
+        self.cerrar()
+        super().closeEvent(event)
@@ -0,0 +1,27 @@
+# test_oscar14_backend.py
+import pytest
+
+from oscar14_backend import FacturaDatabase
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db = FacturaDatabase()
+    yield db
+    db.cerrar_conexion()
+
+
+def test_construir_filtros_convierte_valores(db):
+    condiciones, parametros = db.construir_filtros(fecha_desde="14/09/2024", monto_min="1.180,50",
+                                                   estado_validacion="")
+    assert parametros == ["2024-09-14", 118050]
+    assert "(estado_validacion IS NULL OR estado_validacion = '')" in condiciones
+
+
+@pytest.mark.parametrize("filtro", [
+    {"fecha_desde": "ayer"}, {"fecha_hasta": "31/02/2024"}, {"monto_min": "mil"}, {"monto_max": "S/"},
+])
+def test_construir_filtros_valor_no_valido(db, filtro):
+    with pytest.raises(ValueError):
+        db.construir_filtros(**filtro)
@@ -0,0 +1,37 @@
+# test_oscar14_escritor.py
+import sqlite3
+
+from oscar14_backend import FacturaDatabase
+from oscar14_escritor import EscritorFacturas
+
+
+def _factura(numeracion):
+    return {"ruc_emisor": "20131312955", "tipo_comprobante": "01", "serie": "F001", "numeracion": numeracion}
+
+
+def test_base_bloqueada_no_cuenta_como_rechazada(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db = FacturaDatabase()
+    db.conn.execute("PRAGMA busy_timeout = 50")
+    escritor = EscritorFacturas(db, reintentos=1, espera_reintento=0.01)
+    resultados, errores = [], []
+    escritor.guardado.connect(lambda origen, contexto, resultado: resultados.append((origen, resultado)))
+    escritor.error.connect(errores.append)
+
+    otro = sqlite3.connect(db.gestor.ruta, isolation_level=None)
+    otro.execute("BEGIN IMMEDIATE")
+    try:
+        escritor._escribir([("a", [_factura("1"), {"desconocido": 1}], None), ("b", [_factura("2")], None)])
+    finally:
+        otro.execute("ROLLBACK")
+        otro.close()
+
+    assert resultados == [("a", {"insertadas": 0, "rechazadas": 1, "no_guardadas": 1}),
+                          ("b", {"insertadas": 0, "rechazadas": 0, "no_guardadas": 1})]
+    assert len(errores) == 1
+
+    # Con la base libre el mismo pedido se guarda
+    resultados.clear()
+    escritor._escribir([("a", [_factura("1")], None)])
+    assert resultados == [("a", {"insertadas": 1, "rechazadas": 0})]
+    db.cerrar_conexion()
@@ -0,0 +1,94 @@
+# test_oscar14_migraciones.py
+import sqlite3
+
+import pytest
+
+from oscar14_migraciones import a_centimos, aplicar_migraciones, normalizar_numeracion, MIGRACIONES
+
+
+@pytest.mark.parametrize("valor, esperado", [
+    ("1,180.50", 118050),
+    ("1.180,50", 118050),
+    ("1.234.567,89", 123456789),
+    ("1,234,567.89", 123456789),
+    ("1,5", 150),
+    ("1,50", 150),
+    ("1,180", 118000),
+    ("118.00", 11800),
+    ("S/ 1.180,50", 118050),
+    ("s/ 118", 11800),
+    ("-12,30", -1230),
+    (118.5, 11850),
+    (118, 11800),
+    ("0.005", 1),
+])
+def test_a_centimos(valor, esperado):
+    assert a_centimos(valor) == esperado
+
+
+@pytest.mark.parametrize("valor", [None, "", "   ", "abc", "S/", "NaN", "Infinity", "1.2.3,4,5"])
+def test_a_centimos_invalido(valor):
+    assert a_centimos(valor) is None
+
+
+def _base_version_1():
+    conn = sqlite3.connect(":memory:")
+    MIGRACIONES[0][1](conn)
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+    return conn
+
+
+def test_migracion_2_convierte_y_conserva_originales():
+    conn = _base_version_1()
+    filas = [
+        ("20100000001", "01", "F001", "1", "1.180,50", "14/09/2024"),
+        ("20100000001", "01", "F001", "2", "abc", "fecha rara"),
+        ("20100000001", "01", "F001", "2", "99.00", "2024-01-01"),  # repetida, se descarta
+        ("20100000001", "01", "F001", "3", "", None),
+    ]
+    conn.executemany("INSERT INTO facturas (ruc_emisor, tipo_comprobante, serie, numeracion, monto_total, "
+                     "fecha_emision) VALUES (?, ?, ?, ?, ?, ?)", filas)
+    conn.commit()
+
+    aplicar_migraciones(conn)
+
+    facturas = conn.execute("SELECT id, numeracion, monto_total, fecha_emision FROM facturas ORDER BY id").fetchall()
+    assert [(n, m, f) for _, n, m, f in facturas] == [
+        ("1", 118050, "2024-09-14"), ("2", None, None), ("3", None, None)]
+    id_2 = facturas[1][0]
+    originales = conn.execute("SELECT factura_id, columna, valor FROM valores_originales ORDER BY columna").fetchall()
+    assert originales == [(id_2, "fecha_emision", "fecha rara"), (id_2, "monto_total", "abc")]
+
+
+@pytest.mark.parametrize("valor, esperado", [
+    ("00000002", "2"), (" 2 ", "2"), ("0000", "0"), ("120", "120"), ("A-0012", "A-0012"), (None, ""), (7, "7"),
+])
+def test_normalizar_numeracion(valor, esperado):
+    assert normalizar_numeracion(valor) == esperado
+
+
+def test_migracion_8_quita_ceros_y_descarta_repetidas():
+    conn = sqlite3.connect(":memory:")
+    for _, migracion in MIGRACIONES[:7]:
+        migracion(conn)
+    conn.execute("PRAGMA user_version = 7")
+    conn.executemany("INSERT INTO facturas (ruc_emisor, tipo_comprobante, serie, numeracion, monto_total) "
+                     "VALUES (?, ?, ?, ?, ?)", [
+                         ("20100000001", "01", "F001", "00000002", 100),
+                         ("20100000001", "01", "F001", "2", 200),  # la misma factura, se descarta
+                         ("20100000001", "01", "F001", "0003", 300),
+                     ])
+    conn.execute("INSERT INTO valores_originales VALUES (2, 'fecha_emision', 'x')")
+    conn.executemany("INSERT INTO verificaciones_sunat VALUES ('20100000001', '01', 'F001', ?, ?, NULL, ?)",
+                     [("2", "ACEPTADO", 10.0), ("002", "ANULADO", 20.0), ("0003", "ACEPTADO", 5.0)])
+    conn.commit()
+
+    aplicar_migraciones(conn)
+
+    assert conn.execute("SELECT id, numeracion, monto_total FROM facturas ORDER BY id").fetchall() == [
+        (1, "2", 100), (3, "3", 300)]
+    assert conn.execute("SELECT COUNT(*) FROM valores_originales").fetchone()[0] == 0
+    assert conn.execute("SELECT cantidad, monto_total FROM resumen_tipos").fetchone() == (2, 400)
+    assert conn.execute("SELECT numeracion, estado FROM verificaciones_sunat ORDER BY numeracion").fetchall() == [
+        ("2", "ANULADO"), ("3", "ACEPTADO")]
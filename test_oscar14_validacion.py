@@ -0,0 +1,79 @@
+# test_oscar14_validacion.py
+import numpy as np
+import pytest
+
+from oscar14_validacion import (ruc_valido, validar_columnas, igv_inconsistente, total_inconsistente,
+                                COLUMNAS_VALIDACION)
+
+HOY = "2024-12-31"
+
+
+def test_ruc_valido():
+    rucs = [
+        "20131312955",   # SUNAT
+        "20100070970",
+        "10074539560",   # persona natural, dígito verificador 0 (resto 10)
+        " 20100047218 ",
+        "20131312956",   # dígito verificador incorrecto
+        "30131312955",   # prefijo inexistente
+        "2013131295",    # 10 dígitos
+        "201313129550",  # 12 dígitos
+        "2013131295A",
+        "",
+        None,
+    ]
+    assert ruc_valido(rucs).tolist() == [True, True, True, True, False, False, False, False, False, False, False]
+
+
+def _factura(**cambios):
+    factura = {
+        "ruc_emisor": "20131312955", "tipo_comprobante": "01", "serie": "F001", "numeracion": "123",
+        "monto_total": 11800, "fecha_emision": "2024-09-14", "monto_igv": 1800, "ruc_adquiriente": "20100070970",
+        "valor_venta_gravada": 10000, "valor_venta_inafecta": None, "valor_venta_exonerada": None,
+    }
+    factura.update(cambios)
+    return factura
+
+
+def _validar(*facturas):
+    return validar_columnas({columna: [f[columna] for f in facturas] for columna in COLUMNAS_VALIDACION}, hoy=HOY)
+
+
+def test_validar_columnas_factura_correcta():
+    assert _validar(_factura(), _factura(tipo_comprobante="03", serie="B001", ruc_adquiriente="12345678")) == ["", ""]
+
+
+@pytest.mark.parametrize("cambios, observaciones", [
+    ({"ruc_emisor": "20131312956"}, "ruc_emisor"),
+    ({"ruc_adquiriente": "1234567"}, "ruc_adquiriente"),
+    ({"tipo_comprobante": "99"}, "tipo_comprobante"),
+    ({"serie": "B001"}, "serie"),
+    ({"numeracion": "123456789"}, "numeracion"),
+    ({"fecha_emision": "2025-01-01"}, "fecha_emision"),
+    ({"fecha_emision": None}, "fecha_emision"),
+    ({"monto_total": 0, "valor_venta_gravada": None, "monto_igv": None}, "monto_total"),
+    ({"monto_igv": 2000, "monto_total": 12000}, "igv"),
+    ({"monto_total": 12000}, "total_componentes"),
+    ({"ruc_emisor": "", "monto_total": None}, "ruc_emisor,monto_total"),
+])
+def test_validar_columnas_observaciones(cambios, observaciones):
+    assert _validar(_factura(**cambios)) == [observaciones]
+
+
+def test_igv_tolerancia():
+    gravada = np.array([10000.0, 10000.0, 10000.0, 1000000.0, 1000000.0, np.nan, 10000.0])
+    igv = np.array([1800.0, 1810.0, 1811.0, 180900.0, 180901.0, 1.0, np.nan])
+    # 10 céntimos o 0,5 % del IGV esperado, lo que sea mayor; sin alguno de los montos no se comprueba
+    assert igv_inconsistente(gravada, igv).tolist() == [False, False, True, False, True, False, False]
+
+
+def test_total_tolerancia():
+    nan = np.nan
+    total = np.array([1190.0, 1191.0, 1185900.0, 1186000.0, 11800.0, 11800.0, nan])
+    gravada = np.array([1000.0, 1000.0, 1000000.0, 1000000.0, nan, nan, 10000.0])
+    inafecta = np.array([nan, nan, nan, nan, 11800.0, nan, nan])
+    exonerada = np.full(7, nan)
+    igv = np.array([180.0, 180.0, 180000.0, 180000.0, nan, nan, 1800.0])
+    # 10 céntimos o 0,5 % del total; hace falta el total y algún valor de venta, y el IGV que falta cuenta como cero
+    assert total_inconsistente(total, gravada, inafecta, exonerada, igv).tolist() == [
+        False, True, False, True, False, False, False]